@@ -0,0 +1,440 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Measure the performance of complete conversions.
+
+Convert each of a set of repositories with each of the output modes
+(cvs2svn to a dumpfile, cvs2git, and cvs2bzr), and record the time
+and peak RSS of each pass (as written by --write-pass-report), the
+total time, and the sizes of the output files and of the temporary
+directory.  The results are written to a JSON file.
+
+If a baseline (the results file of an earlier run) is specified, the
+results are compared against it, and each measurement that got worse
+by more than the tolerance for its kind is reported as a regression.
+The peak size of the temporary directory is only sampled once a
+second, so it gets its own, looser tolerance.
+The exit status is 1 if there were regressions or if a conversion
+failed, so the script can be used in automated tests."""
+
+
+import sys
+import os
+import shutil
+import optparse
+import subprocess
+import time
+
+try:
+    import json
+except ImportError:
+    sys.exit('This script requires Python 2.6 or later')
+
+SRCPATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.version import VERSION
+
+from contrib.generate_repository import DEFAULTS
+from contrib.generate_repository import generate_repository
+
+
+usage = 'USAGE: %prog [options] [REPOSITORY...]'
+description = """\
+Convert each REPOSITORY with each output mode and record the time and
+peak RSS of each pass and the sizes of the output.
+
+A REPOSITORY is either the path of a CVS repository, the name of a
+test repository (e.g., 'main' for test-data/main-cvsrepos), or
+'generated:' followed by comma-separated parameters for
+contrib/generate_repository.py (e.g., 'generated:files=1000,tags=5').
+Generated repositories are kept in the work directory and reused.
+"""
+
+DEFAULT_REPOSITORIES = ['main', 'nasty-graphs', 'generated:files=1000']
+
+# A map {mode : (script, options, output_files)}, where OUTPUT_FILES
+# is a list of (option, filename) for the files that the conversion
+# writes.  cvs2bzr cannot extract the revision contents itself, so it
+# requires CVS (or RCS, with --bzr-option=--use-rcs):
+MODES = {
+    'svn' : (
+        'cvs2svn', ['--use-internal-co'],
+        [('--dumpfile', 'svn.dump')],
+        ),
+    'git' : (
+        'cvs2git', ['--use-external-blob-generator'],
+        [('--blobfile', 'git-blob.dat'), ('--dumpfile', 'git-dump.dat')],
+        ),
+    'bzr' : (
+        'cvs2bzr', [],
+        [('--dumpfile', 'bzr.fi')],
+        ),
+    }
+
+DEFAULT_MODES = ['svn', 'git', 'bzr']
+
+
+class MyHelpFormatter(optparse.IndentedHelpFormatter):
+    """A HelpFormatter for optparse that doesn't reformat the description."""
+
+    def format_description(self, description):
+        return description
+
+
+def get_repository(spec, workdir):
+    """Return the path of the repository described by SPEC.
+
+    Generate the repository in WORKDIR if it does not exist yet."""
+
+    if spec.startswith('generated:'):
+        params = {}
+        for param in spec[len('generated:'):].split(','):
+            if not param:
+                continue
+            (name, value) = param.split('=', 1)
+            if name not in DEFAULTS:
+                raise ValueError('Unknown parameter %r in %r' % (name, spec,))
+            params[name] = type(DEFAULTS[name])(value)
+        path = os.path.join(
+            workdir, 'repos',
+            '-'.join(['%s=%s' % item for item in sorted(params.items())])
+            or 'default',
+            )
+        if not os.path.exists(path):
+            sys.stderr.write('Generating %s...\n' % (spec,))
+            generate_repository(path + '.tmp', **params)
+            os.rename(path + '.tmp', path)
+        return path
+    elif os.path.isdir(spec):
+        return spec
+    else:
+        path = os.path.join(SRCPATH, 'test-data', spec + '-cvsrepos')
+        if not os.path.isdir(path):
+            raise ValueError('Repository %r not found' % (spec,))
+        return path
+
+
+def convert(repository, mode, workdir, extra_options):
+    """Convert REPOSITORY using MODE and return the measurements.
+
+    Return None if the conversion failed."""
+
+    (script, options, output_files) = MODES[mode]
+    rundir = os.path.join(workdir, 'run')
+    if os.path.exists(rundir):
+        shutil.rmtree(rundir)
+    os.makedirs(rundir)
+    report_filename = os.path.join(rundir, 'pass-report.json')
+    log_filename = os.path.join(workdir, 'last-conversion.log')
+
+    cmd = [sys.executable, os.path.join(SRCPATH, script)]
+    cmd.extend(options)
+    for (option, filename) in output_files:
+        cmd.append('%s=%s' % (option, os.path.join(rundir, filename),))
+    cmd.append('--tmpdir=%s' % (os.path.join(rundir, 'tmp'),))
+    cmd.append('--write-pass-report=%s' % (report_filename,))
+    cmd.extend(extra_options)
+    cmd.append(repository)
+
+    log = open(log_filename, 'w')
+    start = time.time()
+    status = subprocess.call(cmd, stdout=log, stderr=subprocess.STDOUT)
+    elapsed = time.time() - start
+    log.close()
+    if status != 0:
+        sys.stderr.write(
+            'Conversion failed; see %s for its output.\n' % (log_filename,)
+            )
+        return None
+
+    f = open(report_filename)
+    report = json.load(f)['passes']
+    f.close()
+    passes = {}
+    for entry in report:
+        passes[entry['name']] = {
+            'duration' : entry['duration'],
+            'peak_rss' : entry.get('peak_rss'),
+            }
+
+    sizes = {}
+    for (option, filename) in output_files:
+        sizes[filename] = os.path.getsize(os.path.join(rundir, filename))
+    sizes['tmpdir'] = max([
+        entry.get('peak_tmpdir_size', 0) for entry in report
+        ] + [0])
+
+    shutil.rmtree(rundir)
+    return {
+        'time' : elapsed,
+        'peak_rss' : max([
+            entry['peak_rss'] for entry in passes.values()
+            if entry['peak_rss'] is not None
+            ] + [0]),
+        'passes' : passes,
+        'sizes' : sizes,
+        }
+
+
+def combine(a, b):
+    """Combine the measurements A and B of two runs of a conversion.
+
+    Use the minimum of each time and RSS and of the sampled peak size
+    of the temporary directory, to reduce the effect of noise."""
+
+    passes = {}
+    for name in a['passes']:
+        pa = a['passes'][name]
+        pb = b['passes'].get(name, pa)
+        passes[name] = {
+            'duration' : min(pa['duration'], pb['duration']),
+            'peak_rss' : min(pa['peak_rss'], pb['peak_rss']),
+            }
+    sizes = dict(a['sizes'])
+    if 'tmpdir' in b['sizes']:
+        sizes['tmpdir'] = min(sizes['tmpdir'], b['sizes']['tmpdir'])
+    return {
+        'time' : min(a['time'], b['time']),
+        'peak_rss' : min(a['peak_rss'], b['peak_rss']),
+        'passes' : passes,
+        'sizes' : sizes,
+        }
+
+
+def format_value(kind, value):
+    if kind == 'time':
+        return '%.2fs' % (value,)
+    elif kind == 'rss':
+        return '%.1fMiB' % (value / 1048576.0,)
+    else:
+        return '%d' % (value,)
+
+
+def compare(results, baseline, options):
+    """Compare RESULTS against BASELINE and print the differences.
+
+    Return the number of regressions."""
+
+    tolerances = {
+        'time' : options.time_tolerance,
+        'rss' : options.rss_tolerance,
+        'size' : options.size_tolerance,
+        'tmpdir' : options.tmpdir_tolerance,
+        }
+    old_runs = {}
+    for run in baseline['runs']:
+        old_runs[(run['repository'], run['mode'])] = run
+
+    regressions = 0
+    for run in results['runs']:
+        old_run = old_runs.get((run['repository'], run['mode']))
+        if old_run is None or run['failed'] or old_run['failed']:
+            continue
+
+        measurements = [
+            ('total time', 'time', old_run['time'], run['time']),
+            ('peak RSS', 'rss', old_run['peak_rss'], run['peak_rss']),
+            ]
+        for (name, new_pass) in sorted(run['passes'].items()):
+            old_pass = old_run['passes'].get(name)
+            if old_pass is None:
+                continue
+            measurements.append(
+                (name + ' time', 'time',
+                 old_pass['duration'], new_pass['duration'])
+                )
+            measurements.append(
+                (name + ' RSS', 'rss',
+                 old_pass['peak_rss'], new_pass['peak_rss'])
+                )
+        for (name, new_size) in sorted(run['sizes'].items()):
+            old_size = old_run['sizes'].get(name)
+            if old_size is None:
+                continue
+            if name == 'tmpdir':
+                # Sampled, so not as reproducible as the output sizes.
+                kind = 'tmpdir'
+            else:
+                kind = 'size'
+            measurements.append((name + ' size', kind, old_size, new_size))
+
+        for (name, kind, old, new) in measurements:
+            if old is None or new is None:
+                continue
+            if kind == 'time' and max(old, new) < options.min_time:
+                # Too short to be measured reliably.
+                continue
+            if new > old * (1.0 + tolerances[kind]):
+                label = 'REGRESSION'
+                regressions += 1
+            elif new < old * (1.0 - tolerances[kind]):
+                label = 'improvement'
+            else:
+                continue
+            if old:
+                change = '%+.0f%%' % (100.0 * (new - old) / old,)
+            else:
+                change = 'new'
+            sys.stdout.write('%-11s %s/%s %s: %s -> %s (%s)\n' % (
+                label, run['repository'], run['mode'], name,
+                format_value(kind, old), format_value(kind, new), change,
+                ))
+
+    return regressions
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage=usage, description=description,
+        formatter=MyHelpFormatter(),
+        )
+    parser.add_option(
+        '--modes', metavar='MODE,...', default=','.join(DEFAULT_MODES),
+        help='output modes to test (default: %default)',
+        )
+    parser.add_option(
+        '--workdir', metavar='PATH', default='cvs2svn-benchmark',
+        help='directory for generated repositories and conversion output '
+        '(default: %default)',
+        )
+    parser.add_option(
+        '--repeat', metavar='N', type='int', default=1,
+        help='convert each repository N times and keep the best '
+        'measurements (default: %default)',
+        )
+    parser.add_option(
+        '--option', metavar='OPT', action='append', default=[],
+        help='pass OPT to every conversion (e.g., --option=--jobs=4)',
+        )
+    for mode in DEFAULT_MODES:
+        parser.add_option(
+            '--%s-option' % (mode,), metavar='OPT', action='append',
+            default=[],
+            help='pass OPT to %s' % (MODES[mode][0],),
+            )
+    parser.add_option(
+        '--output', '-o', metavar='FILE', default='benchmark-results.json',
+        help='write the results to FILE (default: %default)',
+        )
+    parser.add_option(
+        '--baseline', '-b', metavar='FILE',
+        help='compare the results against FILE, which was written by '
+        '--output in an earlier run',
+        )
+    parser.add_option(
+        '--time-tolerance', metavar='FRACTION', type='float', default=0.1,
+        help='allowed increase of times (default: %default)',
+        )
+    parser.add_option(
+        '--rss-tolerance', metavar='FRACTION', type='float', default=0.1,
+        help='allowed increase of peak RSS (default: %default)',
+        )
+    parser.add_option(
+        '--size-tolerance', metavar='FRACTION', type='float', default=0.01,
+        help='allowed increase of output sizes (default: %default)',
+        )
+    parser.add_option(
+        '--tmpdir-tolerance', metavar='FRACTION', type='float', default=0.25,
+        help='allowed increase of the sampled peak size of the temporary '
+        'directory (default: %default)',
+        )
+    parser.add_option(
+        '--min-time', metavar='SECONDS', type='float', default=0.5,
+        help='ignore the times of passes shorter than this '
+        '(default: %default)',
+        )
+
+    (options, args) = parser.parse_args()
+    modes = [mode for mode in options.modes.split(',') if mode]
+    for mode in modes:
+        if mode not in MODES:
+            parser.error('unknown mode %r' % (mode,))
+    if options.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    baseline = None
+    if options.baseline is not None:
+        f = open(options.baseline)
+        baseline = json.load(f)
+        f.close()
+
+    results = {
+        'cvs2svn_version' : VERSION,
+        'python_version' : sys.version.split()[0],
+        'time' : time.strftime('%Y-%m-%d %H:%M:%S'),
+        'runs' : [],
+        }
+    failures = 0
+    for spec in args or DEFAULT_REPOSITORIES:
+        try:
+            repository = get_repository(spec, options.workdir)
+        except ValueError, e:
+            parser.error(str(e))
+        for mode in modes:
+            extra_options = (
+                options.option + getattr(options, '%s_option' % (mode,))
+                )
+            measurements = None
+            for i in range(options.repeat):
+                sys.stderr.write('Converting %s with %s...\n' % (spec, mode,))
+                m = convert(repository, mode, options.workdir, extra_options)
+                if m is None:
+                    measurements = None
+                    break
+                elif measurements is None:
+                    measurements = m
+                else:
+                    measurements = combine(measurements, m)
+
+            run = {'repository' : spec, 'mode' : mode}
+            if measurements is None:
+                failures += 1
+                run['failed'] = True
+                sys.stdout.write('%s/%s: FAILED\n' % (spec, mode,))
+            else:
+                run['failed'] = False
+                run.update(measurements)
+                sys.stdout.write(
+                    '%s/%s: %.2fs, peak RSS %s, output %s bytes\n' % (
+                        spec, mode, measurements['time'],
+                        format_value('rss', measurements['peak_rss']),
+                        sum([
+                            size
+                            for (name, size) in measurements['sizes'].items()
+                            if name != 'tmpdir'
+                            ]),
+                        )
+                    )
+            results['runs'].append(run)
+
+    f = open(options.output, 'w')
+    json.dump(results, f, indent=2, sort_keys=True, separators=(',', ': '))
+    f.write('\n')
+    f.close()
+
+    regressions = 0
+    if baseline is not None:
+        regressions = compare(results, baseline, options)
+        sys.stdout.write('%d regression(s).\n' % (regressions,))
+
+    if failures or regressions:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
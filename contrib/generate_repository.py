@@ -0,0 +1,490 @@
+#! /usr/bin/python
+
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Generate a synthetic CVS repository for benchmarking cvs2svn.
+
+The repository is written as RCS files, the same way that CVS stores
+them, with tunable numbers of files, directories, revisions, branches,
+tags, and vendor branches, and with tunable file and delta sizes.  The
+output depends only on the parameters (including the seed), so the
+same repository can be regenerated on any machine.
+
+The revisions of all files are spread over a global sequence of
+commits.  Each commit has a time, an author, and a log message, and
+the revisions belonging to it get times within a few seconds of each
+other, so that cvs2svn groups them into one changeset.  Branch and tag
+names are drawn from shared pools, so that each symbol appears in many
+files.
+
+Each file's contents are generated independently from a random
+generator seeded with the seed and the file's number, so generating a
+repository with 10^6 files needs little memory."""
+
+
+import sys
+import os
+import binascii
+import random
+import optparse
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from cvs2svn_lib.rcs_stream import msplit
+from cvs2svn_lib.rcs_stream import RCSStream
+
+from contrib.rcs_file_filter import WriteRCSFileSink
+
+
+usage = 'USAGE: %prog [options] OUTPUT_DIR'
+description = """\
+Generate a synthetic CVS repository in OUTPUT_DIR, which must not
+exist yet.  The repository is fully determined by the options.
+"""
+
+
+# The parameters of generate_repository() and their default values:
+DEFAULTS = {
+    'seed' : 0,
+    'files' : 100,
+    'directories' : 10,
+    'revisions' : 5,
+    'branches' : 1,
+    'branch_revisions' : 2,
+    'tags' : 2,
+    'symbols' : 20,
+    'vendor_fraction' : 0.1,
+    'file_size' : 2000,
+    'delta_size' : 5,
+    'binary_fraction' : 0.05,
+    'files_per_commit' : 5,
+    'commit_interval' : 3600,
+    'commit_jitter' : 30,
+    'authors' : 10,
+    }
+
+# The time of the first commit (2000-01-01 00:00:00 UTC):
+START_TIME = 946684800
+
+# The average number of bytes in a line of a text file:
+LINE_LENGTH = 40
+
+WORDS = [
+    'alpha', 'bravo', 'charlie', 'delta', 'echo', 'foxtrot', 'golf',
+    'hotel', 'india', 'juliet', 'kilo', 'lima', 'mike', 'november',
+    'oscar', 'papa', 'quebec', 'romeo', 'sierra', 'tango', 'uniform',
+    'victor', 'whiskey', 'xray', 'yankee', 'zulu', '{', '}', '(', ')',
+    '=', ';', '@', 'return', 'if', 'else', 'for', 'while', 'int', 'x',
+    ]
+
+
+def _mean_count(rng, mean):
+    # Return a random non-negative integer with the specified mean:
+    if mean <= 0:
+        return 0
+    return rng.randint(0, 2 * mean)
+
+
+class _Commit(object):
+    """The properties of one of the repository's commits."""
+
+    def __init__(self, params, index):
+        self.index = index
+        self.timestamp = START_TIME + index * params['commit_interval']
+        self.author = 'user%d' % ((index * 7919) % params['authors'],)
+        self.log = 'Commit %d: %s %s.' % (
+            index, WORDS[index % 26], WORDS[(index // 26) % 26],
+            )
+
+
+class _Revision(object):
+    def __init__(self, number, commit, timestamp, lines):
+        self.number = number
+        self.commit = commit
+        self.timestamp = timestamp
+        self.lines = lines
+        # The numbers of the first revisions of the branches sprouting
+        # from this revision:
+        self.branches = []
+        # The number of (non-vendor) branches numbered so far:
+        self.branch_count = 0
+        # The revision listed as 'next' in the RCS file:
+        self.next = None
+        # The deltatext of this revision (a fulltext for the head
+        # revision, otherwise an RCS diff):
+        self.text = None
+        # The revisions on the branches sprouting from this revision, in
+        # the order in which they should be written:
+        self.children = []
+
+
+class _FileGenerator(object):
+    """Generate the RCS file with number INDEX."""
+
+    def __init__(self, params, num_commits, index):
+        self.params = params
+        self.num_commits = num_commits
+        self.index = index
+        self.rng = random.Random(params['seed'] * 1000003 + index)
+        self.binary = self.rng.random() < params['binary_fraction']
+
+    def _text_line(self):
+        rng = self.rng
+        words = [rng.choice(WORDS) for i in range(rng.randint(2, 12))]
+        return ' '.join(words) + '\n'
+
+    def _binary_line(self):
+        length = self.rng.randint(1, 2 * LINE_LENGTH)
+        data = binascii.unhexlify(
+            '%0*x' % (2 * length, self.rng.getrandbits(8 * length),)
+            )
+        return data.replace('\n', '\0') + '\n'
+
+    def _line(self):
+        if self.binary:
+            return self._binary_line()
+        else:
+            return self._text_line()
+
+    def _initial_lines(self):
+        num_lines = _mean_count(
+            self.rng, self.params['file_size'] // LINE_LENGTH
+            )
+        lines = [self._line() for i in range(num_lines)]
+        if not self.binary and self.rng.random() < 0.5:
+            lines.insert(0, '/* $Id$ */\n')
+        return lines
+
+    def _generate_diff(self, lines):
+        """Return an RCS diff that makes random changes to LINES."""
+
+        rng = self.rng
+        num_hunks = rng.randint(1, 3)
+        hunk_size = max(1, self.params['delta_size'] // num_hunks)
+        positions = sorted(
+            set([rng.randint(0, len(lines)) for i in range(num_hunks)])
+            )
+        diff = []
+        for (i, start) in enumerate(positions):
+            if i + 1 < len(positions):
+                limit = positions[i + 1]
+            else:
+                limit = len(lines)
+            num_deleted = min(rng.randint(0, hunk_size), limit - start)
+            num_added = rng.randint(0, hunk_size)
+            if num_deleted == 0 and num_added == 0:
+                num_added = 1
+            if num_deleted:
+                diff.append('d%d %d\n' % (start + 1, num_deleted,))
+            if num_added:
+                diff.append('a%d %d\n' % (start + num_deleted, num_added,))
+                diff.extend([self._line() for j in range(num_added)])
+        return ''.join(diff)
+
+    def _choose_commits(self, first, count):
+        """Return up to COUNT sorted commit indexes, all at least FIRST."""
+
+        count = min(count, self.num_commits - first)
+        if count <= 0:
+            return []
+        return sorted(self.rng.sample(xrange(first, self.num_commits), count))
+
+    def _new_revision(self, number, commit_index, lines):
+        commit = _Commit(self.params, commit_index)
+        timestamp = commit.timestamp + self.rng.randint(
+            0, self.params['commit_jitter']
+            )
+        return _Revision(number, commit, timestamp, lines)
+
+    def _generate_line_of_development(
+        self, base, prefix, commits, vendor=False
+        ):
+        """Return the revisions on a branch, with forward deltas.
+
+        BASE is the revision that the branch sprouts from, PREFIX is the
+        branch number, and COMMITS are the indexes of the commits of the
+        branch's revisions.  If VENDOR is True, the branch is a vendor
+        branch whose first revision has the same contents as BASE."""
+
+        revisions = []
+        lines = base.lines
+        for (i, commit_index) in enumerate(commits):
+            if i == 0 and vendor:
+                diff = ''
+            else:
+                diff = self._generate_diff(lines)
+            stream = RCSStream(''.join(lines))
+            stream.apply_diff(diff)
+            lines = msplit(stream.get_text())
+            revision = self._new_revision(
+                '%s.%d' % (prefix, i + 1,), commit_index, lines
+                )
+            revision.text = diff
+            if revisions:
+                revisions[-1].next = revision.number
+            revisions.append(revision)
+        return revisions
+
+    def generate(self):
+        """Return (revisions, symbols, principal_branch) for the file.
+
+        REVISIONS are the revisions in the order in which they are written
+        to the RCS file, with the head revision first.  SYMBOLS is a list
+        of (name, revision_number)."""
+
+        rng = self.rng
+        params = self.params
+        symbols = []
+
+        # The trunk, written with the newest revision first:
+        num_revisions = max(1, _mean_count(rng, params['revisions'] - 1) + 1)
+        commits = self._choose_commits(0, num_revisions)
+        trunk = [self._new_revision('1.1', commits[0], self._initial_lines())]
+        for (i, commit_index) in enumerate(commits[1:]):
+            lines = trunk[-1].lines
+            stream = RCSStream(''.join(lines))
+            forward_diff = self._generate_diff(lines)
+            # The deltas of trunk revisions go backwards in time:
+            trunk[-1].text = stream.invert_diff(forward_diff)
+            trunk.append(
+                self._new_revision(
+                    '1.%d' % (i + 2,), commit_index,
+                    msplit(stream.get_text()),
+                    )
+                )
+        trunk[-1].text = ''.join(trunk[-1].lines)
+        for i in range(1, len(trunk)):
+            trunk[i].next = trunk[i - 1].number
+
+        principal_branch = None
+        if rng.random() < params['vendor_fraction']:
+            # The file was imported onto a vendor branch.  If it was not
+            # changed on trunk afterwards, later vendor imports are also made
+            # on the vendor branch, which is then the default branch:
+            if len(trunk) == 1:
+                num_imports = max(
+                    1, _mean_count(rng, params['branch_revisions'])
+                    )
+                principal_branch = '1.1.1'
+            else:
+                num_imports = 1
+            commits = [trunk[0].commit.index] + self._choose_commits(
+                trunk[0].commit.index + 1, num_imports - 1
+                )
+            vendor = self._generate_line_of_development(
+                trunk[0], '1.1.1', commits, vendor=True
+                )
+            # The first vendor revision has the same time as 1.1:
+            vendor[0].commit = trunk[0].commit
+            vendor[0].timestamp = trunk[0].timestamp
+            trunk[0].commit = _Commit(params, trunk[0].commit.index)
+            trunk[0].commit.log = 'Initial revision'
+            trunk[0].branches.append(vendor[0].number)
+            trunk[0].children.extend(vendor)
+            symbols.append(('VENDOR', '1.1.1',))
+            symbols.append(('RELEASE_1', vendor[0].number,))
+
+        branch_names = rng.sample(
+            xrange(params['symbols']),
+            min(params['symbols'], _mean_count(rng, params['branches'])),
+            )
+        branch_revisions = []
+        for name_index in branch_names:
+            base = rng.choice(trunk)
+            base.branch_count += 1
+            branch_number = '%s.%d' % (base.number, 2 * base.branch_count,)
+            commits = self._choose_commits(
+                base.commit.index + 1,
+                max(1, _mean_count(rng, params['branch_revisions'])),
+                )
+            if not commits:
+                continue
+            revisions = self._generate_line_of_development(
+                base, branch_number, commits
+                )
+            base.branches.append(revisions[0].number)
+            base.children.extend(revisions)
+            branch_revisions.extend(revisions)
+            symbols.append(('BRANCH_%d' % (name_index,), branch_number,))
+
+        tag_names = rng.sample(
+            xrange(params['symbols']),
+            min(params['symbols'], _mean_count(rng, params['tags'])),
+            )
+        for name_index in tag_names:
+            revision = rng.choice(trunk + branch_revisions)
+            symbols.append(('TAG_%d' % (name_index,), revision.number,))
+
+        revisions = []
+        for revision in reversed(trunk):
+            revisions.append(revision)
+            revisions.extend(revision.children)
+        return (revisions, symbols, principal_branch)
+
+    def write(self, filename):
+        """Write the RCS file to FILENAME.  Return the number of revisions."""
+
+        (revisions, symbols, principal_branch) = self.generate()
+        f = open(filename, 'wb')
+        sink = WriteRCSFileSink(f)
+        sink.set_head_revision(revisions[0].number)
+        if principal_branch is not None:
+            sink.set_principal_branch(principal_branch)
+        for (name, revision_number) in reversed(symbols):
+            sink.define_tag(name, revision_number)
+        sink.set_locking('strict')
+        if self.binary:
+            sink.set_expansion('b')
+        sink.admin_completed()
+        for revision in revisions:
+            sink.define_revision(
+                revision.number, revision.timestamp, revision.commit.author,
+                'Exp', revision.branches, revision.next,
+                )
+        sink.tree_completed()
+        sink.set_description('')
+        for revision in revisions:
+            sink.set_revision_info(
+                revision.number, revision.commit.log, revision.text
+                )
+        sink.parse_completed()
+        f.close()
+        return len(revisions)
+
+
+def _get_directories(rng, params):
+    """Return the relative paths of the directories to create."""
+
+    directories = ['']
+    for i in range(1, params['directories']):
+        parent = directories[rng.randrange(len(directories))]
+        directories.append(os.path.join(parent, 'dir%d' % (i,)))
+    return directories
+
+
+def generate_repository(path, **params):
+    """Generate a CVS repository in PATH, which must not exist yet.
+
+    PARAMS override the values in DEFAULTS.  Return a map with the
+    numbers of 'files' and 'revisions' generated and the total 'size' of
+    the RCS files in bytes."""
+
+    for name in params:
+        if name not in DEFAULTS:
+            raise ValueError('Unknown parameter %r' % (name,))
+    params = dict(DEFAULTS, **params)
+
+    num_commits = max(
+        1, params['files'] * params['revisions'] // params['files_per_commit']
+        )
+    rng = random.Random(params['seed'])
+    directories = _get_directories(rng, params)
+    os.makedirs(path)
+    # Make PATH recognizable as the root of a CVS repository:
+    os.mkdir(os.path.join(path, 'CVSROOT'))
+    for directory in directories[1:]:
+        os.mkdir(os.path.join(path, directory))
+
+    num_revisions = 0
+    size = 0
+    for index in xrange(params['files']):
+        generator = _FileGenerator(params, num_commits, index)
+        if generator.binary:
+            basename = 'file%d.bin,v' % (index,)
+        else:
+            basename = 'file%d.txt,v' % (index,)
+        filename = os.path.join(
+            path, directories[rng.randrange(len(directories))], basename
+            )
+        num_revisions += generator.write(filename)
+        size += os.path.getsize(filename)
+
+    return {
+        'files' : params['files'],
+        'revisions' : num_revisions,
+        'size' : size,
+        }
+
+
+class MyHelpFormatter(optparse.IndentedHelpFormatter):
+    """A HelpFormatter for optparse that doesn't reformat the description."""
+
+    def format_description(self, description):
+        return description
+
+
+def main():
+    parser = optparse.OptionParser(
+        usage=usage, description=description,
+        formatter=MyHelpFormatter(),
+        )
+    parser.set_defaults(**DEFAULTS)
+    for (name, metavar, help) in [
+        ('seed', 'N', 'seed of the random number generators'),
+        ('files', 'N', 'number of RCS files'),
+        ('directories', 'N', 'number of directories'),
+        ('revisions', 'N', 'average number of trunk revisions per file'),
+        ('branches', 'N', 'average number of branches per file'),
+        ('branch_revisions', 'N', 'average number of revisions per branch'),
+        ('tags', 'N', 'average number of tags per file'),
+        ('symbols', 'N', 'number of branch names and of tag names'),
+        ('file_size', 'BYTES', 'average size of the first revision'),
+        ('delta_size', 'LINES', 'average number of lines changed'),
+        ('files_per_commit', 'N', 'average number of files per commit'),
+        ('commit_interval', 'SECONDS', 'time between commits'),
+        ('commit_jitter', 'SECONDS', 'maximum spread of a commit\'s times'),
+        ('authors', 'N', 'number of authors'),
+        ]:
+        parser.add_option(
+            '--' + name.replace('_', '-'), type='int', metavar=metavar,
+            help='%s (default: %d)' % (help, DEFAULTS[name],),
+            )
+    for (name, help) in [
+        ('vendor_fraction', 'fraction of files imported on a vendor branch'),
+        ('binary_fraction', 'fraction of binary files'),
+        ]:
+        parser.add_option(
+            '--' + name.replace('_', '-'), type='float', metavar='FRACTION',
+            help='%s (default: %g)' % (help, DEFAULTS[name],),
+            )
+
+    (options, args) = parser.parse_args()
+    if len(args) != 1:
+        parser.error('exactly one OUTPUT_DIR must be specified')
+    if os.path.exists(args[0]):
+        parser.error('%s already exists' % (args[0],))
+    for name in ['files', 'directories', 'files_per_commit', 'authors']:
+        if getattr(options, name) < 1:
+            parser.error('--%s must be at least 1' % (name.replace('_', '-'),))
+
+    params = {}
+    for name in DEFAULTS:
+        params[name] = getattr(options, name)
+    start = time.time()
+    result = generate_repository(args[0], **params)
+    sys.stdout.write(
+        'Generated %d files with %d revisions (%d bytes) in %.1f seconds.\n'
+        % (
+            result['files'], result['revisions'], result['size'],
+            time.time() - start,
+            )
+        )
+
+
+if __name__ == '__main__':
+    main()
@@ -36,6 +36,14 @@ class Artifact(object):
 
     pass
 
+  def get_fingerprint(self):
+    """Return a value that changes whenever this artifact is changed.
+
+    Return None if the artifact does not exist (or if it cannot be
+    fingerprinted)."""
+
+    return None
+
 
 class TempFile(Artifact):
   """A temporary file that can be used across cvs2svn passes."""
@@ -53,6 +61,13 @@ class TempFile(Artifact):
     logger.verbose("Deleting", self.filename)
     os.unlink(self.filename)
 
+  def get_fingerprint(self):
+    try:
+      st = os.stat(self.filename)
+    except OSError:
+      return None
+    return (st.st_size, st.st_mtime,)
+
   def __str__(self):
     return 'Temporary file %r' % (self.filename,)
 
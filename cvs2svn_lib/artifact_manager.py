@@ -48,9 +48,16 @@ class ArtifactManager:
   - Call artifact_manager.uses(which_pass, artifact) to indicate that
     WHICH_PASS needs to use ARTIFACT.
 
+  - Call artifact_manager.modifies(which_pass, artifact) to indicate
+    that WHICH_PASS changes ARTIFACT, which was created by an earlier
+    pass.
+
   There are also helper methods register_temp_file(),
-  register_artifact_needed(), and register_temp_file_needed() which
-  combine some useful operations.
+  register_artifact_needed(), register_temp_file_needed(), and
+  register_temp_file_modified() which combine some useful operations.
+
+  Once all artifacts have been registered, get_dependencies() can be
+  used to find out which passes have to be run before which others.
 
   Then, in pass order:
 
@@ -82,6 +89,10 @@ class ArtifactManager:
     # set of artifacts needed by the pass.
     self._pass_needs = { }
 
+    # A map { pass : set_of_artifacts }, where set_of_artifacts is a
+    # set of artifacts created or modified by the pass.
+    self._pass_modifies = { }
+
     # A set of passes that are currently being executed.
     self._active_passes = set()
 
@@ -115,7 +126,18 @@ class ArtifactManager:
 
     # An artifact is automatically "needed" in the pass in which it is
     # created:
+    self.modifies(which_pass, artifact)
+
+  def modifies(self, which_pass, artifact):
+    """Register that WHICH_PASS creates or changes ARTIFACT.
+
+    ARTIFACT must already have been registered."""
+
     self.uses(which_pass, artifact)
+    if which_pass in self._pass_modifies:
+      self._pass_modifies[which_pass].add(artifact)
+    else:
+      self._pass_modifies[which_pass] = set([artifact])
 
   def uses(self, which_pass, artifact):
     """Register that WHICH_PASS uses ARTIFACT.
@@ -165,6 +187,60 @@ class ArtifactManager:
 
     self.register_artifact_needed(basename, which_pass)
 
+  def register_temp_file_modified(self, basename, which_pass):
+    """Register that a temporary file is changed by WHICH_PASS.
+
+    Register that the temporary file with base name BASENAME, which
+    was created by an earlier pass, is needed and changed by
+    WHICH_PASS."""
+
+    self.modifies(which_pass, self._artifacts[basename])
+
+  def get_dependencies(self, passes):
+    """Return the dependencies among PASSES implied by their artifacts.
+
+    PASSES is the list of all passes, in the order that they would be
+    run one after the other.  Return a list whose Nth element is the
+    set of the indexes of the passes that have to be finished before
+    PASSES[N] can be started: the passes that create or change an
+    artifact that PASSES[N] uses, plus the passes that use an
+    artifact that PASSES[N] changes.  This method must be called
+    before any passes are skipped, started, or deferred."""
+
+    dependencies = []
+    for (i, which_pass) in enumerate(passes):
+      needs = self._pass_needs.get(which_pass, set())
+      modifies = self._pass_modifies.get(which_pass, set())
+      dependencies.append(set([
+          j
+          for j in range(i)
+          if needs & self._pass_modifies.get(passes[j], set())
+             or modifies & self._pass_needs.get(passes[j], set())
+          ]))
+
+    return dependencies
+
+  def get_fingerprints(self, which_pass):
+    """Return the fingerprints of the artifacts of WHICH_PASS.
+
+    Return (inputs, outputs), where inputs is a map {name :
+    fingerprint} for the artifacts that WHICH_PASS uses without
+    changing them, and outputs is a map {name : fingerprint} for the
+    artifacts that WHICH_PASS creates or changes.  See
+    Artifact.get_fingerprint()."""
+
+    needs = self._pass_needs.get(which_pass, set())
+    modifies = self._pass_modifies.get(which_pass, set())
+    inputs = {}
+    outputs = {}
+    for (name, artifact) in self._artifacts.items():
+      if artifact in modifies:
+        outputs[name] = artifact.get_fingerprint()
+      elif artifact in needs:
+        inputs[name] = artifact.get_fingerprint()
+
+    return (inputs, outputs)
+
   def _unregister_artifacts(self, which_pass):
     """Unregister any artifacts that were needed for WHICH_PASS.
 
@@ -177,6 +253,7 @@ class ArtifactManager:
       return []
 
     del self._pass_needs[which_pass]
+    self._pass_modifies.pop(which_pass, None)
 
     unneeded_artifacts = []
     for artifact in artifacts:
@@ -99,7 +99,7 @@ class RevisionChangeset(Changeset):
         if changeset_id is not None:
           succ_ids.add(changeset_id)
 
-    return ChangesetGraphNode(self, time_range, pred_ids, succ_ids)
+    return ChangesetGraphNode(self.id, time_range, pred_ids, succ_ids)
 
   def create_split_changeset(self, id, cvs_item_ids):
     return RevisionChangeset(id, cvs_item_ids)
@@ -168,7 +168,7 @@ class OrderedChangeset(Changeset):
         if changeset_id is not None:
           succ_ids.add(changeset_id)
 
-    return ChangesetGraphNode(self, time_range, pred_ids, succ_ids)
+    return ChangesetGraphNode(self.id, time_range, pred_ids, succ_ids)
 
   def __getstate__(self):
     return (
@@ -213,7 +213,7 @@ class SymbolChangeset(Changeset):
         if changeset_id is not None:
           succ_ids.add(changeset_id)
 
-    return ChangesetGraphNode(self, TimeRange(), pred_ids, succ_ids)
+    return ChangesetGraphNode(self.id, TimeRange(), pred_ids, succ_ids)
 
   def __cmp__(self, other):
     return cmp(self._sort_order, other._sort_order) \
@@ -17,13 +17,41 @@
 """The changeset dependency graph."""
 
 
+import os
 import heapq
-
+import array
+import struct
+import mmap
+import tempfile
+import itertools
+from collections import deque
+
+from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.time_range import TimeRange
 from cvs2svn_lib.changeset import RevisionChangeset
 from cvs2svn_lib.changeset import OrderedChangeset
 from cvs2svn_lib.changeset import BranchChangeset
 from cvs2svn_lib.changeset import TagChangeset
+from cvs2svn_lib.changeset_graph_node import ChangesetGraphNode
+from cvs2svn_lib.changeset_graph_link import CVSItemDependencyCache
+
+
+# Changeset graphs with at least this many changesets are represented
+# by a CompactChangesetGraph rather than a ChangesetGraph.  The compact
+# representation needs an order of magnitude less memory, at the cost
+# of some speed.  This option can be changed externally, affecting any
+# changeset graphs created subsequent to the change:
+compact_changeset_graph_threshold = 100000
+
+# If this is set to a number of bytes, then changeset graphs are
+# represented by CompactChangesetGraphs, and their edges are moved to
+# temporary files in the temporary directory as soon as they would
+# need more than that much memory.  The files are accessed via mmap,
+# so the operating system can decide which parts of them to keep in
+# RAM.  This option can be changed externally, affecting any changeset
+# graphs created subsequent to the change:
+changeset_graph_memory_limit = None
 
 
 class CycleInGraphException(Exception):
@@ -39,6 +67,34 @@ class NoPredNodeInGraphException(Exception):
     Exception.__init__(self, 'Node %s has no predecessors' % (node,))
 
 
+class CycleStatistics(object):
+  """Statistics about the cycles that were broken in a changeset graph."""
+
+  def __init__(self):
+    # The sizes of the cyclic strongly connected components that were
+    # found in the graph (not counting the components that they were
+    # later split into):
+    self.component_sizes = []
+
+    # The number of times that a cycle breaker was invoked:
+    self.num_breaks = 0
+
+  def record_components(self, components):
+    self.component_sizes.extend([len(component) for component in components])
+
+  def __str__(self):
+    if self.component_sizes:
+      return (
+          '%d cyclic components (largest %d, total %d changesets); '
+          '%d breaks' % (
+              len(self.component_sizes), max(self.component_sizes),
+              sum(self.component_sizes), self.num_breaks,
+              )
+          )
+    else:
+      return 'no cycles'
+
+
 class _NoPredNodes(object):
   """Manage changesets that are ready to be processed.
 
@@ -87,6 +143,13 @@ class ChangesetGraph(object):
     self._cvs_item_to_changeset_id = cvs_item_to_changeset_id
     # A map { id : ChangesetGraphNode }
     self.nodes = {}
+    self.cycle_statistics = CycleStatistics()
+    # The dependencies of the CVSItems in the changesets that have been
+    # examined while breaking cycles:
+    self.cvs_item_dependencies = CVSItemDependencyCache()
+    # While break_cyclic_components() is running, a list of the ids of
+    # the changesets added by add_new_changeset(); otherwise None:
+    self._new_changeset_ids = None
 
   def close(self):
     self._cvs_item_to_changeset_id.close()
@@ -123,6 +186,11 @@ class ChangesetGraph(object):
 
     self.nodes[node.id] = node
 
+  def get_changeset(self, id):
+    """Return the changeset with the specified ID from the database."""
+
+    return self._changeset_db[id]
+
   def store_changeset(self, changeset):
     for cvs_item_id in changeset.cvs_item_ids:
       self._cvs_item_to_changeset_id[cvs_item_id] = changeset.id
@@ -136,6 +204,8 @@ class ChangesetGraph(object):
 
     self.add_changeset(changeset)
     self.store_changeset(changeset)
+    if self._new_changeset_ids is not None:
+      self._new_changeset_ids.append(changeset.id)
 
   def delete_changeset(self, changeset):
     """Remove CHANGESET from the graph and also from the databases.
@@ -150,6 +220,7 @@ class ChangesetGraph(object):
 
     del self[changeset.id]
     del self._changeset_db[changeset.id]
+    self.cvs_item_dependencies.discard(changeset.id)
 
   def __nonzero__(self):
     """Instances are considered True iff they contain any nodes."""
@@ -189,9 +260,17 @@ class ChangesetGraph(object):
   def keys(self):
     return self.nodes.keys()
 
+  def iterkeys(self):
+    return self.nodes.iterkeys()
+
   def __iter__(self):
     return self.nodes.itervalues()
 
+  def _iter_pred_ids(self, id):
+    """Iterate over the ids of the predecessors of the node with ID."""
+
+    return iter(self.nodes[id].pred_ids)
+
   def _get_path(self, reachable_changesets, starting_node_id, ending_node_id):
     """Return the shortest path from ENDING_NODE_ID to STARTING_NODE_ID.
 
@@ -216,7 +295,7 @@ class ChangesetGraph(object):
     path.append(self._changeset_db[starting_node_id])
     return path
 
-  def search_for_path(self, starting_node_id, stop_set):
+  def search_for_path(self, starting_node_id, stop_set, members=None):
     """Search for paths to prerequisites of STARTING_NODE_ID.
 
     Try to find the shortest dependency path that causes the changeset
@@ -229,7 +308,10 @@ class ChangesetGraph(object):
     When one of the changeset_ids in STOP_SET is found, terminate the
     search and return the path from that changeset_id to
     STARTING_NODE_ID.  If no path is found to a node in STOP_SET,
-    return None."""
+    return None.
+
+    If MEMBERS is specified, it is a set of node ids, and the search is
+    restricted to the nodes that it contains."""
 
     # A map {node_id : (steps, next_node_id)} where NODE_ID can be
     # reached from STARTING_NODE_ID in STEPS steps, and NEXT_NODE_ID
@@ -237,15 +319,16 @@ class ChangesetGraph(object):
     # only included as a key if there is a loop leading back to it.
     reachable_changesets = {}
 
-    # A list of (node_id, steps) that still have to be investigated,
+    # A queue of (node_id, steps) that still have to be investigated,
     # and STEPS is the number of steps to get to NODE_ID.
-    open_nodes = [(starting_node_id, 0)]
+    open_nodes = deque([(starting_node_id, 0)])
     # A breadth-first search:
     while open_nodes:
-      (id, steps) = open_nodes.pop(0)
+      (id, steps) = open_nodes.popleft()
       steps += 1
-      node = self[id]
-      for pred_id in node.pred_ids:
+      for pred_id in self._iter_pred_ids(id):
+        if members is not None and pred_id not in members:
+          continue
         # Since the search is breadth-first, we only have to set steps
         # that don't already exist.
         if pred_id not in reachable_changesets:
@@ -292,6 +375,7 @@ class ChangesetGraph(object):
     while nopred_nodes:
       (node, changeset,) = nopred_nodes.get()
       del self[node.id]
+      self.cvs_item_dependencies.discard(node.id)
       # See if any successors are now ready for extraction:
       for succ_id in node.succ_ids:
         succ = self[succ_id]
@@ -299,14 +383,18 @@ class ChangesetGraph(object):
           nopred_nodes.add(succ)
       yield (changeset, node.time_range)
 
-  def find_cycle(self, starting_node_id):
+  def find_cycle(self, starting_node_id, members=None):
     """Find a cycle in the dependency graph and return it.
 
     Use STARTING_NODE_ID as the place to start looking.  This routine
     must only be called after all nopred_nodes have been removed.
     Return the list of changesets that are involved in the cycle
     (ordered such that cycle[n-1] is a predecessor of cycle[n] and
-    cycle[-1] is a predecessor of cycle[0])."""
+    cycle[-1] is a predecessor of cycle[0]).
+
+    If MEMBERS is specified, it is a set of node ids containing
+    STARTING_NODE_ID, such as a strongly connected component, and
+    only predecessors within MEMBERS are followed."""
 
     # Since there are no nopred nodes in the graph, all nodes in the
     # graph must either be involved in a cycle or depend (directly or
@@ -322,9 +410,10 @@ class ChangesetGraph(object):
     while True:
       # Pick an arbitrary predecessor of node.  It must exist, because
       # there are no nopred nodes:
-      try:
-        node_id = node.pred_ids.__iter__().next()
-      except StopIteration:
+      for node_id in node.pred_ids:
+        if members is None or node_id in members:
+          break
+      else:
         raise NoPredNodeInGraphException(node)
       node = self[node_id]
       try:
@@ -336,7 +425,7 @@ class ChangesetGraph(object):
         seen_nodes.reverse()
         return [self._changeset_db[node.id] for node in seen_nodes]
 
-  def consume_graph(self, cycle_breaker=None):
+  def consume_graph(self, cycle_breaker=None, components_breaker=None):
     """Remove and yield changesets from this graph in dependency order.
 
     Each iteration, this generator yields a (changeset, time_range)
@@ -349,31 +438,143 @@ class ChangesetGraph(object):
     in place then return.
 
     If a cycle is found and CYCLE_BREAKER was not specified, raise
-    CycleInGraphException."""
+    CycleInGraphException.
+
+    If COMPONENTS_BREAKER is specified, then whenever cycles are
+    encountered, call COMPONENTS_BREAKER(components) with the list of
+    all cyclic components returned by find_cyclic_components()
+    instead.  It should break all of the cycles in the components then
+    return."""
 
     while True:
       for (changeset, time_range) in self.consume_nopred_nodes():
         yield (changeset, time_range)
 
       # If there are any nodes left in the graph, then there must be
-      # at least one cycle.  Find a cycle and process it.
-
-      # This might raise StopIteration, but that indicates that the
-      # graph has been fully consumed, so we just let the exception
-      # escape.
-      start_node_id = self.nodes.iterkeys().next()
-
-      cycle = self.find_cycle(start_node_id)
-
-      if cycle_breaker is not None:
-        cycle_breaker(cycle)
+      # at least one cycle.
+      if not self:
+        return
+
+      if cycle_breaker is None and components_breaker is None:
+        raise CycleInGraphException(self.find_cycle(self.iterkeys().next()))
+
+      # Find all of the cyclic regions of the graph at once, then break
+      # the cycles within each of them:
+      components = self.find_cyclic_components()
+      self.cycle_statistics.record_components(components)
+      if components_breaker is not None:
+        components_breaker(components)
       else:
-        raise CycleInGraphException(cycle)
+        self.break_cyclic_components(
+            components,
+            lambda component: cycle_breaker(
+                self.find_cycle(component[0], set(component))
+                ),
+            )
+
+  def find_cyclic_components(self, ids=None):
+    """Return the strongly connected components that contain cycles.
+
+    Return a list of components, each of which is a list of the ids of
+    the nodes in a strongly connected component of the graph that
+    contains at least one cycle (i.e., that has more than one node, or
+    whose only node depends on itself).  If IDS is specified, consider
+    only the subgraph consisting of the nodes with those ids.
+
+    This is an iterative version of Tarjan's algorithm, following
+    predecessor links."""
+
+    if ids is None:
+      members = None
+      ids = sorted(self.iterkeys())
+    else:
+      members = set(ids)
+
+    # Maps {node_id : index} and {node_id : lowlink} as in Tarjan's
+    # algorithm:
+    indexes = {}
+    lowlinks = {}
+    # The node ids of the components that are still being built:
+    stack = []
+    on_stack = set()
+    components = []
+
+    for root_id in ids:
+      if root_id in indexes:
+        continue
+
+      indexes[root_id] = lowlinks[root_id] = len(indexes)
+      stack.append(root_id)
+      on_stack.add(root_id)
+      # A stack of (node_id, pred_id_iterator) for the depth-first
+      # search that is in progress:
+      work = [(root_id, self._iter_pred_ids(root_id))]
+
+      while work:
+        (id, pred_ids) = work[-1]
+        for pred_id in pred_ids:
+          if members is not None and pred_id not in members:
+            continue
+          if pred_id not in indexes:
+            indexes[pred_id] = lowlinks[pred_id] = len(indexes)
+            stack.append(pred_id)
+            on_stack.add(pred_id)
+            work.append((pred_id, self._iter_pred_ids(pred_id)))
+            break
+          elif pred_id in on_stack:
+            lowlinks[id] = min(lowlinks[id], indexes[pred_id])
+        else:
+          # All of the predecessors of id have been explored:
+          work.pop()
+          if work:
+            parent_id = work[-1][0]
+            lowlinks[parent_id] = min(lowlinks[parent_id], lowlinks[id])
+
+          if lowlinks[id] == indexes[id]:
+            component = []
+            while True:
+              component_id = stack.pop()
+              on_stack.remove(component_id)
+              component.append(component_id)
+              if component_id == id:
+                break
+
+            if len(component) > 1 or id in self._iter_pred_ids(id):
+              components.append(component)
+
+    return components
+
+  def break_cyclic_components(self, components, component_breaker):
+    """Break all of the cycles in COMPONENTS.
+
+    COMPONENTS is a list of cyclic strongly connected components, as
+    returned by find_cyclic_components().  For each component, call
+    COMPONENT_BREAKER(component) with the list of node ids in the
+    component.  COMPONENT_BREAKER must make some progress towards
+    breaking the cycles in the component, using delete_changeset() and
+    add_new_changeset().  Then re-analyse what is left of the
+    component (including any changesets that were added) and continue
+    with any cyclic components that remain.  The contents of
+    COMPONENTS are consumed."""
+
+    self._new_changeset_ids = []
+    try:
+      while components:
+        component = components.pop()
+        component_breaker(component)
+        self.cycle_statistics.num_breaks += 1
+
+        ids = [id for id in component if id in self]
+        ids.extend([id for id in self._new_changeset_ids if id in self])
+        del self._new_changeset_ids[:]
+        components.extend(self.find_cyclic_components(ids))
+    finally:
+      self._new_changeset_ids = None
 
   def __repr__(self):
     """For convenience only.  The format is subject to change at any time."""
 
-    if self.nodes:
+    if self:
       return 'ChangesetGraph:\n%s' \
              % ''.join(['  %r\n' % node for node in self])
     else:
@@ -442,3 +643,671 @@ class ChangesetGraph(object):
     f.write('}\n')
 
 
+
+
+class _DiskArray(object):
+  """An array of node indexes that is stored in a temporary file.
+
+  This class supports the subset of the array.array interface that
+  CompactChangesetGraph uses for its edge arrays.  The file is
+  accessed via mmap, so it is up to the operating system's page cache
+  to decide which parts of the array are kept in RAM."""
+
+  TYPECODE = 'i'
+  ITEMSIZE = array.array(TYPECODE).itemsize
+
+  # The file is grown in increments of this many bytes:
+  GROWTH_INCREMENT = 1024 * 1024
+
+  # The number of entries to process at a time when reading or
+  # writing the array sequentially:
+  CHUNK_SIZE = 65536
+
+  def __init__(self, dirname, length=0, value=0):
+    """Create an array with LENGTH entries, each set to VALUE.
+
+    The backing file is created in directory DIRNAME."""
+
+    (fd, self.filename) = tempfile.mkstemp('', 'graph-', dirname)
+    self._file = os.fdopen(fd, 'wb+')
+    self._len = 0
+    self._filesize = 0
+    self._mmap = None
+    self._reserve(length)
+
+    if value != 0:
+      chunk = array.array(self.TYPECODE, [value]) * self.CHUNK_SIZE
+      for start in xrange(0, length, self.CHUNK_SIZE):
+        n = min(self.CHUNK_SIZE, length - start)
+        self._mmap[start * self.ITEMSIZE:(start + n) * self.ITEMSIZE] = \
+            chunk[:n].tostring()
+    self._len = length
+
+  def _reserve(self, length):
+    """Make sure that the file is big enough to hold LENGTH entries."""
+
+    size = length * self.ITEMSIZE
+    if size <= self._filesize and self._mmap is not None:
+      return
+
+    size = max(
+        (size + self.GROWTH_INCREMENT - 1)
+        // self.GROWTH_INCREMENT * self.GROWTH_INCREMENT,
+        self.GROWTH_INCREMENT,
+        )
+    if self._mmap is None:
+      self._file.truncate(size)
+      self._mmap = mmap.mmap(
+          self._file.fileno(), size, access=mmap.ACCESS_WRITE
+          )
+    else:
+      self._mmap.resize(size)
+    self._filesize = size
+
+  def __len__(self):
+    return self._len
+
+  def __getitem__(self, k):
+    if isinstance(k, slice):
+      (start, stop, stride) = k.indices(self._len)
+      assert stride == 1
+      a = array.array(self.TYPECODE)
+      if start < stop:
+        a.fromstring(
+            self._mmap[start * self.ITEMSIZE:stop * self.ITEMSIZE]
+            )
+      return a
+
+    if not 0 <= k < self._len:
+      raise IndexError(k)
+    return struct.unpack_from('=i', self._mmap, k * self.ITEMSIZE)[0]
+
+  def __setitem__(self, k, value):
+    if not 0 <= k < self._len:
+      raise IndexError(k)
+    struct.pack_into('=i', self._mmap, k * self.ITEMSIZE, value)
+
+  def append(self, value):
+    self._reserve(self._len + 1)
+    struct.pack_into('=i', self._mmap, self._len * self.ITEMSIZE, value)
+    self._len += 1
+
+  def extend(self, values):
+    values = array.array(self.TYPECODE, values)
+    start = self._len
+    self._reserve(start + len(values))
+    self._mmap[start * self.ITEMSIZE:(start + len(values)) * self.ITEMSIZE] = \
+        values.tostring()
+    self._len += len(values)
+
+  def iterchunks(self):
+    """Yield the contents of this array as a series of array.arrays."""
+
+    for start in xrange(0, self._len, self.CHUNK_SIZE):
+      yield self[start:start + self.CHUNK_SIZE]
+
+  def __iter__(self):
+    for chunk in self.iterchunks():
+      for value in chunk:
+        yield value
+
+  def remap(self, mapping):
+    """Replace each entry i with MAPPING[i]."""
+
+    for start in xrange(0, self._len, self.CHUNK_SIZE):
+      chunk = self[start:start + self.CHUNK_SIZE]
+      chunk = array.array(self.TYPECODE, [mapping[i] for i in chunk])
+      self._mmap[
+          start * self.ITEMSIZE:(start + len(chunk)) * self.ITEMSIZE
+          ] = chunk.tostring()
+
+  def close(self):
+    if self._mmap is not None:
+      self._mmap.close()
+      self._mmap = None
+    self._file.close()
+    os.remove(self.filename)
+
+
+def _remap(a, mapping):
+  """Replace each entry i of array A with MAPPING[i]."""
+
+  if isinstance(a, _DiskArray):
+    a.remap(mapping)
+  else:
+    for k in xrange(len(a)):
+      a[k] = mapping[a[k]]
+
+
+def _discard(a):
+  """Release the resources held by array A."""
+
+  if isinstance(a, _DiskArray):
+    a.close()
+
+
+class CompactChangesetGraph(ChangesetGraph):
+  """A ChangesetGraph that stores its nodes and edges in arrays.
+
+  ChangesetGraph keeps a ChangesetGraphNode instance, two sets, and a
+  TimeRange for every changeset, which adds up to tens of gigabytes
+  for graphs with millions of changesets.  This class stores the same
+  information in arrays from the array module.
+
+  Each changeset is assigned a node index in the order that it is
+  added to the graph.  The following arrays are indexed by node
+  index:
+
+    _ids -- the changeset id of the node, or -1 if the node has been
+        deleted.
+
+    _t_mins, _t_maxs -- the node's time range.  These are stored as
+        doubles so that timestamps and the TimeRange sentinel values
+        can be represented exactly on every platform.
+
+    _pred_counts -- the number of predecessors that the node still
+        has in the graph.
+
+  _indexes is an array indexed by changeset id, holding the node index
+  of each changeset or -1 if the changeset is not in the graph.
+
+  Edges are stored in compressed sparse row (CSR) form: the indexes
+  of the predecessors of node i are stored in _pred_targets[
+  _pred_starts[i]:_pred_starts[i + 1]], and similarly for successors.
+  The CSR arrays cover the first _num_frozen nodes.  Deleting an edge
+  overwrites its CSR entry with -1 (a tombstone).
+
+  Edges recorded while the graph is being filled are collected in
+  _new_edge_preds and _new_edge_succs and converted into CSR form by
+  _freeze() when the graph is first queried.  Edges added after that
+  (e.g., for changesets created when breaking cycles) are kept in
+  per-node overflow arrays in _extra_preds and _extra_succs until
+  there are enough of them to make it worthwhile to rebuild the CSR
+  arrays.
+
+  If MEMORY_LIMIT is specified, then as soon as the edges would take
+  more than MEMORY_LIMIT bytes, the edge arrays (_new_edge_preds,
+  _new_edge_succs, _pred_targets, and _succ_targets) are moved to
+  temporary files (see _DiskArray).  In that case the nodes are
+  renumbered in approximate commit order before the CSR arrays are
+  built, so that consume_graph() and consume_nopred_nodes() read the
+  adjacency lists roughly sequentially.  Everything else still lives
+  in RAM, but it needs only a few dozen bytes per node.
+
+  The ChangesetGraphNode instances returned by __getitem__(), get(),
+  and __iter__() are snapshots; modifying them does not affect the
+  graph."""
+
+  # Rebuild the CSR arrays when the number of overflow edges exceeds
+  # both this number and the size of the CSR arrays:
+  MIN_REBUILD_EDGES = 10000
+
+  # The approximate number of bytes of memory needed per edge when
+  # building the CSR arrays in memory:
+  BYTES_PER_EDGE = 4 * array.array('l').itemsize
+
+  def __init__(
+        self, changeset_db, cvs_item_to_changeset_id, memory_limit=None
+        ):
+    self._changeset_db = changeset_db
+    self._cvs_item_to_changeset_id = cvs_item_to_changeset_id
+    self._memory_limit = memory_limit
+    self._edges_on_disk = False
+
+    self._indexes = array.array('l')
+    self._ids = array.array('l')
+    self._t_mins = array.array('d')
+    self._t_maxs = array.array('d')
+    self._pred_counts = array.array('l')
+
+    # The number of nodes that have not been deleted:
+    self._num_nodes = 0
+
+    # All nodes with indexes less than this have been deleted:
+    self._first_live = 0
+
+    self._new_edge_preds = self._create_edge_array()
+    self._new_edge_succs = self._create_edge_array()
+
+    self._frozen = False
+    self._num_frozen = 0
+    self._pred_starts = array.array('l', [0])
+    self._pred_targets = self._create_edge_array()
+    self._succ_starts = array.array('l', [0])
+    self._succ_targets = self._create_edge_array()
+
+    # Maps {node_index : array of node_index}:
+    self._extra_preds = {}
+    self._extra_succs = {}
+    self._num_extra_edges = 0
+
+    self.cycle_statistics = CycleStatistics()
+    self.cvs_item_dependencies = CVSItemDependencyCache()
+    self._new_changeset_ids = None
+
+  def close(self):
+    ChangesetGraph.close(self)
+    for a in [
+          self._new_edge_preds, self._new_edge_succs,
+          self._pred_targets, self._succ_targets,
+          ]:
+      _discard(a)
+    self._new_edge_preds = self._new_edge_succs = None
+    self._pred_targets = self._succ_targets = None
+
+  def _create_edge_array(self, length=0, value=0):
+    """Return an array of LENGTH node indexes, each set to VALUE.
+
+    Return a _DiskArray if the edges have been moved to disk."""
+
+    if self._edges_on_disk:
+      return _DiskArray(Ctx().tmpdir, length, value)
+    else:
+      return array.array('l', [value]) * length
+
+  def _move_edges_to_disk(self):
+    """Move the edges recorded so far into temporary files."""
+
+    logger.verbose(
+        'Moving changeset graph edges to disk (%d edges so far)'
+        % (len(self._new_edge_preds),)
+        )
+    self._edges_on_disk = True
+    for name in ['_new_edge_preds', '_new_edge_succs']:
+      a = self._create_edge_array()
+      a.extend(getattr(self, name))
+      setattr(self, name, a)
+
+  def _find_index(self, id):
+    """Return the node index of changeset ID, or -1 if it is absent."""
+
+    if 0 <= id < len(self._indexes):
+      return self._indexes[id]
+    else:
+      return -1
+
+  def _get_index(self, id):
+    """Return the node index of changeset ID.
+
+    Raise KeyError if the changeset is not in the graph."""
+
+    i = self._find_index(id)
+    if i < 0:
+      raise KeyError(id)
+    return i
+
+  def _add_edge(self, pred_index, succ_index):
+    if self._frozen:
+      self._extra_succs.setdefault(
+          pred_index, array.array('l')
+          ).append(succ_index)
+      self._extra_preds.setdefault(
+          succ_index, array.array('l')
+          ).append(pred_index)
+      self._num_extra_edges += 1
+    else:
+      self._new_edge_preds.append(pred_index)
+      self._new_edge_succs.append(succ_index)
+      if (
+            self._memory_limit is not None
+            and not self._edges_on_disk
+            and len(self._new_edge_preds) * self.BYTES_PER_EDGE
+                > self._memory_limit
+            ):
+        self._move_edges_to_disk()
+    self._pred_counts[succ_index] += 1
+
+  def _remove_edge(self, starts, targets, extras, i, j):
+    """Remove node index J from the adjacency list of node I.
+
+    STARTS, TARGETS, and EXTRAS are the CSR and overflow structures
+    for the adjacency list (preds or succs) that should be changed."""
+
+    if i < self._num_frozen:
+      for k in xrange(starts[i], starts[i + 1]):
+        if targets[k] == j:
+          targets[k] = -1
+          return
+
+    extra = extras[i]
+    extra.remove(j)
+    if not extra:
+      del extras[i]
+
+  def _iter_adjacent(self, starts, targets, extras, i):
+    """Yield the node indexes in one of the adjacency lists of node I."""
+
+    if i < self._num_frozen:
+      for j in targets[starts[i]:starts[i + 1]]:
+        if j >= 0:
+          yield j
+
+    extra = extras.get(i)
+    if extra is not None:
+      for j in extra:
+        yield j
+
+  def _iter_preds(self, i):
+    return self._iter_adjacent(
+        self._pred_starts, self._pred_targets, self._extra_preds, i
+        )
+
+  def _iter_succs(self, i):
+    return self._iter_adjacent(
+        self._succ_starts, self._succ_targets, self._extra_succs, i
+        )
+
+  def _build_adjacency(self, num_nodes, sources, targets):
+    """Return (starts, adjacency) CSR arrays for edges SOURCES -> TARGETS.
+
+    SOURCES and TARGETS are parallel arrays of node indexes.  The
+    entries for each source node are stored in the order that they
+    appear in SOURCES."""
+
+    starts = array.array('l', [0]) * (num_nodes + 1)
+    for i in sources:
+      starts[i + 1] += 1
+    for i in xrange(num_nodes):
+      starts[i + 1] += starts[i]
+
+    fill = starts[:-1]
+    adjacency = self._create_edge_array(len(sources), -1)
+    for (i, j) in itertools.izip(sources, targets):
+      adjacency[fill[i]] = j
+      fill[i] += 1
+
+    return (starts, adjacency)
+
+  def _renumber_nodes(self):
+    """Renumber the nodes in the order that they are likely to be consumed.
+
+    This must only be called before the CSR arrays are first built."""
+
+    assert not self._frozen
+
+    t_mins = self._t_mins
+    t_maxs = self._t_maxs
+    order = range(len(self._ids))
+    order.sort(key=lambda i: (t_maxs[i], t_mins[i]))
+
+    # An array {old node index : new node index}:
+    new_indexes = array.array('l', [0]) * len(order)
+    for (new_i, i) in enumerate(order):
+      new_indexes[i] = new_i
+
+    for name in ['_ids', '_t_mins', '_t_maxs', '_pred_counts']:
+      old = getattr(self, name)
+      setattr(self, name, array.array(old.typecode, [old[i] for i in order]))
+
+    for (i, id) in enumerate(self._ids):
+      self._indexes[id] = i
+
+    _remap(self._new_edge_preds, new_indexes)
+    _remap(self._new_edge_succs, new_indexes)
+
+  def _build_csr(self):
+    """Rebuild the CSR arrays to hold all of the edges in the graph."""
+
+    num_nodes = len(self._ids)
+    edge_preds = self._new_edge_preds
+    edge_succs = self._new_edge_succs
+
+    if self._frozen:
+      ids = self._ids
+      for i in xrange(self._first_live, num_nodes):
+        if ids[i] >= 0:
+          for j in self._iter_succs(i):
+            edge_preds.append(i)
+            edge_succs.append(j)
+    elif self._edges_on_disk:
+      self._renumber_nodes()
+
+    self._new_edge_preds = self._create_edge_array()
+    self._new_edge_succs = self._create_edge_array()
+    self._extra_preds = {}
+    self._extra_succs = {}
+    self._num_extra_edges = 0
+
+    _discard(self._pred_targets)
+    _discard(self._succ_targets)
+    (self._pred_starts, self._pred_targets) = self._build_adjacency(
+        num_nodes, edge_succs, edge_preds
+        )
+    (self._succ_starts, self._succ_targets) = self._build_adjacency(
+        num_nodes, edge_preds, edge_succs
+        )
+    _discard(edge_preds)
+    _discard(edge_succs)
+    self._num_frozen = num_nodes
+    self._frozen = True
+
+  def _freeze(self):
+    """Make sure that the edges recorded so far are stored in CSR form."""
+
+    if not self._frozen or self._new_edge_preds:
+      self._build_csr()
+
+  def add_changeset(self, changeset):
+    node = changeset.create_graph_node(self._cvs_item_to_changeset_id)
+
+    i = len(self._ids)
+    self._ids.append(node.id)
+    self._t_mins.append(node.time_range.t_min)
+    self._t_maxs.append(node.time_range.t_max)
+    self._pred_counts.append(0)
+
+    for pred_id in node.pred_ids:
+      j = self._find_index(pred_id)
+      if j >= 0:
+        self._add_edge(j, i)
+
+    for succ_id in node.succ_ids:
+      j = self._find_index(succ_id)
+      if j >= 0:
+        self._add_edge(i, j)
+
+    if node.id >= len(self._indexes):
+      self._indexes.extend(
+          array.array('l', [-1]) * (node.id + 1 - len(self._indexes))
+          )
+    self._indexes[node.id] = i
+    self._num_nodes += 1
+
+    if self._num_extra_edges > max(
+          self.MIN_REBUILD_EDGES, len(self._succ_targets)
+          ):
+      self._build_csr()
+
+  def _get_time_range(self, i):
+    time_range = TimeRange()
+    time_range.t_min = int(self._t_mins[i])
+    time_range.t_max = int(self._t_maxs[i])
+    return time_range
+
+  def _get_node(self, i):
+    """Return a ChangesetGraphNode snapshot of the node with index I."""
+
+    ids = self._ids
+    return ChangesetGraphNode(
+        ids[i], self._get_time_range(i),
+        set([ids[j] for j in self._iter_preds(i)]),
+        set([ids[j] for j in self._iter_succs(i)]),
+        )
+
+  def __nonzero__(self):
+    return self._num_nodes > 0
+
+  def __contains__(self, id):
+    return self._find_index(id) >= 0
+
+  def __getitem__(self, id):
+    self._freeze()
+    return self._get_node(self._get_index(id))
+
+  def get(self, id):
+    try:
+      return self[id]
+    except KeyError:
+      return None
+
+  def _delete_index(self, i):
+    """Remove the node with index I and the edges that refer to it.
+
+    The adjacency lists of node I itself are left unchanged."""
+
+    for j in self._iter_succs(i):
+      self._remove_edge(
+          self._pred_starts, self._pred_targets, self._extra_preds, j, i
+          )
+      self._pred_counts[j] -= 1
+
+    for j in self._iter_preds(i):
+      self._remove_edge(
+          self._succ_starts, self._succ_targets, self._extra_succs, j, i
+          )
+
+    self._indexes[self._ids[i]] = -1
+    self._ids[i] = -1
+    self._num_nodes -= 1
+
+  def __delitem__(self, id):
+    self._freeze()
+    i = self._get_index(id)
+    self._delete_index(i)
+    # Nobody will look at the deleted node's own overflow lists:
+    self._extra_preds.pop(i, None)
+    self._extra_succs.pop(i, None)
+
+  def iterkeys(self):
+    ids = self._ids
+    while self._first_live < len(ids) and ids[self._first_live] < 0:
+      self._first_live += 1
+
+    for i in xrange(self._first_live, len(ids)):
+      if ids[i] >= 0:
+        yield ids[i]
+
+  def keys(self):
+    return list(self.iterkeys())
+
+  def __iter__(self):
+    self._freeze()
+    for id in self.iterkeys():
+      yield self._get_node(self._indexes[id])
+
+  def _iter_pred_ids(self, id):
+    ids = self._ids
+    for j in self._iter_preds(self._indexes[id]):
+      yield ids[j]
+
+  def find_cyclic_components(self, ids=None):
+    self._freeze()
+    return ChangesetGraph.find_cyclic_components(self, ids)
+
+  def search_for_path(self, starting_node_id, stop_set, members=None):
+    self._freeze()
+    ids = self._ids
+
+    # See ChangesetGraph.search_for_path() for the meaning of these:
+    reachable_changesets = {}
+    open_nodes = deque([(self._get_index(starting_node_id), 0)])
+    while open_nodes:
+      (i, steps) = open_nodes.popleft()
+      steps += 1
+      id = ids[i]
+      for j in self._iter_preds(i):
+        pred_id = ids[j]
+        if members is not None and pred_id not in members:
+          continue
+        if pred_id not in reachable_changesets:
+          reachable_changesets[pred_id] = (steps, id)
+          open_nodes.append((j, steps))
+
+          if pred_id in stop_set:
+            return self._get_path(
+                reachable_changesets, starting_node_id, pred_id
+                )
+
+    return None
+
+  def consume_nopred_nodes(self):
+    self._freeze()
+    ids = self._ids
+    t_mins = self._t_mins
+    t_maxs = self._t_maxs
+    pred_counts = self._pred_counts
+    changeset_db = self._changeset_db
+
+    # A heapified list of (t_max, t_min, changeset, node_index) tuples
+    # for the nodes that have no predecessors.  These sort in the same
+    # order as the tuples used by _NoPredNodes:
+    nopred_nodes = [
+        (t_maxs[i], t_mins[i], changeset_db[ids[i]], i)
+        for i in xrange(self._first_live, len(ids))
+        if ids[i] >= 0 and not pred_counts[i]
+        ]
+    heapq.heapify(nopred_nodes)
+
+    while nopred_nodes:
+      (t_max, t_min, changeset, i) = heapq.heappop(nopred_nodes)
+      self._delete_index(i)
+      self.cvs_item_dependencies.discard(changeset.id)
+      # See if any successors are now ready for extraction:
+      for j in self._iter_succs(i):
+        if not pred_counts[j]:
+          heapq.heappush(
+              nopred_nodes, (t_maxs[j], t_mins[j], changeset_db[ids[j]], j)
+              )
+      self._extra_preds.pop(i, None)
+      self._extra_succs.pop(i, None)
+      yield (changeset, self._get_time_range(i))
+
+  def find_cycle(self, starting_node_id, members=None):
+    self._freeze()
+    ids = self._ids
+    i = self._get_index(starting_node_id)
+
+    # A list of the node indexes visited so far, and a map {node_index
+    # : position in seen_nodes}:
+    seen_nodes = [i]
+    positions = {i : 0}
+
+    # Follow the first predecessor of each node until a node is seen a
+    # second time; then we have our cycle.
+    while True:
+      for j in self._iter_preds(i):
+        if members is None or ids[j] in members:
+          break
+      else:
+        raise NoPredNodeInGraphException(self._get_node(i))
+      i = j
+      if i in positions:
+        seen_nodes = seen_nodes[positions[i]:]
+        seen_nodes.reverse()
+        return [self._changeset_db[ids[k]] for k in seen_nodes]
+      positions[i] = len(seen_nodes)
+      seen_nodes.append(i)
+
+
+def create_changeset_graph(
+      changeset_db, cvs_item_to_changeset_id, num_changesets
+      ):
+  """Return an empty graph suitable for NUM_CHANGESETS changesets.
+
+  Return a CompactChangesetGraph if NUM_CHANGESETS is at least
+  compact_changeset_graph_threshold or if changeset_graph_memory_limit
+  is set; otherwise, return a ChangesetGraph."""
+
+  if changeset_graph_memory_limit is not None:
+    return CompactChangesetGraph(
+        changeset_db, cvs_item_to_changeset_id,
+        memory_limit=changeset_graph_memory_limit,
+        )
+  elif num_changesets >= compact_changeset_graph_threshold:
+    logger.verbose(
+        'Using a compact changeset graph for %d changesets'
+        % (num_changesets,)
+        )
+    return CompactChangesetGraph(changeset_db, cvs_item_to_changeset_id)
+  else:
+    return ChangesetGraph(changeset_db, cvs_item_to_changeset_id)
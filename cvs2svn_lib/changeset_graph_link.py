@@ -31,8 +31,77 @@ LINK_SUCC = 2
 LINK_PASSTHRU = LINK_PRED | LINK_SUCC
 
 
+class CVSItemDependencyCache(object):
+  """Cache the dependencies of the CVSItems in changesets.
+
+  To compare and break links, ChangesetGraphLink only needs the ids of
+  the CVSItems in each changeset and the ids of their predecessors and
+  successors.  Reading the CVSItems from Ctx()._cvs_items_db to get
+  that information is expensive, and the cycle breaking passes examine
+  the same changesets over and over.  This class remembers the
+  information for each changeset that it has been asked about.
+
+  The dependencies of a CVSItem never change; only the changeset that
+  it belongs to does.  So when a changeset is split, the entries for
+  the new changesets are derived from the entry for the old one (see
+  split()), without reading any CVSItems."""
+
+  def __init__(self):
+    # A map {changeset_id : (cvs_item_ids, items)}, where cvs_item_ids
+    # is a frozenset of the ids of the CVSItems in the changeset and
+    # items is a tuple of (cvs_item_id, pred_ids, succ_ids) for the
+    # items, in the order that Changeset.iter_cvs_items() yields them:
+    self._entries = {}
+
+  def _get_entry(self, changeset):
+    entry = self._entries.get(changeset.id)
+    if entry is None:
+      entry = (
+          frozenset(changeset.cvs_item_ids),
+          tuple([
+              (cvs_item.id, cvs_item.get_pred_ids(), cvs_item.get_succ_ids())
+              for cvs_item in changeset.iter_cvs_items()
+              ]),
+          )
+      self._entries[changeset.id] = entry
+    return entry
+
+  def get_cvs_item_ids(self, changeset):
+    """Return a frozenset of the ids of the CVSItems in CHANGESET."""
+
+    return self._get_entry(changeset)[0]
+
+  def get_dependencies(self, changeset):
+    """Return (cvs_item_id, pred_ids, succ_ids) for the items in CHANGESET.
+
+    The tuples are returned in the order that
+    CHANGESET.iter_cvs_items() would yield the items."""
+
+    return self._get_entry(changeset)[1]
+
+  def split(self, changeset, new_changesets):
+    """Record that CHANGESET has been split into NEW_CHANGESETS."""
+
+    entry = self._entries.pop(changeset.id, None)
+    if entry is None:
+      return
+
+    for new_changeset in new_changesets:
+      cvs_item_ids = frozenset(new_changeset.cvs_item_ids)
+      # Keep the items in the same relative order:
+      self._entries[new_changeset.id] = (
+          cvs_item_ids,
+          tuple([item for item in entry[1] if item[0] in cvs_item_ids]),
+          )
+
+  def discard(self, changeset_id):
+    """Forget about the changeset with CHANGESET_ID, if it is known."""
+
+    self._entries.pop(changeset_id, None)
+
+
 class ChangesetGraphLink(object):
-  def __init__(self, pred, changeset, succ):
+  def __init__(self, pred, changeset, succ, cvs_item_dependencies=None):
     """Represent a link in a loop in a changeset graph.
 
     This is the link that goes from PRED -> CHANGESET -> SUCC.
@@ -40,40 +109,66 @@ class ChangesetGraphLink(object):
     We are mainly concerned with how many CVSItems have LINK_PRED,
     LINK_SUCC, and LINK_PASSTHRU type links to the neighboring
     commitsets.  If necessary, this class can also break up CHANGESET
-    into multiple changesets."""
+    into multiple changesets.
 
-    self.pred = pred
-    self.pred_ids = set(pred.cvs_item_ids)
+    If CVS_ITEM_DEPENDENCIES is specified, it is a
+    CVSItemDependencyCache that is used to look up the CVSItems'
+    dependencies and that is updated if CHANGESET is broken up."""
 
-    self.changeset = changeset
+    self._cvs_item_dependencies = cvs_item_dependencies
 
-    self.succ_ids = set(succ.cvs_item_ids)
+    self.pred = pred
+    self.changeset = changeset
     self.succ = succ
 
+    if cvs_item_dependencies is None:
+      self.pred_ids = set(pred.cvs_item_ids)
+      self.succ_ids = set(succ.cvs_item_ids)
+      # A list of (cvs_item_id, pred_ids, succ_ids) for the CVSItems
+      # in changeset:
+      self._items = [
+          (cvs_item.id, cvs_item.get_pred_ids(), cvs_item.get_succ_ids())
+          for cvs_item in changeset.iter_cvs_items()
+          ]
+    else:
+      self.pred_ids = cvs_item_dependencies.get_cvs_item_ids(pred)
+      self.succ_ids = cvs_item_dependencies.get_cvs_item_ids(succ)
+      self._items = cvs_item_dependencies.get_dependencies(changeset)
+
     # A count of each type of link for cvs_items in changeset
     # (indexed by LINK_* constants):
     link_counts = [0] * 4
 
-    for cvs_item in list(changeset.iter_cvs_items()):
-      link_counts[self.get_link_type(cvs_item)] += 1
+    for (cvs_item_id, pred_ids, succ_ids) in self._items:
+      link_counts[self._get_link_type(pred_ids, succ_ids)] += 1
 
     [self.pred_links, self.succ_links, self.passthru_links] = link_counts[1:]
 
-  def get_link_type(self, cvs_item):
-    """Return the type of links from CVS_ITEM to self.PRED and self.SUCC.
+  def _get_link_type(self, pred_ids, succ_ids):
+    """Return the type of links from a CVSItem to self.PRED and self.SUCC.
 
-    The return value is one of LINK_NONE, LINK_PRED, LINK_SUCC, or
-    LINK_PASSTHRU."""
+    PRED_IDS and SUCC_IDS are the ids of the CVSItem's predecessors
+    and successors."""
 
     retval = LINK_NONE
 
-    if cvs_item.get_pred_ids() & self.pred_ids:
+    if self.pred_ids & pred_ids:
       retval |= LINK_PRED
-    if cvs_item.get_succ_ids() & self.succ_ids:
+    if self.succ_ids & succ_ids:
       retval |= LINK_SUCC
 
     return retval
 
+  def get_link_type(self, cvs_item):
+    """Return the type of links from CVS_ITEM to self.PRED and self.SUCC.
+
+    The return value is one of LINK_NONE, LINK_PRED, LINK_SUCC, or
+    LINK_PASSTHRU."""
+
+    return self._get_link_type(
+        cvs_item.get_pred_ids(), cvs_item.get_succ_ids()
+        )
+
   def get_links_to_move(self):
     """Return the number of items that would be moved to split changeset."""
 
@@ -129,18 +224,23 @@ class ChangesetGraphLink(object):
       destination[LINK_NONE] = pred_items
       destination[LINK_PASSTHRU] = pred_items
 
-    for cvs_item in self.changeset.iter_cvs_items():
-      link_type = self.get_link_type(cvs_item)
-      destination[link_type].append(cvs_item.id)
+    for (cvs_item_id, pred_ids, succ_ids) in self._items:
+      link_type = self._get_link_type(pred_ids, succ_ids)
+      destination[link_type].append(cvs_item_id)
 
     # Create new changesets of the same type as the old one:
-    return [
+    new_changesets = [
         self.changeset.create_split_changeset(
             changeset_key_generator.gen_id(), pred_items),
         self.changeset.create_split_changeset(
             changeset_key_generator.gen_id(), succ_items),
         ]
 
+    if self._cvs_item_dependencies is not None:
+      self._cvs_item_dependencies.split(self.changeset, new_changesets)
+
+    return new_changesets
+
   def __str__(self):
     return 'Link<%x>(%d, %d, %d)' % (
         self.changeset.id,
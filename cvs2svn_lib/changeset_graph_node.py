@@ -22,10 +22,10 @@ class ChangesetGraphNode(object):
 
   __slots__ = ['id', 'time_range', 'pred_ids', 'succ_ids']
 
-  def __init__(self, changeset, time_range, pred_ids, succ_ids):
+  def __init__(self, id, time_range, pred_ids, succ_ids):
     # The id of the ChangesetGraphNode is the same as the id of the
     # changeset.
-    self.id = changeset.id
+    self.id = id
 
     # The range of times of CVSItems within this Changeset.
     self.time_range = time_range
@@ -77,6 +77,7 @@ deltatext is also deleted from the delta database."""
 
 
 from cvs2svn_lib import config
+from cvs2svn_lib import counters
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import warning_prefix
@@ -88,6 +89,7 @@ from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.log import logger
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_item import CVSRevisionModification
+from cvs2svn_lib.database import Database
 from cvs2svn_lib.indexed_database import IndexedDatabase
 from cvs2svn_lib.rcs_stream import RCSStream
 from cvs2svn_lib.rcs_stream import MalformedDeltaException
@@ -209,6 +211,8 @@ class DeltaTextRecord(TextRecord):
     text_record_db[self.pred_id].refcount += 1
 
   def checkout(self, text_record_db):
+    if counters.enabled:
+      counters.add('checkout cache misses')
     base_text = text_record_db[self.pred_id].checkout(text_record_db)
     rcs_stream = RCSStream(base_text)
     delta_text = text_record_db.delta_db[self.id]
@@ -255,6 +259,8 @@ class CheckedOutTextRecord(TextRecord):
     (self.id, self.refcount,) = state
 
   def checkout(self, text_record_db):
+    if counters.enabled:
+      counters.add('checkout cache hits')
     text = text_record_db.checkout_db['%x' % self.id]
     self.decrement_refcount(text_record_db)
     return text
@@ -630,12 +636,6 @@ class InternalRevisionReader(RevisionReader):
   """A RevisionReader that reads the contents from an own delta store."""
 
   def __init__(self, compress):
-    # Only import Database if an InternalRevisionReader is really
-    # instantiated, because the import fails if a decent dbm is not
-    # installed.
-    from cvs2svn_lib.database import Database
-    self._Database = Database
-
     self._compress = compress
 
   def register_artifacts(self, which_pass):
@@ -668,7 +668,7 @@ class InternalRevisionReader(RevisionReader):
     serializer = MarshalSerializer()
     if self._compress:
       serializer = CompressingSerializer(serializer)
-    self._co_db = self._Database(
+    self._co_db = Database(
         artifact_manager.get_temp_file(config.CVS_CHECKOUT_DB),
         DB_OPEN_NEW, serializer,
         )
@@ -50,6 +50,7 @@ or branch.
 import re
 
 from cvs2svn_lib import config
+from cvs2svn_lib import event_tracer
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.common import error_prefix
@@ -1165,8 +1166,12 @@ class CollectData:
       if isinstance(cvs_path, CVSDirectory):
         self.add_cvs_directory(cvs_path)
       else:
+        if event_tracer.enabled:
+          event_tracer.begin(cvs_path.rcs_path, 'file')
         cvs_file_items = pdc.process_file(cvs_path)
         self._process_cvs_file_items(cvs_file_items)
+        if event_tracer.enabled:
+          event_tracer.end(cvs_path.rcs_path, 'file')
         found_rcs_file = True
 
     if not found_rcs_file:
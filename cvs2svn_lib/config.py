@@ -38,16 +38,23 @@ ITEM_SERIALIZER = 'item-serializer.pck'
 
 # The first file contains the CVSRevisions in a form that can be
 # sorted to deduce preliminary Changesets.  The second file is the
-# sorted version of the first.
+# sorted version of the first.  If the first file is small enough,
+# FilterSymbolsPass sorts it in memory, writes the result directly to
+# the second file, and leaves the first file empty.
 CVS_REVS_DATAFILE = 'revs.dat'
 CVS_REVS_SORTED_DATAFILE = 'revs-s.dat'
 
 # The first file contains the CVSSymbols in a form that can be sorted
 # to deduce preliminary Changesets.  The second file is the sorted
-# version of the first.
+# version of the first.  The first file is handled like
+# CVS_REVS_DATAFILE.
 CVS_SYMBOLS_DATAFILE = 'symbols.dat'
 CVS_SYMBOLS_SORTED_DATAFILE = 'symbols-s.dat'
 
+# The successors of each CVSRevision that are CVSRevisions, stored in
+# columnar form (see NewCVSRevisionSummary).
+CVS_REVS_SUMMARY_DATAFILE = 'revs-summary.dat'
+
 # A mapping from CVSItem id to Changeset id.
 CVS_ITEM_TO_CHANGESET = 'cvs-item-to-changeset.dat'
 
@@ -87,10 +94,11 @@ CHANGESETS_SYMBROKEN_STORE = 'changesets-symbroken.pck'
 CHANGESETS_ALLBROKEN_INDEX = 'changesets-allbroken-index.dat'
 CHANGESETS_ALLBROKEN_STORE = 'changesets-allbroken.pck'
 
-# The RevisionChangesets in commit order.  Each line contains the
-# changeset id and timestamp of one changeset, in hexadecimal, in the
-# order that the changesets should be committed to svn.
-CHANGESETS_SORTED_DATAFILE = 'changesets-s.txt'
+# The RevisionChangesets in commit order.  Each fixed-width binary
+# record contains the changeset id and timestamp of one changeset (see
+# record_file.py), in the order that the changesets should be
+# committed to svn.
+CHANGESETS_SORTED_DATAFILE = 'changesets-s.dat'
 
 # A file containing a marshalled copy of all the statistics that have
 # been gathered so far is written at the end of each pass as a
@@ -98,30 +106,46 @@ CHANGESETS_SORTED_DATAFILE = 'changesets-s.txt'
 # filenames.
 STATISTICS_FILE = 'statistics-%02d.pck'
 
-# This text file contains records (1 per line) that describe openings
-# and closings for copies to tags and branches.  The format is as
-# follows:
+# The fingerprints of the passes that are done, used to decide which
+# passes can be skipped when a conversion is re-run (see
+# pass_fingerprint.py).  This file is not an artifact; it is kept
+# until all of the passes' outputs have been cleaned up.
+PASS_FINGERPRINTS = 'pass-fingerprints.pck'
+
+# The samples taken by the sampling profiler (--sample-profile) in a
+# pass that was run in a child process, to be collected by the parent
+# process.  This is the pattern used to generate the filenames.
+SAMPLES_FILE = 'samples-%02d.txt'
+
+# The events recorded for the timeline (--write-trace) in a pass that
+# was run in a child process, to be collected by the parent process.
+# This is the pattern used to generate the filenames.
+TRACE_EVENTS_FILE = 'trace-events-%02d.pck'
+
+# This file contains fixed-width binary records (see record_file.py)
+# that describe openings and closings for copies to tags and branches.
+# Each record has the following fields:
 #
 #     SYMBOL_ID SVN_REVNUM TYPE CVS_SYMBOL_ID
 #
 # where type is either OPENING or CLOSING.  CVS_SYMBOL_ID is the id of
-# the CVSSymbol whose opening or closing is being described (in hex).
-SYMBOL_OPENINGS_CLOSINGS = 'symbolic-names.txt'
+# the CVSSymbol whose opening or closing is being described.
+SYMBOL_OPENINGS_CLOSINGS = 'symbolic-names.dat'
 # A sorted version of the above file.  SYMBOL_ID and SVN_REVNUM are
 # the primary and secondary sorting criteria.  It is important that
 # SYMBOL_IDs be located together to make it quick to read them at
 # once.  The order of SVN_REVNUM is only important because it is
 # assumed by some internal consistency checks.
-SYMBOL_OPENINGS_CLOSINGS_SORTED = 'symbolic-names-s.txt'
+SYMBOL_OPENINGS_CLOSINGS_SORTED = 'symbolic-names-s.dat'
 
 # Skeleton version of the repository filesystem.  See class
 # RepositoryMirror for how these work.
 MIRROR_NODES_INDEX_TABLE = 'mirror-nodes-index.dat'
 MIRROR_NODES_STORE = 'mirror-nodes.pck'
 
-# Offsets pointing to the beginning of each symbol's records in
+# Indexes of the first of each symbol's records in
 # SYMBOL_OPENINGS_CLOSINGS_SORTED.  This file contains a pickled map
-# from symbol_id to file offset.
+# from symbol_id to record index.
 SYMBOL_OFFSETS_DB = 'symbol-offsets.pck'
 
 # Pickled map of CVSPath.id to instance.
@@ -210,3 +234,7 @@ GIT_BLOB_DATAFILE = "git-blobs.dat"
 # flush a commit if a 5 minute gap occurs.
 COMMIT_THRESHOLD = 5 * 60
 
+
+# The number of functions to list (by cumulative time) for each pass
+# that is profiled with --profile-pass.
+PROFILE_TOP_FUNCTIONS = 25
@@ -55,11 +55,17 @@ class Ctx:
     self.cvs_filename_decoder = CVSTextDecoder(['ascii'])
     self.decode_apple_single = False
     self.symbol_info_filename = None
+    self.pass_report_filename = None
+    self.count_operations = False
+    self.trace_filename = None
     self.username = None
     self.file_property_setters = []
     self.revision_property_setters = []
     self.tmpdir = None
+    self.jobs = 1
+    self.memory_limit = None
     self.skip_cleanup = False
+    self.reuse_passes = True
     self.keep_cvsignore = False
     self.cross_project_commits = True
     self.cross_branch_commits = True
@@ -0,0 +1,63 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Count how often the hot paths of the conversion are taken.
+
+This module keeps a registry of named counters (e.g., the number of
+RCS deltas applied, or the number of cache misses of a database).
+PassManager resets the registry at the start of each pass and records
+its contents in the pass's StatsKeeper at the end, so the counters are
+reported separately for each pass.
+
+Counting is turned off unless enabled is set to True (with
+--count-operations).  To keep the cost near zero when it is off, code
+on hot paths should check enabled before calling add() or add_time():
+
+    if counters.enabled:
+      counters.add('RCS deltas applied')
+"""
+
+
+# Is counting turned on?
+enabled = False
+
+# A map {name : value}.  The values of counters are integers and those
+# of timers are floats (in seconds):
+_values = {}
+
+
+def add(name, n=1):
+  """Add N to the counter called NAME."""
+
+  _values[name] = _values.get(name, 0) + n
+
+
+def add_time(name, seconds):
+  """Add SECONDS to the timer called NAME."""
+
+  _values[name] = _values.get(name, 0.0) + seconds
+
+
+def reset():
+  """Reset all counters and timers, e.g., at the start of a pass."""
+
+  _values.clear()
+
+
+def get_values():
+  """Return a map {name : value} of the counters and timers."""
+
+  return _values.copy()
@@ -18,7 +18,9 @@
 
 
 import re
+import struct
 import cPickle
+from array import array
 
 from cvs2svn_lib.cvs_item import CVSRevisionAdd
 from cvs2svn_lib.cvs_item import CVSRevisionChange
@@ -31,7 +33,9 @@ from cvs2svn_lib.cvs_item import CVSTagNoop
 from cvs2svn_lib.cvs_file_items import CVSFileItems
 from cvs2svn_lib.serializer import Serializer
 from cvs2svn_lib.serializer import PrimedPickleSerializer
+from cvs2svn_lib.cvs_item_serializer import CVSItemSerializer
 from cvs2svn_lib.indexed_database import IndexedStore
+from cvs2svn_lib.sort import SortingWriter
 
 
 cvs_item_primer = (
@@ -154,23 +158,38 @@ class LinewiseSerializer(Serializer):
   def loadf(self, f):
     return self.loads(f.readline())
 
+  def unwrap(self, s):
+    """Return the wrapped serializer's form of the line S."""
+
+    return self._decode_newlines(s[:-1])
+
   def loads(self, s):
-    return self.wrapee.loads(self._decode_newlines(s[:-1]))
+    return self.wrapee.loads(self.unwrap(s))
 
 
 class NewSortableCVSRevisionDatabase(object):
   """A serially-accessible, sortable file for holding CVSRevisions.
 
-  This class creates such files."""
-
-  def __init__(self, filename, serializer):
-    self.f = open(filename, 'w')
+  This class creates such files.  If SORTED_FILENAME is specified,
+  try to sort the file within MEMORY_LIMIT bytes of memory and write
+  the result to SORTED_FILENAME (see SortingWriter)."""
+
+  def __init__(
+        self, filename, serializer, sorted_filename=None, memory_limit=None,
+        ):
+    if sorted_filename is None:
+      self.f = open(filename, 'w')
+    else:
+      self.f = SortingWriter(filename, sorted_filename, memory_limit)
     self.serializer = LinewiseSerializer(serializer)
 
   def add(self, cvs_rev):
+    # The id of the CVSRevision is included so that revisions with the
+    # same metadata_id and timestamp are sorted by id rather than by
+    # their serialized form:
     self.f.write(
-        '%x %08x %s' % (
-            cvs_rev.metadata_id, cvs_rev.timestamp,
+        '%x %08x %08x %s' % (
+            cvs_rev.metadata_id, cvs_rev.timestamp, cvs_rev.id,
             self.serializer.dumps(cvs_rev),
             )
         )
@@ -192,10 +211,25 @@ class OldSortableCVSRevisionDatabase(object):
   def __iter__(self):
     f = open(self.filename, 'r')
     for l in f:
-      s = l.split(' ', 2)[-1]
+      s = l.split(' ', 3)[-1]
       yield self.serializer.loads(s)
     f.close()
 
+  def iter_serialized(self):
+    """Yield (metadata_id, timestamp, s) for each CVSRevision.
+
+    S is the CVSRevision as serialized by the serializer passed to the
+    constructor; it is not deserialized."""
+
+    f = open(self.filename, 'r')
+    for l in f:
+      (metadata_id, timestamp, id, s) = l.split(' ', 3)
+      yield (
+          int(metadata_id, 16), int(timestamp, 16),
+          self.serializer.unwrap(s),
+          )
+    f.close()
+
   def close(self):
     pass
 
@@ -203,15 +237,28 @@ class OldSortableCVSRevisionDatabase(object):
 class NewSortableCVSSymbolDatabase(object):
   """A serially-accessible, sortable file for holding CVSSymbols.
 
-  This class creates such files."""
-
-  def __init__(self, filename, serializer):
-    self.f = open(filename, 'w')
+  This class creates such files.  If SORTED_FILENAME is specified,
+  try to sort the file within MEMORY_LIMIT bytes of memory and write
+  the result to SORTED_FILENAME (see SortingWriter)."""
+
+  def __init__(
+        self, filename, serializer, sorted_filename=None, memory_limit=None,
+        ):
+    if sorted_filename is None:
+      self.f = open(filename, 'w')
+    else:
+      self.f = SortingWriter(filename, sorted_filename, memory_limit)
     self.serializer = LinewiseSerializer(serializer)
 
   def add(self, cvs_symbol):
+    # As in NewSortableCVSRevisionDatabase, the id of the CVSSymbol is
+    # included so that it, rather than the serialized form, decides the
+    # order of CVSSymbols with the same symbol:
     self.f.write(
-        '%x %s' % (cvs_symbol.symbol.id, self.serializer.dumps(cvs_symbol))
+        '%x %08x %s' % (
+            cvs_symbol.symbol.id, cvs_symbol.id,
+            self.serializer.dumps(cvs_symbol),
+            )
         )
 
   def close(self):
@@ -231,18 +278,109 @@ class OldSortableCVSSymbolDatabase(object):
   def __iter__(self):
     f = open(self.filename, 'r')
     for l in f:
-      s = l.split(' ', 1)[-1]
+      s = l.split(' ', 2)[-1]
       yield self.serializer.loads(s)
     f.close()
 
+  def iter_serialized(self):
+    """Yield (symbol_id, s) for each CVSSymbol.
+
+    S is the CVSSymbol as serialized by the serializer passed to the
+    constructor; it is not deserialized."""
+
+    f = open(self.filename, 'r')
+    for l in f:
+      (symbol_id, id, s) = l.split(' ', 2)
+      yield (int(symbol_id, 16), self.serializer.unwrap(s))
+    f.close()
+
   def close(self):
     pass
 
 
+# The number of entries in each array of a CVSRevision summary file:
+_array_length = struct.Struct('>Q')
+
+
+def _write_array(f, a):
+  f.write(_array_length.pack(len(a)))
+  a.tofile(f)
+
+
+def _read_array(f, typecode):
+  (n,) = _array_length.unpack(f.read(_array_length.size))
+  a = array(typecode)
+  a.fromfile(f, n)
+  return a
+
+
+class NewCVSRevisionSummary(object):
+  """A columnar summary of the dependencies among CVSRevisions.
+
+  The summary allows the CVSRevisions that directly succeed a
+  CVSRevision (see CVSRevision.get_succ_ids()) to be found without
+  deserializing it.  Only successors that are CVSRevisions are
+  recorded.  The file consists of three arrays: the ids of the
+  CVSRevisions, the number of successors of each, and the ids of all
+  of the successors, concatenated.
+
+  This class creates such files."""
+
+  def __init__(self, filename):
+    self.filename = filename
+    self._ids = array('I')
+    self._succ_counts = array('I')
+    self._succ_ids = array('I')
+
+  def add(self, cvs_rev):
+    succ_ids = cvs_rev.get_succ_ids() - cvs_rev.get_symbol_succ_ids()
+    self._ids.append(cvs_rev.id)
+    self._succ_counts.append(len(succ_ids))
+    self._succ_ids.extend(sorted(succ_ids))
+
+  def close(self):
+    f = open(self.filename, 'wb')
+    _write_array(f, self._ids)
+    _write_array(f, self._succ_counts)
+    _write_array(f, self._succ_ids)
+    f.close()
+    self._ids = self._succ_counts = self._succ_ids = None
+
+
+class OldCVSRevisionSummary(object):
+  """Read a file created by NewCVSRevisionSummary."""
+
+  def __init__(self, filename):
+    f = open(filename, 'rb')
+    ids = _read_array(f, 'I')
+    succ_counts = _read_array(f, 'I')
+    self._succ_ids = _read_array(f, 'I')
+    f.close()
+
+    # Arrays indexed by CVSRevision id, giving the position of its
+    # successors in self._succ_ids and their number:
+    max_id = max(ids or [0])
+    self._succ_starts = array('I', [0]) * (max_id + 1)
+    self._succ_counts = array('I', [0]) * (max_id + 1)
+    start = 0
+    for (id, count) in zip(ids, succ_counts):
+      self._succ_starts[id] = start
+      self._succ_counts[id] = count
+      start += count
+
+  def get_succ_ids(self, id):
+    """Return the ids of the CVSRevisions that directly succeed ID."""
+
+    start = self._succ_starts[id]
+    return self._succ_ids[start:start + self._succ_counts[id]]
+
+  def close(self):
+    self._succ_ids = self._succ_starts = self._succ_counts = None
+
+
 def IndexedCVSItemStore(filename, index_filename, mode):
   return IndexedStore(
-      filename, index_filename, mode,
-      PrimedPickleSerializer(cvs_item_primer)
+      filename, index_filename, mode, CVSItemSerializer()
       )
 
 
@@ -0,0 +1,579 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""A compact binary serializer for CVSItems.
+
+CVSItemSerializer stores each CVSItem as a record consisting of
+
+    * the length of the rest of the record (a four-byte integer)
+    * a type tag identifying the CVSItem's class (one byte)
+    * the item's fixed-size fields, packed using a struct
+    * the item's variable-size fields, one after the other
+
+The fields are those returned by the class's __getstate__() method,
+and an item is recreated by passing the fields (in their original
+order) to __setstate__().  The kind of each field is described in
+_schemas; the fixed-size fields are packed using a single struct
+regardless of their positions in the state tuple.  For speed, the
+code that serializes and deserializes each class is generated from
+its schema (see _compile_schema()).
+
+Within the variable-size fields, integers are written as varints (7
+bits per byte, with the high bit set on all but the last byte).
+Lists of ids are written as their length followed by the differences
+between consecutive ids (starting with the item's own id), since the
+ids of related items tend to be close together.
+
+When reading, revision numbers are interned and identical property
+dicts are shared between items, so the property dicts of items read
+via this serializer must not be modified."""
+
+
+import struct
+import cPickle
+
+from cvs2svn_lib.serializer import Serializer
+from cvs2svn_lib.cvs_item import CVSRevisionAdd
+from cvs2svn_lib.cvs_item import CVSRevisionChange
+from cvs2svn_lib.cvs_item import CVSRevisionDelete
+from cvs2svn_lib.cvs_item import CVSRevisionNoop
+from cvs2svn_lib.cvs_item import CVSBranch
+from cvs2svn_lib.cvs_item import CVSBranchNoop
+from cvs2svn_lib.cvs_item import CVSTag
+from cvs2svn_lib.cvs_item import CVSTagNoop
+
+
+_length = struct.Struct('>I')
+
+# The id of every item is the first field after the type tag:
+_id = struct.Struct('>I')
+
+
+def _write_varint(out, n):
+  """Append non-negative integer N to list OUT as a varint."""
+
+  while n >= 0x80:
+    out.append(chr((n & 0x7f) | 0x80))
+    n >>= 7
+  out.append(chr(n))
+
+
+def _read_varint(s, pos):
+  """Return (n, pos) for the varint in S at POS."""
+
+  b = ord(s[pos])
+  pos += 1
+  if b < 0x80:
+    return (b, pos)
+  n = b & 0x7f
+  shift = 7
+  while True:
+    b = ord(s[pos])
+    pos += 1
+    n |= (b & 0x7f) << shift
+    if b < 0x80:
+      return (n, pos)
+    shift += 7
+
+
+def _write_delta(out, n):
+  """Append the (possibly negative) integer N as a zigzag varint."""
+
+  if n >= 0:
+    _write_varint(out, n << 1)
+  else:
+    _write_varint(out, ((-n) << 1) - 1)
+
+
+def _read_delta(s, pos):
+  (n, pos) = _read_varint(s, pos)
+  if n & 1:
+    return (-((n + 1) >> 1), pos)
+  else:
+    return (n >> 1, pos)
+
+
+# Tags for the values written by _write_value():
+(
+    _VALUE_NONE, _VALUE_FALSE, _VALUE_TRUE,
+    _VALUE_INT, _VALUE_NEGATIVE_INT, _VALUE_STR, _VALUE_PICKLE,
+    ) = range(7)
+
+
+def _write_value(out, value):
+  """Append an arbitrary VALUE to list OUT.
+
+  Common types are written compactly; anything else is pickled."""
+
+  if value is None:
+    out.append(chr(_VALUE_NONE))
+  elif value is False:
+    out.append(chr(_VALUE_FALSE))
+  elif value is True:
+    out.append(chr(_VALUE_TRUE))
+  elif type(value) in (int, long):
+    if value >= 0:
+      out.append(chr(_VALUE_INT))
+      _write_varint(out, value)
+    else:
+      out.append(chr(_VALUE_NEGATIVE_INT))
+      _write_varint(out, -value)
+  elif type(value) is str:
+    out.append(chr(_VALUE_STR))
+    _write_varint(out, len(value))
+    out.append(value)
+  else:
+    s = cPickle.dumps(value, -1)
+    out.append(chr(_VALUE_PICKLE))
+    _write_varint(out, len(s))
+    out.append(s)
+
+
+def _read_value(s, pos):
+  tag = ord(s[pos])
+  pos += 1
+  if tag == _VALUE_NONE:
+    return (None, pos)
+  elif tag == _VALUE_FALSE:
+    return (False, pos)
+  elif tag == _VALUE_TRUE:
+    return (True, pos)
+  elif tag == _VALUE_INT:
+    return _read_varint(s, pos)
+  elif tag == _VALUE_NEGATIVE_INT:
+    (n, pos) = _read_varint(s, pos)
+    return (-n, pos)
+  elif tag == _VALUE_STR:
+    (n, pos) = _read_varint(s, pos)
+    return (s[pos:pos + n], pos + n)
+  elif tag == _VALUE_PICKLE:
+    (n, pos) = _read_varint(s, pos)
+    return (cPickle.loads(s[pos:pos + n]), pos + n)
+  else:
+    raise ValueError('Invalid value tag %d' % (tag,))
+
+
+def _read_rev(s, pos):
+  (n, pos) = _read_varint(s, pos)
+  if n:
+    end = pos + n - 1
+    return (intern(s[pos:end]), end)
+  else:
+    return (None, pos)
+
+
+def _write_rev(out, value):
+  if value is None:
+    out.append('\0')
+  else:
+    _write_varint(out, len(value) + 1)
+    out.append(value)
+
+
+def _read_id_list(s, pos, last):
+  (n, pos) = _read_varint(s, pos)
+  retval = []
+  for i in xrange(n):
+    (delta, pos) = _read_delta(s, pos)
+    last += delta
+    retval.append(last)
+  return (retval, pos)
+
+
+def _write_id_list(out, value, last):
+  _write_varint(out, len(value))
+  for id in value:
+    _write_delta(out, id - last)
+    last = id
+
+
+def _read_symbol_list(s, pos, last):
+  (n, pos) = _read_varint(s, pos)
+  if not n:
+    return (None, pos)
+  retval = []
+  for i in xrange(n - 1):
+    (symbol_id, pos) = _read_varint(s, pos)
+    (delta, pos) = _read_delta(s, pos)
+    last += delta
+    retval.append((symbol_id, last))
+  return (retval, pos)
+
+
+def _write_symbol_list(out, value, last):
+  if value is None:
+    out.append('\0')
+    return
+
+  _write_varint(out, len(value) + 1)
+  for (symbol_id, cvs_symbol_id) in value:
+    _write_varint(out, symbol_id)
+    _write_delta(out, cvs_symbol_id - last)
+    last = cvs_symbol_id
+
+
+def _read_properties(s, pos, shared):
+  """Read a properties dict (or None) from S at POS.
+
+  SHARED is a map {serialized properties : properties} of property
+  dicts that have been read before; if the same dict is read again,
+  the old instance is returned."""
+
+  (n, pos) = _read_varint(s, pos)
+  if not n:
+    return (None, pos)
+  end = pos + n - 1
+  key = s[pos:end]
+  try:
+    return (shared[key], end)
+  except KeyError:
+    pass
+  retval = {}
+  while pos < end:
+    (k, pos) = _read_value(s, pos)
+    (v, pos) = _read_value(s, pos)
+    retval[k] = v
+  if len(shared) >= CVSItemSerializer.MAX_SHARED_PROPERTIES:
+    shared.clear()
+  shared[key] = retval
+  return (retval, end)
+
+
+def _write_properties(out, value):
+  if value is None:
+    out.append('\0')
+    return
+
+  items = value.items()
+  items.sort()
+  data = []
+  for (k, v) in items:
+    _write_value(data, k)
+    _write_value(data, v)
+  data = ''.join(data)
+  _write_varint(out, len(data) + 1)
+  out.append(data)
+
+
+class _FieldKind(object):
+  """The kind of a field in a CVSItem's state tuple.
+
+  Fixed-size kinds have a struct FORMAT and Python expressions that
+  convert a value V to and from what is stored in the struct.
+  Variable-size kinds have FORMAT None and Python statements that
+  write V to the list OUT or read V from string S at position POS.
+
+  In all of the code, %(v)s stands for the variable holding the value
+  and ITEM_ID holds the id of the item."""
+
+  format = None
+  pack = '%(v)s'
+  unpack = None
+  write = None
+  read = None
+
+
+class _Int(_FieldKind):
+  """A non-negative integer less than 2**32."""
+
+  format = 'I'
+
+
+class _Timestamp(_FieldKind):
+  format = 'q'
+
+
+class _OptionalInt(_FieldKind):
+  """A non-negative integer less than 2**32 - 1, or None."""
+
+  format = 'I'
+  pack = '(0 if %(v)s is None else %(v)s + 1)'
+  unpack = (
+      'if %(v)s:\n'
+      '  %(v)s -= 1\n'
+      'else:\n'
+      '  %(v)s = None'
+      )
+
+
+class _Bool(_FieldKind):
+  format = 'B'
+  pack = 'int(%(v)s)'
+  unpack = '%(v)s = bool(%(v)s)'
+
+
+class _OptionalBool(_FieldKind):
+  """True, False, or None."""
+
+  format = 'B'
+  pack = '_optional_bools.index(%(v)s)'
+  unpack = '%(v)s = _optional_bools[%(v)s]'
+
+
+class _Rev(_FieldKind):
+  """A revision number (a string), or None.
+
+  The strings are interned when read, because the same revision
+  numbers occur over and over."""
+
+  write = '_write_rev(out, %(v)s)'
+  read = '(%(v)s, pos) = _read_rev(s, pos)'
+
+
+class _IdList(_FieldKind):
+  """A list of ids, delta-encoded starting with the item's own id.
+
+  Most such lists are empty, so that case is handled inline."""
+
+  write = (
+      'if %(v)s:\n'
+      '  _write_id_list(out, %(v)s, item_id)\n'
+      'else:\n'
+      '  out.append("\\0")'
+      )
+  read = (
+      'if s[pos] == "\\0":\n'
+      '  %(v)s = []\n'
+      '  pos += 1\n'
+      'else:\n'
+      '  (%(v)s, pos) = _read_id_list(s, pos, item_id)'
+      )
+
+
+class _SymbolList(_FieldKind):
+  """None or a list of (symbol_id, cvs_symbol_id) tuples.
+
+  The cvs_symbol_ids are delta-encoded like those of _IdList."""
+
+  write = (
+      'if %(v)s == []:\n'
+      '  out.append("\\1")\n'
+      'else:\n'
+      '  _write_symbol_list(out, %(v)s, item_id)'
+      )
+  read = (
+      'if s[pos] == "\\1":\n'
+      '  %(v)s = []\n'
+      '  pos += 1\n'
+      'else:\n'
+      '  (%(v)s, pos) = _read_symbol_list(s, pos, item_id)'
+      )
+
+
+class _Properties(_FieldKind):
+  """None or a dict of properties.
+
+  Most items have one of a few distinct property dicts, so identical
+  dicts are shared when reading (see _read_properties())."""
+
+  write = '_write_properties(out, %(v)s)'
+  read = '(%(v)s, pos) = _read_properties(s, pos, shared_properties)'
+
+
+class _Value(_FieldKind):
+  """An arbitrary value (see _write_value()).  Usually None."""
+
+  write = (
+      'if %(v)s is None:\n'
+      '  out.append("\\0")\n'
+      'else:\n'
+      '  _write_value(out, %(v)s)'
+      )
+  read = (
+      'if s[pos] == "\\0":\n'
+      '  %(v)s = None\n'
+      '  pos += 1\n'
+      'else:\n'
+      '  (%(v)s, pos) = _read_value(s, pos)'
+      )
+
+
+_INT = _Int()
+_TIMESTAMP = _Timestamp()
+_OPTIONAL_INT = _OptionalInt()
+_BOOL = _Bool()
+_OPTIONAL_BOOL = _OptionalBool()
+_REV = _Rev()
+_ID_LIST = _IdList()
+_SYMBOL_LIST = _SymbolList()
+_PROPERTIES = _Properties()
+_VALUE = _Value()
+
+_cvs_revision_fields = [
+    _INT, _INT, # id, cvs_file.id
+    _TIMESTAMP, _INT, # timestamp, metadata_id
+    _OPTIONAL_INT, _OPTIONAL_INT, # prev_id, next_id
+    _REV, # rev
+    _BOOL, # deltatext_exists
+    _INT, # lod.id
+    _OPTIONAL_INT, # first_on_branch_id
+    _BOOL, # ntdbr
+    _OPTIONAL_INT, _OPTIONAL_INT, # ntdbr_prev_id, ntdbr_next_id
+    _ID_LIST, _ID_LIST, _ID_LIST, # tag_ids, branch_ids, branch_commit_ids
+    _SYMBOL_LIST, _SYMBOL_LIST, # opened_symbols, closed_symbols
+    _PROPERTIES, _OPTIONAL_BOOL, # properties, properties_changed
+    _VALUE, # revision_reader_token
+    ]
+
+_cvs_branch_fields = [
+    _INT, _INT, # id, cvs_file.id
+    _INT, _REV, # symbol.id, branch_number
+    _INT, _INT, _OPTIONAL_INT, # source_lod.id, source_id, next_id
+    _ID_LIST, _ID_LIST, # tag_ids, branch_ids
+    _SYMBOL_LIST, # opened_symbols
+    _VALUE, # revision_reader_token
+    ]
+
+_cvs_tag_fields = [
+    _INT, _INT, _INT, # id, cvs_file.id, symbol.id
+    _INT, _INT, # source_lod.id, source_id
+    _VALUE, # revision_reader_token
+    ]
+
+# A list [(cls, fields)] describing how to serialize each class of
+# CVSItem.  Each class's type tag is its position in this list, so
+# new classes must be added at the end:
+_schemas = [
+    (CVSRevisionAdd, _cvs_revision_fields),
+    (CVSRevisionChange, _cvs_revision_fields),
+    (CVSRevisionDelete, _cvs_revision_fields),
+    (CVSRevisionNoop, _cvs_revision_fields),
+    (CVSBranch, _cvs_branch_fields),
+    (CVSBranchNoop, _cvs_branch_fields),
+    (CVSTag, _cvs_tag_fields),
+    (CVSTagNoop, _cvs_tag_fields),
+    ]
+
+
+def _indent(code):
+  return ''.join(['  %s\n' % (line,) for line in code.split('\n')])
+
+
+def _compile_schema(tag, cls, fields):
+  """Return (dump, load) functions for the CVSItem class CLS.
+
+  dump(cvs_item) returns the serialized form of CVS_ITEM, without the
+  length prefix.  load(s, pos, shared_properties) returns the item
+  whose type tag is at position POS of S.  The functions are generated
+  from FIELDS, the list of the kinds of the fields in CLS's state
+  tuple, so that they don't have to interpret the schema for every
+  item."""
+
+  names = ['f%d' % (i,) for i in range(len(fields))]
+  fixed = [i for i in range(len(fields)) if fields[i].format]
+  variable = [i for i in range(len(fields)) if not fields[i].format]
+  header = struct.Struct(
+      '>B' + ''.join([fields[i].format for i in fixed])
+      )
+
+  dump = [
+      'def dump(cvs_item):',
+      '  (%s,) = cvs_item.__getstate__()' % (', '.join(names),),
+      '  item_id = f0',
+      '  out = [header.pack(%d, %s)]' % (
+          tag,
+          ', '.join([fields[i].pack % {'v' : names[i]} for i in fixed]),
+          ),
+      ]
+  for i in variable:
+    dump.append(_indent(fields[i].write % {'v' : names[i]}).rstrip('\n'))
+  dump.append('  return "".join(out)')
+
+  load = [
+      'def load(s, pos, shared_properties):',
+      '  (tag, %s,) = header.unpack_from(s, pos)' % (
+          ', '.join([names[i] for i in fixed]),
+          ),
+      '  pos += %d' % (header.size,),
+      '  item_id = f0',
+      ]
+  for i in fixed:
+    if fields[i].unpack:
+      load.append(_indent(fields[i].unpack % {'v' : names[i]}).rstrip('\n'))
+  for i in variable:
+    load.append(_indent(fields[i].read % {'v' : names[i]}).rstrip('\n'))
+  load += [
+      '  cvs_item = new(cls)',
+      '  cvs_item.__setstate__((%s,))' % (', '.join(names),),
+      '  return cvs_item',
+      ]
+
+  namespace = dict(globals())
+  namespace['header'] = header
+  namespace['cls'] = cls
+  namespace['new'] = cls.__new__
+  exec '\n'.join(dump + [''] + load) + '\n' in namespace
+  return (namespace['dump'], namespace['load'])
+
+
+# The values of _OptionalBool fields, indexed by how they are stored:
+_optional_bools = [None, False, True]
+
+
+class CVSItemSerializer(Serializer):
+  """Serialize CVSItems in a compact binary form.
+
+  See the module docstring for a description of the format.  Only
+  instances of the classes listed in _schemas can be serialized."""
+
+  # The maximum number of distinct property dicts to remember:
+  MAX_SHARED_PROPERTIES = 1000
+
+  def __init__(self):
+    # A map {cls : dump} and a list of the load functions, indexed by
+    # type tag:
+    self._dumpers = {}
+    self._loaders = []
+    for (tag, (cls, fields)) in enumerate(_schemas):
+      (dump, load) = _compile_schema(tag, cls, fields)
+      self._dumpers[cls] = dump
+      self._loaders.append(load)
+
+    # A map {serialized properties : properties} of the property
+    # dicts that have been read:
+    self._shared_properties = {}
+
+  def __getstate__(self):
+    # The functions are recreated when unpickling:
+    return None
+
+  def __setstate__(self, state):
+    self.__init__()
+
+  def dumps(self, cvs_item):
+    s = self._dumpers[cvs_item.__class__](cvs_item)
+    return _length.pack(len(s)) + s
+
+  def dumpf(self, f, cvs_item):
+    f.write(self.dumps(cvs_item))
+
+  def load_id(self, s):
+    """Return the id of the item serialized in S, without loading it."""
+
+    return _id.unpack_from(s, _length.size + 1)[0]
+
+  def loads(self, s):
+    return self._loaders[ord(s[_length.size])](
+        s, _length.size, self._shared_properties
+        )
+
+  def loadf(self, f):
+    s = f.read(_length.size)
+    if len(s) < _length.size:
+      raise EOFError()
+    (length,) = _length.unpack(s)
+    s = f.read(length)
+    return self._loaders[ord(s[0])](s, 0, self._shared_properties)
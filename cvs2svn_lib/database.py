@@ -25,50 +25,86 @@ from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.common import error_prefix
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.log_store import LogStructuredStore
 
 
-# DBM module selection
-
-# 1. If we have bsddb3, it is probably newer than bsddb.  Fake bsddb = bsddb3,
-#    so that the dbhash module used by anydbm will use bsddb3.
-try:
-  import bsddb3
-  sys.modules['bsddb'] = bsddb3
-except ImportError:
-  pass
-
-# 2. These DBM modules are not good for cvs2svn.
-import anydbm
-if anydbm._defaultmod.__name__ in ['dumbdbm', 'dbm']:
-  logger.error(
-      '%s: cvs2svn uses the anydbm package, which depends on lower level '
-          'dbm\n'
-      'libraries.  Your system has %s, with which cvs2svn is known to have\n'
-      'problems.  To use cvs2svn, you must install a Python dbm library '
-          'other than\n'
-      'dumbdbm or dbm.  See '
-          'http://python.org/doc/current/lib/module-anydbm.html\n'
-      'for more information.\n'
-      % (error_prefix, anydbm._defaultmod.__name__,)
-      )
-  sys.exit(1)
-
-# 3. If we are using the old bsddb185 module, then try prefer gdbm instead.
-#    Unfortunately, gdbm appears not to be trouble free, either.
-if hasattr(anydbm._defaultmod, 'bsddb') \
-    and not hasattr(anydbm._defaultmod.bsddb, '__version__'):
+# Should Database instances use the best dbm module available via the
+# anydbm package rather than a LogStructuredStore?
+use_anydbm = False
+
+
+def _import_anydbm():
+  """Select a DBM module and return the anydbm module.
+
+  Exit with an error if the only available DBM modules are known not
+  to work with cvs2svn."""
+
+  # 1. If we have bsddb3, it is probably newer than bsddb.  Fake bsddb
+  #    = bsddb3, so that the dbhash module used by anydbm will use
+  #    bsddb3.
   try:
-    gdbm = __import__('gdbm')
+    import bsddb3
+    sys.modules['bsddb'] = bsddb3
   except ImportError:
-    logger.warn(
-        '%s: The version of the bsddb module found on your computer '
-            'has been\n'
-        'reported to malfunction on some datasets, causing KeyError '
-            'exceptions.\n'
-        % (warning_prefix,)
+    pass
+
+  # 2. These DBM modules are not good for cvs2svn.
+  import anydbm
+  if anydbm._defaultmod.__name__ in ['dumbdbm', 'dbm']:
+    logger.error(
+        '%s: cvs2svn uses the anydbm package, which depends on lower level '
+            'dbm\n'
+        'libraries.  Your system has %s, with which cvs2svn is known to '
+            'have\n'
+        'problems.  To use cvs2svn, you must install a Python dbm library '
+            'other than\n'
+        'dumbdbm or dbm.  See '
+            'http://python.org/doc/current/lib/module-anydbm.html\n'
+        'for more information.\n'
+        % (error_prefix, anydbm._defaultmod.__name__,)
         )
+    sys.exit(1)
+
+  # 3. If we are using the old bsddb185 module, then try prefer gdbm
+  #    instead.  Unfortunately, gdbm appears not to be trouble free,
+  #    either.
+  if hasattr(anydbm._defaultmod, 'bsddb') \
+      and not hasattr(anydbm._defaultmod.bsddb, '__version__'):
+    try:
+      gdbm = __import__('gdbm')
+    except ImportError:
+      logger.warn(
+          '%s: The version of the bsddb module found on your computer '
+              'has been\n'
+          'reported to malfunction on some datasets, causing KeyError '
+              'exceptions.\n'
+          % (warning_prefix,)
+          )
+    else:
+      anydbm._defaultmod = gdbm
+
+  return anydbm
+
+
+def _open_anydbm(filename, mode):
+  anydbm = _import_anydbm()
+
+  # pybsddb3 has a bug which prevents it from working with
+  # Berkeley DB 4.2 if you open the db with 'n' ("new").  This
+  # causes the DB_TRUNCATE flag to be passed, which is disallowed
+  # for databases protected by lock and transaction support
+  # (bsddb databases use locking from bsddb version 4.2.4 onwards).
+  #
+  # Therefore, manually perform the removal (we can do this, because
+  # we know that for bsddb - but *not* anydbm in general - the database
+  # consists of one file with the name we specify, rather than several
+  # based on that name).
+  if mode == DB_OPEN_NEW and anydbm._defaultmod.__name__ == 'dbhash':
+    if os.path.isfile(filename):
+      os.unlink(filename)
+    return anydbm.open(filename, 'c')
   else:
-    anydbm._defaultmod = gdbm
+    return anydbm.open(filename, mode)
 
 
 class Database:
@@ -78,7 +114,8 @@ class Database:
   self.serializer_key.  (This implies that self.serializer_key may not
   be used as a key for normal entries.)
 
-  The backing database is an anydbm-based DBM.
+  The backing database is a LogStructuredStore or, if use_anydbm is
+  set, an anydbm-based DBM.
 
   """
 
@@ -90,22 +127,10 @@ class Database:
     The database stores its Serializer, so none needs to be supplied
     when opening an existing database."""
 
-    # pybsddb3 has a bug which prevents it from working with
-    # Berkeley DB 4.2 if you open the db with 'n' ("new").  This
-    # causes the DB_TRUNCATE flag to be passed, which is disallowed
-    # for databases protected by lock and transaction support
-    # (bsddb databases use locking from bsddb version 4.2.4 onwards).
-    #
-    # Therefore, manually perform the removal (we can do this, because
-    # we know that for bsddb - but *not* anydbm in general - the database
-    # consists of one file with the name we specify, rather than several
-    # based on that name).
-    if mode == DB_OPEN_NEW and anydbm._defaultmod.__name__ == 'dbhash':
-      if os.path.isfile(filename):
-        os.unlink(filename)
-      self.db = anydbm.open(filename, 'c')
+    if use_anydbm:
+      self.db = _open_anydbm(filename, mode)
     else:
-      self.db = anydbm.open(filename, mode)
+      self.db = LogStructuredStore(filename, mode)
 
     # Import implementations for many mapping interface methods.
     for meth_name in ('__delitem__',
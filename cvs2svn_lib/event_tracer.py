@@ -0,0 +1,156 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Record a timeline of the conversion in the Chrome trace format.
+
+When tracing is turned on (with --write-trace), the beginning and end
+of each pass and of smaller units of work (the processing of each CVS
+file in CollectRevsPass and FilterSymbolsPass, sort runs and merges,
+the breaking of each changeset cycle, and the output of each commit
+in OutputPass) are recorded as events.  At the end of the conversion
+the events are written as JSON in the trace event format, which can
+be viewed in chrome://tracing, Perfetto, or speedscope.
+
+Events are kept in memory until they are written.  The events of
+passes that are run in child processes are handed to the parent by
+PassManager.  Tasks that are run in a multiprocessing pool should be
+wrapped using call_in_worker() and collect_from_workers() so that
+their events are collected too.
+
+Tracing is turned off unless enabled is set to True.  To keep the cost
+near zero when it is off, code should check enabled before calling
+begin() or end():
+
+    if event_tracer.enabled:
+      event_tracer.begin(cvs_file.rcs_path, 'file')
+"""
+
+
+import os
+import time
+import cPickle
+
+try:
+  import json
+except ImportError:
+  # Python < 2.6:
+  json = None
+
+from cvs2svn_lib.common import FatalError
+
+
+# Is tracing turned on?
+enabled = False
+
+# A list of the events recorded in this process, as tuples (phase,
+# name, category, timestamp, pid, args):
+_events = []
+
+
+def begin(name, category, args=None):
+  """Record the beginning of the unit of work NAME.
+
+  CATEGORY is a short string describing the kind of work (e.g.,
+  'pass' or 'file').  ARGS, if specified, is a map {name : value} of
+  additional information to show for the event."""
+
+  _events.append(('B', name, category, time.time(), os.getpid(), args,))
+
+
+def end(name, category):
+  """Record the end of the unit of work NAME."""
+
+  _events.append(('E', name, category, time.time(), os.getpid(), None,))
+
+
+def reset():
+  """Discard the events recorded so far (e.g., in a forked child)."""
+
+  del _events[:]
+
+
+def call_in_worker(args):
+  """Call FUNCTION(FUNCTION_ARGS) in a worker process.
+
+  ARGS is a tuple (FUNCTION, FUNCTION_ARGS).  Return (result, events),
+  where events are the events recorded during the call.  This is meant
+  to be passed to multiprocessing.Pool.imap() in place of FUNCTION,
+  with the results passed through collect_from_workers()."""
+
+  (function, function_args) = args
+  reset()
+  result = function(function_args)
+  return (result, list(_events),)
+
+
+def collect_from_workers(results):
+  """Add the events from RESULTS and generate the functions' results.
+
+  RESULTS is an iterable over the values returned by
+  call_in_worker()."""
+
+  for (result, events) in results:
+    _events.extend(events)
+    yield result
+
+
+def dump(filename):
+  """Write the events recorded in this process to FILENAME.
+
+  The events can be added to those of another process using load()."""
+
+  f = open(filename, 'wb')
+  cPickle.dump(_events, f, -1)
+  f.close()
+
+
+def load(filename):
+  """Add the events from FILENAME, which was written by dump()."""
+
+  f = open(filename, 'rb')
+  try:
+    _events.extend(cPickle.load(f))
+  finally:
+    f.close()
+
+
+def write_trace(filename):
+  """Write all events to FILENAME as a Chrome trace."""
+
+  if json is None:
+    raise FatalError('Writing a trace requires Python 2.6 or later')
+
+  trace_events = []
+  for (phase, name, category, timestamp, pid, args) in _events:
+    event = {
+        'ph' : phase,
+        'name' : name,
+        'cat' : category,
+        # Microseconds:
+        'ts' : int(timestamp * 1000000),
+        'pid' : pid,
+        'tid' : pid,
+        }
+    if args is not None:
+      event['args'] = args
+    trace_events.append(event)
+
+  f = open(filename, 'w')
+  try:
+    json.dump({'traceEvents' : trace_events}, f, separators=(',', ':'))
+    f.write('\n')
+  finally:
+    f.close()
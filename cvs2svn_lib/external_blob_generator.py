@@ -62,6 +62,12 @@ class ExternalBlobGenerator(RevisionCollector):
         config.GIT_BLOB_DATAFILE, which_pass,
         )
 
+  def get_external_outputs(self):
+    if self.blob_filename is None:
+      return []
+    else:
+      return [self.blob_filename]
+
   def start(self):
     self._mark_generator = KeyGenerator()
     logger.normal('Starting generate_blobs.py...')
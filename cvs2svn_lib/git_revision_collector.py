@@ -37,6 +37,12 @@ class GitRevisionCollector(RevisionCollector):
         config.GIT_BLOB_DATAFILE, which_pass,
         )
 
+  def get_external_outputs(self):
+    if self.blob_filename is None:
+      return []
+    else:
+      return [self.blob_filename]
+
   def start(self):
     self.revision_reader.start()
     if self.blob_filename is None:
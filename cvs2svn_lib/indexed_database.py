@@ -49,6 +49,13 @@ class IndexedDatabase:
   file.  But it has the disadvantage that space is wasted whenever
   objects are written multiple times."""
 
+  # When reading many records at once, records whose offsets are at
+  # most this many bytes apart are read using a single read...
+  READAHEAD_GAP = 64 * 1024
+
+  # ...as long as the single read is no bigger than this:
+  MAX_READ_SIZE = 4 * 1024 * 1024
+
   def __init__(self, filename, index_filename, mode, serializer=None):
     """Initialize an IndexedDatabase, writing the serializer if necessary.
 
@@ -87,11 +94,18 @@ class IndexedDatabase:
   def __setitem__(self, index, item):
     """Write ITEM into the database indexed by INDEX."""
 
+    self.put_serialized(index, self.serializer.dumps(item))
+
+  def put_serialized(self, index, s):
+    """Write S, an already-serialized item, indexed by INDEX.
+
+    S must have been produced by a serializer equivalent to
+    self.serializer."""
+
     # Make sure we're at the end of the file:
     if self.fp != self.eofp:
       self.f.seek(self.eofp)
     self.index_table[index] = self.eofp
-    s = self.serializer.dumps(item)
     self.f.write(s)
     self.eofp += len(s)
     self.fp = self.eofp
@@ -123,10 +137,52 @@ class IndexedDatabase:
     except KeyError:
       return default
 
+  def _fetch_many(self, offsets):
+    """Return a map {offset : item} for the records at OFFSETS.
+
+    Read the records in the order of their offsets, to reduce disk
+    seeking.  Records that are close together are read using a single
+    read, then deserialized from memory.  Each record except the last
+    one in a read ends at or before the offset of the next one, so
+    that offset is used to delimit it."""
+
+    offsets = sorted(set(offsets))
+    retval = {}
+    i = 0
+    while i < len(offsets):
+      start = offsets[i]
+      j = i + 1
+      while j < len(offsets) \
+            and offsets[j] - offsets[j - 1] <= self.READAHEAD_GAP \
+            and offsets[j] - start <= self.MAX_READ_SIZE:
+        j += 1
+      end = offsets[j - 1]
+
+      if end > start:
+        if self.fp != start:
+          self.f.seek(start)
+        data = self.f.read(end - start)
+        self.fp = end
+        for k in range(i, j - 1):
+          retval[offsets[k]] = self.serializer.loads(
+              data[offsets[k] - start:offsets[k + 1] - start]
+              )
+
+      # The last record is read directly from the file, whose pointer
+      # is already positioned at its start:
+      retval[end] = self._fetch(end)
+      i = j
+
+    return retval
+
   def get_many(self, indexes, default=None):
-    """Yield (index,item) tuples for INDEXES, in arbitrary order.
+    """Yield (index,item) tuples for INDEXES.
 
-    Yield (index,default) for indexes with no defined values."""
+    First yield (index,default) for indexes with no defined values,
+    then the others in the order of their records in the file.  Some
+    callers (e.g., SVNCommit.__setstate__()) keep the items in this
+    order, which affects the output.  The records are read all at
+    once, using _fetch_many()."""
 
     offsets = []
     for (index, offset) in self.index_table.get_many(indexes):
@@ -135,10 +191,10 @@ class IndexedDatabase:
       else:
         offsets.append((offset, index))
 
-    # Sort the offsets to reduce disk seeking:
     offsets.sort()
-    for (offset,index) in offsets:
-      yield (index, self._fetch(offset))
+    items = self._fetch_many([offset for (offset, index) in offsets])
+    for (offset, index) in offsets:
+      yield (index, items[offset])
 
   def __delitem__(self, index):
     # We don't actually free the data in self.f.
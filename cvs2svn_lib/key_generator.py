@@ -37,6 +37,11 @@ class KeyGenerator:
 
     return self._last_id
 
+  def peek_id(self):
+    """Return the key that the next call to gen_id() will return."""
+
+    return self._key_base
+
   def get_last_id(self):
     """Return the last id that was generated, as an integer."""
 
@@ -0,0 +1,222 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""A log-structured key/value store kept in a single file.
+
+LogStructuredStore maps strings to strings, like the dbm modules.  It
+is used instead of anydbm, because the dbm modules that are available
+vary from system to system and some of them perform very badly.
+
+Every modification is appended to the end of the file as a record
+consisting of a header (the length of the key and the length of the
+value), the key, and the value.  Deleting a key appends a record with
+no value (a tombstone).  An in-memory dict maps each key to the
+position of its latest value in the file, so each lookup needs a
+single read.  When an existing store is opened, the dict is rebuilt
+by scanning the file.
+
+Records are collected in a write buffer and appended in batches.
+Overwritten and deleted records remain in the file as dead space
+until there is more dead space than live data, at which point the
+live records are copied to a new file (compaction)."""
+
+
+import os
+import struct
+
+from cvs2svn_lib.common import DB_OPEN_READ
+from cvs2svn_lib.common import DB_OPEN_WRITE
+from cvs2svn_lib.common import DB_OPEN_NEW
+
+
+# The number of bytes of records to collect before appending them to
+# the file:
+write_buffer_size = 1024 * 1024
+
+# Don't compact stores until they contain at least this many bytes of
+# dead records:
+compaction_threshold = 16 * 1024 * 1024
+
+
+# The header of each record: (key length, value length).
+_header = struct.Struct('>II')
+
+# The value length used in tombstones:
+_DELETED = 0xffffffff
+
+
+class LogStructuredStore(object):
+  """A dbm-like map from strings to strings, stored in a single file.
+
+  MODE is DB_OPEN_NEW, DB_OPEN_WRITE, or DB_OPEN_READ.  Like the dbm
+  modules, the keys can be listed using keys() but the store cannot
+  be iterated over directly."""
+
+  def __init__(self, filename, mode):
+    self.filename = filename
+    self.mode = mode
+
+    # A map {key : (offset, length)} giving the position of the
+    # current value of each key:
+    self._index = {}
+
+    # The records that have not yet been written to the file, and
+    # their total size:
+    self._buffer = []
+    self._buffered_size = 0
+
+    # The number of bytes in the file (excluding the buffer):
+    self._file_size = 0
+
+    # The number of bytes taken up by overwritten or deleted records
+    # and by tombstones:
+    self._dead_size = 0
+
+    if mode == DB_OPEN_NEW:
+      self.f = open(self.filename, 'w+b')
+    elif mode == DB_OPEN_WRITE:
+      self.f = open(self.filename, 'r+b')
+      self._load()
+    elif mode == DB_OPEN_READ:
+      self.f = open(self.filename, 'rb')
+      self._load()
+    else:
+      raise RuntimeError('Invalid mode %r' % (mode,))
+
+  def _load(self):
+    """Build self._index by scanning the file."""
+
+    f = self.f
+    f.seek(0, 2)
+    file_size = f.tell()
+    f.seek(0)
+    offset = 0
+    while True:
+      header = f.read(_header.size)
+      if len(header) < _header.size:
+        break
+      (key_length, value_length) = _header.unpack(header)
+      end = offset + _header.size + key_length
+      if value_length != _DELETED:
+        end += value_length
+      if end > file_size:
+        break
+      key = f.read(key_length)
+      offset += _header.size + key_length
+      old = self._index.pop(key, None)
+      if old is not None:
+        self._dead_size += _header.size + key_length + old[1]
+      if value_length == _DELETED:
+        self._dead_size += _header.size + key_length
+      else:
+        self._index[key] = (offset, value_length)
+        f.seek(value_length, 1)
+        offset += value_length
+
+    # A partial record can be left by a crash.  It is ignored, and
+    # removed before anything is appended, so that it is not mistaken
+    # for the start of a record later:
+    if offset < file_size and self.mode == DB_OPEN_WRITE:
+      f.truncate(offset)
+
+    self._file_size = offset
+
+  def _append(self, record):
+    self._buffer.append(record)
+    self._buffered_size += len(record)
+    if self._buffered_size >= write_buffer_size:
+      self._flush()
+
+  def _flush(self):
+    """Write any buffered records to the file."""
+
+    if self._buffer:
+      self.f.seek(self._file_size)
+      self.f.write(''.join(self._buffer))
+      self._file_size += self._buffered_size
+      self._buffer = []
+      self._buffered_size = 0
+
+  def __getitem__(self, key):
+    (offset, length) = self._index[key]
+    if offset + length > self._file_size:
+      self._flush()
+    self.f.seek(offset)
+    return self.f.read(length)
+
+  def __setitem__(self, key, value):
+    old = self._index.get(key)
+    if old is not None:
+      self._dead_size += _header.size + len(key) + old[1]
+    offset = self._file_size + self._buffered_size + _header.size + len(key)
+    self._append(_header.pack(len(key), len(value)) + key + value)
+    self._index[key] = (offset, len(value))
+    if old is not None:
+      self._maybe_compact()
+
+  def __delitem__(self, key):
+    (offset, length) = self._index.pop(key)
+    self._dead_size += 2 * (_header.size + len(key)) + length
+    self._append(_header.pack(len(key), _DELETED) + key)
+    self._maybe_compact()
+
+  def has_key(self, key):
+    return key in self._index
+
+  def __contains__(self, key):
+    return key in self._index
+
+  def __len__(self):
+    return len(self._index)
+
+  def keys(self):
+    return self._index.keys()
+
+  def _maybe_compact(self):
+    if self._dead_size >= compaction_threshold \
+           and 2 * self._dead_size > self._file_size + self._buffered_size:
+      self.compact()
+
+  def compact(self):
+    """Rewrite the file, leaving out any dead records."""
+
+    self._flush()
+    temp_filename = self.filename + '.tmp'
+    new_file = open(temp_filename, 'wb')
+    new_index = {}
+    new_size = 0
+    # Copy the live records in the order of their positions in the
+    # old file, to read it sequentially:
+    items = self._index.items()
+    items.sort(key=lambda item: item[1])
+    for (key, (offset, length)) in items:
+      self.f.seek(offset)
+      record = _header.pack(len(key), length) + key + self.f.read(length)
+      new_file.write(record)
+      new_index[key] = (new_size + len(record) - length, length)
+      new_size += len(record)
+    new_file.close()
+    self.f.close()
+    os.rename(temp_filename, self.filename)
+    self.f = open(self.filename, 'r+b')
+    self._index = new_index
+    self._file_size = new_size
+    self._dead_size = 0
+
+  def close(self):
+    self._flush()
+    self.f.close()
+    self.f = None
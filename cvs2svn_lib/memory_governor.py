@@ -0,0 +1,215 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2008 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Divide the memory allowed by --memory-limit among the caches.
+
+Caches that should be sized by the memory governor derive from
+ManagedCache, count their hits and misses in cache_hits and
+cache_misses, and register themselves with memory_governor while they
+are in use.  The governor gives each registered cache a minimum share
+of Ctx().memory_limit and divides the rest in proportion to the
+number of hits that each cache has recently produced, so that memory
+goes to the caches that are making good use of it.  A cache's memory
+allotment is passed to its set_cache_memory() method.
+
+The allotments are recomputed whenever a cache is registered or
+unregistered, and when a cache reports (via cache_full()) that it has
+reached its allotment, but not more often than once every
+REBALANCE_INTERVAL seconds.  When a cache is unregistered, its final
+allotment and hit rate are logged.
+
+Users of memory whose size is fixed when they start, like the runs of
+a sort, ask for an allotment via allot() and give it back via
+release().  While they hold it, it is taken away from the caches.
+
+If passes run concurrently in several processes, PassManager gives
+each of them part of Ctx().memory_limit via set_budget().
+
+If Ctx().memory_limit is None, the governor does nothing and the
+caches use their built-in sizes."""
+
+
+import time
+
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.log import logger
+
+
+class ManagedCache(object):
+  """Mixin for caches whose size is chosen by the memory governor."""
+
+  # The number of lookups that were satisfied from the cache, and the
+  # number that were not.  The governor halves cache_hits every time
+  # that it recomputes the allotments, so that it reflects recent
+  # behavior:
+  cache_hits = 0
+  cache_misses = 0
+
+  # The memory allotment most recently passed to set_cache_memory():
+  cache_memory = None
+
+  def get_cache_name(self):
+    """Return a description of this cache, used in log messages."""
+
+    return str(self)
+
+  def set_cache_memory(self, cache_memory):
+    """Limit this cache to CACHE_MEMORY bytes (approximately)."""
+
+    raise NotImplementedError()
+
+
+class MemoryGovernor(object):
+  """Divide a memory budget among the registered ManagedCaches."""
+
+  # Each cache gets at least this fraction of an equal share of the
+  # budget, regardless of its hits:
+  MIN_SHARE = 0.25
+
+  # The minimum number of seconds between rebalances requested via
+  # cache_full():
+  REBALANCE_INTERVAL = 1.0
+
+  def __init__(self):
+    # The registered caches, in the order that they were registered:
+    self._caches = []
+
+    # The time of the most recent rebalance:
+    self._last_rebalance = 0.0
+
+    # The part of Ctx().memory_limit that this process may use, or
+    # None if it may use all of it (see set_budget()):
+    self._budget = None
+
+    # The number of bytes handed out via allot() and not yet released:
+    self._allotted = 0
+
+  def set_budget(self, budget):
+    """Limit this process to BUDGET bytes of Ctx().memory_limit.
+
+    This is used when a pass runs concurrently with others, which use
+    the rest of Ctx().memory_limit."""
+
+    self._budget = budget
+
+  def get_memory_limit(self):
+    """Return the memory budget in bytes, or None if there is none."""
+
+    if Ctx().memory_limit is None:
+      return None
+    elif self._budget is not None:
+      return min(self._budget, Ctx().memory_limit)
+    else:
+      return Ctx().memory_limit
+
+  def register(self, cache):
+    """Start managing the size of CACHE.
+
+    Return True if its size will be managed, False if there is no
+    memory limit (in which case CACHE should use its default size)."""
+
+    if self.get_memory_limit() is None:
+      return False
+
+    self._caches.append(cache)
+    self.rebalance()
+    return True
+
+  def unregister(self, cache):
+    """Stop managing the size of CACHE and log its final allotment."""
+
+    self._caches.remove(cache)
+    lookups = cache.cache_hits + cache.cache_misses
+    if lookups:
+      hit_rate = '%.1f%%' % (100.0 * cache.cache_hits / lookups,)
+    else:
+      hit_rate = 'n/a'
+    logger.verbose(
+        'Memory allotment for %s: %d bytes (recent hit rate %s)'
+        % (cache.get_cache_name(), cache.cache_memory, hit_rate,)
+        )
+    if self._caches:
+      self.rebalance()
+
+  def allot(self, name):
+    """Return the number of bytes that NAME may use, or None.
+
+    NAME is a short-lived user of memory, like a sort, whose size
+    cannot be changed once it has started.  It gets an equal share,
+    with the registered caches, of the part of the budget that has
+    not been allotted already.  The caches are shrunk to make room for
+    it until the allotment is passed to release().  Return None if
+    there is no memory limit."""
+
+    limit = self.get_memory_limit()
+    if limit is None:
+      return None
+
+    allotment = (limit - self._allotted) // (len(self._caches) + 1)
+    self._allotted += allotment
+    logger.verbose('Memory allotment for %s: %d bytes' % (name, allotment,))
+    self.rebalance()
+    return allotment
+
+  def release(self, allotment):
+    """Give back ALLOTMENT, which was returned by allot().
+
+    The memory is divided among the caches again.  ALLOTMENT may be
+    None, in which case do nothing."""
+
+    if allotment is None:
+      return
+
+    self._allotted -= allotment
+    self.rebalance()
+
+  def cache_full(self, cache):
+    """Note that CACHE has filled its allotment.
+
+    Recompute the allotments if REBALANCE_INTERVAL has passed since
+    the last time."""
+
+    if time.time() - self._last_rebalance >= self.REBALANCE_INTERVAL:
+      self.rebalance()
+
+  def rebalance(self):
+    """Recompute the memory allotments of all registered caches.
+
+    The caches share whatever is not allotted via allot()."""
+
+    self._last_rebalance = time.time()
+    limit = self.get_memory_limit()
+    n = len(self._caches)
+    if limit is None or not n:
+      return
+
+    limit -= self._allotted
+
+    min_share = int(limit * self.MIN_SHARE / n)
+    remainder = limit - n * min_share
+    total_hits = sum([cache.cache_hits for cache in self._caches])
+    for cache in self._caches:
+      if total_hits:
+        share = remainder * cache.cache_hits // total_hits
+      else:
+        share = remainder // n
+      cache.set_cache_memory(min_share + share)
+      cache.cache_hits //= 2
+      cache.cache_misses //= 2
+
+
+# The governor for this process:
+memory_governor = MemoryGovernor()
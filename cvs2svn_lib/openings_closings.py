@@ -22,6 +22,9 @@ import cPickle
 from cvs2svn_lib import config
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.artifact_manager import artifact_manager
+from cvs2svn_lib.record_file import RecordFormat
+from cvs2svn_lib.record_file import RecordFileWriter
+from cvs2svn_lib.record_file import RecordFileReader
 from cvs2svn_lib.svn_revision_range import SVNRevisionRange
 
 
@@ -29,6 +32,10 @@ from cvs2svn_lib.svn_revision_range import SVNRevisionRange
 OPENING = 'O'
 CLOSING = 'C'
 
+# The format of the records in SYMBOL_OPENINGS_CLOSINGS: (symbol_id,
+# svn_revnum, type, cvs_symbol_id):
+SYMBOLINGS_FORMAT = RecordFormat('IIcI')
+
 
 class SymbolingsLogger:
   """Manage the file that contains lines for symbol openings and closings.
@@ -70,8 +77,10 @@ class SymbolingsLogger:
   somewhere in the range 24 <= revnum < 30."""
 
   def __init__(self):
-    self.symbolings = open(
-        artifact_manager.get_temp_file(config.SYMBOL_OPENINGS_CLOSINGS), 'w')
+    self.symbolings = RecordFileWriter(
+        artifact_manager.get_temp_file(config.SYMBOL_OPENINGS_CLOSINGS),
+        SYMBOLINGS_FORMAT,
+        )
 
   def log_revision(self, cvs_rev, svn_revnum):
     """Log any openings and closings found in CVS_REV."""
@@ -91,15 +100,13 @@ class SymbolingsLogger:
   def _log(self, symbol_id, cvs_symbol_id, svn_revnum, type):
     """Log an opening or closing to self.symbolings.
 
-    Write out a single line to the symbol_openings_closings file
+    Write out a single record to the symbol_openings_closings file
     representing that SVN_REVNUM is either the opening or closing
     (TYPE) of CVS_SYMBOL_ID for SYMBOL_ID.
 
     TYPE should be one of the following constants: OPENING or CLOSING."""
 
-    self.symbolings.write(
-        '%x %d %s %x\n' % (symbol_id, svn_revnum, type, cvs_symbol_id)
-        )
+    self.symbolings.write(symbol_id, svn_revnum, type, cvs_symbol_id)
 
   def _log_opening(self, symbol_id, cvs_symbol_id, svn_revnum):
     """Log an opening to self.symbolings.
@@ -132,17 +139,16 @@ class SymbolingsReader:
     """Opens the SYMBOL_OPENINGS_CLOSINGS_SORTED for reading, and
     reads the offsets database into memory."""
 
-    self.symbolings = open(
+    self.symbolings = RecordFileReader(
         artifact_manager.get_temp_file(
             config.SYMBOL_OPENINGS_CLOSINGS_SORTED),
-        'r')
+        SYMBOLINGS_FORMAT,
+        )
     # The offsets_db is really small, and we need to read and write
     # from it a fair bit, so suck it into memory
     offsets_db = file(
         artifact_manager.get_temp_file(config.SYMBOL_OFFSETS_DB), 'rb')
-    # A map from symbol_id to offset.  The values of this map are
-    # incremented as the openings and closings for a symbol are
-    # consumed.
+    # A map from symbol_id to the index of the symbol's first record.
     self.offsets = cPickle.load(offsets_db)
     offsets_db.close()
 
@@ -158,20 +164,10 @@ class SymbolingsReader:
     cvs_symbol_id) for all openings and closings for SYMBOL."""
 
     if symbol.id in self.offsets:
-      # Set our read offset for self.symbolings to the offset for this
-      # symbol:
-      self.symbolings.seek(self.offsets[symbol.id])
-
-      while True:
-        line = self.symbolings.readline().rstrip()
-        if not line:
-          break
-        (id, revnum, type, cvs_symbol_id) = line.split()
-        id = int(id, 16)
-        revnum = int(revnum)
+      for (id, revnum, type, cvs_symbol_id) \
+              in self.symbolings.iter_from(self.offsets[symbol.id]):
         if id != symbol.id:
           break
-        cvs_symbol_id = int(cvs_symbol_id, 16)
 
         yield (revnum, type, cvs_symbol_id)
 
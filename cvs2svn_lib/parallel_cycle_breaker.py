@@ -0,0 +1,247 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2006-2008 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Break the cycles in independent parts of a changeset graph in parallel.
+
+The cyclic strongly connected components of a changeset graph are
+independent of each other: breaking the cycles in one component
+cannot create or remove cycles in another.  ParallelCycleBreaker
+sends each component to a worker process, which copies the changesets
+of the component into a graph of its own and breaks the cycles there.
+The worker returns a list of the changesets that it deleted and
+added, and the parent process replays those changes against the real
+graph and databases.
+
+Within a worker, new changesets are given temporary ids, starting
+with the id that the pass's KeyGenerator would generate next.  The
+parent replays the changes component by component, in the order that
+the components were listed, and gives the new changesets real ids
+from the KeyGenerator.  So the result does not depend on the number
+of worker processes or on the order in which they finish.  Without
+the multiprocessing module (Python < 2.6), the components are handled
+one after the other in the parent process."""
+
+
+import os
+
+try:
+  import multiprocessing
+except ImportError:
+  # Python < 2.6:
+  multiprocessing = None
+
+from cvs2svn_lib import event_tracer
+from cvs2svn_lib.log import logger
+from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib.changeset_graph import ChangesetGraph
+
+
+class _ChangesetStore(dict):
+  """A map {changeset_id : Changeset} standing in for a ChangesetDatabase."""
+
+  def store(self, changeset):
+    self[changeset.id] = changeset
+
+  def close(self):
+    pass
+
+
+class _CVSItemToChangesetMap(dict):
+  """A map {cvs_item_id : changeset_id} standing in for the real table."""
+
+  def close(self):
+    pass
+
+
+class _ComponentGraph(ChangesetGraph):
+  """A ChangesetGraph holding a copy of one component of another graph.
+
+  Record the changesets that are deleted and added, so that the
+  changes can be replayed against the original graph."""
+
+  def __init__(self, changesets):
+    ChangesetGraph.__init__(
+        self, _ChangesetStore(), _CVSItemToChangesetMap()
+        )
+
+    for changeset in changesets:
+      self.store_changeset(changeset)
+    for changeset in changesets:
+      self.add_changeset(changeset)
+
+    # A list of (changeset_id, None) for each changeset that was
+    # deleted and (None, changeset) for each changeset that was added,
+    # in the order that the changes were made:
+    self.changes = []
+
+  def add_new_changeset(self, changeset):
+    ChangesetGraph.add_new_changeset(self, changeset)
+    self.changes.append((None, changeset))
+
+  def delete_changeset(self, changeset):
+    ChangesetGraph.delete_changeset(self, changeset)
+    self.changes.append((changeset.id, None))
+
+
+# The ParallelCycleBreaker that is currently running.  Worker
+# processes inherit it when they are forked:
+_current_breaker = None
+
+
+def _initialize_worker():
+  _current_breaker._initialize_worker()
+
+
+def _break_component(args):
+  return _current_breaker._break_component(*args)
+
+
+class ParallelCycleBreaker(object):
+  """Break the cycles in the components of a changeset graph in parallel.
+
+  THE_PASS is the pass that is breaking cycles.  It must have
+  changeset_graph and changeset_key_generator attributes, which are
+  replaced within the worker processes by the component's graph and
+  by a KeyGenerator for temporary ids.
+
+  COMPONENT_BREAKER(component) is called within the worker processes
+  to make progress towards breaking the cycles in a component, just
+  like the COMPONENT_BREAKER argument of
+  ChangesetGraph.break_cyclic_components().
+
+  INITIALIZE_WORKER(), if specified, is called in each worker process
+  before it does anything else.  It should reopen any files that the
+  worker needs to read (e.g., Ctx()._cvs_items_db), because the worker
+  must not share file positions with its parent."""
+
+  def __init__(
+        self, the_pass, jobs, component_breaker, initialize_worker=None
+        ):
+    self.the_pass = the_pass
+    self.jobs = jobs
+    self.component_breaker = component_breaker
+    self.initialize_worker = initialize_worker
+
+  def _initialize_worker(self):
+    if self.initialize_worker is not None:
+      self.initialize_worker()
+
+  def _break_component(self, changesets, first_id):
+    """Break the cycles among CHANGESETS, which form one component.
+
+    Give new changesets temporary ids starting with FIRST_ID.  Return
+    (changes, num_breaks), where changes is the list of changes
+    described in _ComponentGraph."""
+
+    graph = _ComponentGraph(changesets)
+    self.the_pass.changeset_graph = graph
+    self.the_pass.changeset_key_generator = KeyGenerator(first_id)
+    graph.break_cyclic_components(
+        [[changeset.id for changeset in changesets]],
+        self.component_breaker,
+        )
+    return (graph.changes, graph.cycle_statistics.num_breaks)
+
+  def break_components(
+        self, changeset_graph, changeset_db, changeset_key_generator,
+        components,
+        ):
+    """Break all of the cycles in COMPONENTS.
+
+    COMPONENTS is a list of cyclic components of CHANGESET_GRAPH, as
+    returned by find_cyclic_components().  CHANGESET_DB is the
+    database holding the changesets of the graph, and
+    CHANGESET_KEY_GENERATOR is used to generate the ids of the new
+    changesets."""
+
+    global _current_breaker
+
+    # The temporary ids must not collide with the ids of any existing
+    # changesets, since changesets can refer to changesets outside of
+    # their component:
+    first_id = changeset_key_generator.peek_id()
+
+    # The changesets have to be read before any changes are applied to
+    # the database:
+    tasks = [
+        ([changeset_db[id] for id in component], first_id)
+        for component in components
+        ]
+
+    if (
+          self.jobs > 1 and len(components) > 1
+          and multiprocessing is not None and hasattr(os, 'fork')
+          ):
+      logger.verbose(
+          'Breaking cycles in %d components using %d processes'
+          % (len(components), self.jobs,)
+          )
+      _current_breaker = self
+      pool = multiprocessing.Pool(
+          min(self.jobs, len(components)), _initialize_worker
+          )
+      try:
+        results = event_tracer.collect_from_workers(
+            pool.imap(
+                event_tracer.call_in_worker,
+                [(_break_component, task,) for task in tasks],
+                )
+            )
+        self._apply_results(
+            changeset_graph, changeset_db, changeset_key_generator, results
+            )
+        pool.close()
+      except:
+        pool.terminate()
+        raise
+      finally:
+        pool.join()
+        _current_breaker = None
+    else:
+      # Do the same work in this process.  The changes are still made
+      # in a copy of each component, so that the output does not
+      # depend on the number of processes used:
+      changeset_graph_save = self.the_pass.changeset_graph
+      changeset_key_generator_save = self.the_pass.changeset_key_generator
+      try:
+        results = [self._break_component(*task) for task in tasks]
+      finally:
+        self.the_pass.changeset_graph = changeset_graph_save
+        self.the_pass.changeset_key_generator = changeset_key_generator_save
+      self._apply_results(
+          changeset_graph, changeset_db, changeset_key_generator, results
+          )
+
+  def _apply_results(
+        self, changeset_graph, changeset_db, changeset_key_generator,
+        results,
+        ):
+    for (changes, num_breaks) in results:
+      # A map {temporary id : real id} for the changesets added while
+      # breaking this component:
+      ids = {}
+      for (changeset_id, changeset) in changes:
+        if changeset is None:
+          changeset_graph.delete_changeset(
+              changeset_db[ids.get(changeset_id, changeset_id)]
+              )
+        else:
+          id = changeset_key_generator.gen_id()
+          ids[changeset.id] = id
+          changeset_graph.add_new_changeset(
+              changeset.create_split_changeset(id, changeset.cvs_item_ids)
+              )
+      changeset_graph.cycle_statistics.num_breaks += num_breaks
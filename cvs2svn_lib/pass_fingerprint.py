@@ -0,0 +1,215 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Record what each pass's output was derived from.
+
+A pass's fingerprint describes everything that its output depends on:
+the version and source code of cvs2svn (so that artifacts written by
+another version, possibly in another format, are never reused), the
+command-line options that can affect the pass, the configuration
+files that the options refer to (see register_config_file()), the
+files outside of the temporary directory that the pass reads (e.g.,
+the CVS repository's ,v files), the sizes and mtimes of the artifacts
+that it uses, and the sizes and mtimes of the artifacts and other
+files that it produced.  PassManager records the fingerprint of each
+pass when the pass is done.  When a conversion is re-run in the same
+temporary directory, a pass whose fingerprint is unchanged does not
+have to be run again; its outputs are reused instead."""
+
+
+import os
+import cPickle
+
+try:
+  from hashlib import md5
+except ImportError:
+  from md5 import new as md5
+
+import cvs2svn_rcsparse
+
+from cvs2svn_lib.version import VERSION
+
+
+# The digest returned by get_program_digest(), once it is computed:
+_program_digest = None
+
+# The names of the files registered via register_config_file():
+_config_files = set()
+
+
+def get_files_digest(filenames):
+  """Return a digest of the names, sizes, and mtimes of FILENAMES."""
+
+  digest = md5()
+  for filename in sorted(filenames):
+    try:
+      st = os.stat(filename)
+    except OSError:
+      digest.update('%s\0missing\0' % (filename,))
+    else:
+      digest.update('%s\0%d\0%r\0' % (filename, st.st_size, st.st_mtime,))
+  return digest.hexdigest()
+
+
+def register_config_file(filename):
+  """Record that the configuration was read in part from FILENAME.
+
+  Options files, the files that they execfile(), and the files read by
+  classes like SymbolHintsFileRule and MimeMapper are registered this
+  way, so that a pass is re-run if any of them changes.  Options files
+  that read other files themselves should register them, too."""
+
+  _config_files.add(filename)
+
+
+def get_config_files():
+  """Return the names of the files passed to register_config_file()."""
+
+  return sorted(_config_files)
+
+
+def get_program_digest():
+  """Return a digest of the cvs2svn version and source code.
+
+  The digest covers the Python files of cvs2svn_lib and
+  cvs2svn_rcsparse."""
+
+  global _program_digest
+
+  if _program_digest is None:
+    digest = md5()
+    digest.update('%s\0' % (VERSION,))
+    for directory in [
+          os.path.dirname(os.path.abspath(__file__)),
+          os.path.dirname(os.path.abspath(cvs2svn_rcsparse.__file__)),
+          ]:
+      for filename in sorted(os.listdir(directory)):
+        if filename.endswith('.py'):
+          f = open(os.path.join(directory, filename), 'rb')
+          try:
+            digest.update('%s\0%s\0' % (filename, f.read(),))
+          finally:
+            f.close()
+    _program_digest = digest.hexdigest()
+
+  return _program_digest
+
+
+class PassFingerprint(object):
+  """Everything that the output of a pass depends on.
+
+  PROGRAM is the digest returned by get_program_digest().  OPTIONS is
+  a string describing the relevant options.
+  EXTERNAL_INPUTS and EXTERNAL_OUTPUTS are the digests (as returned by
+  get_files_digest()) of the files outside of the temporary directory
+  that the pass reads and writes.  INPUTS and OUTPUTS are maps {name
+  : fingerprint} for the artifacts that the pass uses and the ones
+  that it creates or changes, as returned by
+  ArtifactManager.get_fingerprints()."""
+
+  def __init__(
+        self, program, options, external_inputs, inputs, outputs,
+        external_outputs,
+        ):
+    self.program = program
+    self.options = options
+    self.external_inputs = external_inputs
+    self.inputs = inputs
+    self.outputs = outputs
+    self.external_outputs = external_outputs
+
+  def explain_difference(self, old):
+    """Return a string explaining how SELF differs from OLD.
+
+    OLD is the PassFingerprint recorded the last time the pass was
+    run.  Return None if they do not differ."""
+
+    missing = [
+        name for (name, fingerprint) in self.outputs.items()
+        if fingerprint is None
+        ]
+    if missing:
+      return 'output %s is missing' % (sorted(missing)[0],)
+    # Fingerprints recorded by versions that did not record the
+    # program have no program attribute:
+    if getattr(old, 'program', None) != self.program:
+      return 'cvs2svn has changed'
+    if self.options != old.options:
+      return 'the options have changed'
+    if self.external_inputs != old.external_inputs:
+      return 'the CVS repository has changed'
+    for (name, fingerprint) in sorted(self.inputs.items()):
+      if old.inputs.get(name) != fingerprint:
+        return 'input %s has changed' % (name,)
+    if set(self.inputs) != set(old.inputs):
+      return 'the inputs have changed'
+    for (name, fingerprint) in sorted(self.outputs.items()):
+      if old.outputs.get(name) != fingerprint:
+        return 'output %s has changed' % (name,)
+    if set(self.outputs) != set(old.outputs):
+      return 'the outputs have changed'
+    if self.external_outputs != old.external_outputs:
+      return 'the files that it wrote have changed'
+    return None
+
+
+class PassFingerprintStore(object):
+  """The fingerprints of the passes that are done, kept in a file.
+
+  The file is rewritten every time that a fingerprint is added or
+  discarded, so that it stays accurate if the conversion is
+  interrupted."""
+
+  def __init__(self, filename):
+    self.filename = filename
+    # A map {pass_name : PassFingerprint}:
+    self._fingerprints = {}
+    if os.path.exists(self.filename):
+      f = open(self.filename, 'rb')
+      try:
+        self._fingerprints = cPickle.load(f)
+      finally:
+        f.close()
+
+  def __len__(self):
+    return len(self._fingerprints)
+
+  def get(self, pass_name):
+    """Return the recorded PassFingerprint for PASS_NAME, or None."""
+
+    return self._fingerprints.get(pass_name)
+
+  def _write(self):
+    f = open(self.filename, 'wb')
+    cPickle.dump(self._fingerprints, f, -1)
+    f.close()
+
+  def set(self, pass_name, fingerprint):
+    self._fingerprints[pass_name] = fingerprint
+    self._write()
+
+  def discard(self, pass_name):
+    """Forget the fingerprint of PASS_NAME, which is being re-run."""
+
+    if self._fingerprints.pop(pass_name, None) is not None:
+      self._write()
+
+  def delete(self):
+    """Delete the file, e.g., because all of the outputs are gone."""
+
+    self._fingerprints = {}
+    if os.path.exists(self.filename):
+      os.unlink(self.filename)
@@ -16,17 +16,31 @@
 
 """This module contains tools to manage the passes of a conversion."""
 
+import os
 import sys
 import time
 import platform
 import gc
+import signal
+import traceback
+from cStringIO import StringIO
 
 from cvs2svn_lib import config
+from cvs2svn_lib import counters
+from cvs2svn_lib import event_tracer
+from cvs2svn_lib.common import FatalException
 from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.memory_governor import memory_governor
 from cvs2svn_lib.stats_keeper import StatsKeeper
 from cvs2svn_lib.stats_keeper import read_stats_keeper
+from cvs2svn_lib.pass_fingerprint import get_files_digest
+from cvs2svn_lib.pass_fingerprint import get_program_digest
+from cvs2svn_lib.pass_fingerprint import PassFingerprint
+from cvs2svn_lib.pass_fingerprint import PassFingerprintStore
+from cvs2svn_lib.resource_monitor import ResourceMonitor
+from cvs2svn_lib.sampling_profiler import SamplingProfiler
 from cvs2svn_lib.artifact_manager import artifact_manager
 
 
@@ -130,6 +144,20 @@ def choose_garbage_collection_policy():
 class Pass(object):
   """Base class for one step of the conversion."""
 
+  # The command-line options that cannot affect the output of this
+  # pass, and are therefore left out of its fingerprint (see
+  # RunOptions.get_fingerprint_options()):
+  irrelevant_options = []
+
+  # The options in run_options.OUTPUT_OPTIONS that can affect the
+  # output of this pass (the others cannot):
+  output_options = []
+
+  # Can this pass be skipped if its results from an earlier run are
+  # up to date?  This must be False for passes whose results cannot
+  # be fingerprinted:
+  reusable = True
+
   def __init__(self):
     # By default, use the pass object's class name as the pass name:
     self.name = self.__class__.__name__
@@ -149,6 +177,27 @@ class Pass(object):
 
     artifact_manager.register_temp_file_needed(basename, self)
 
+  def _register_temp_file_modified(self, basename):
+    """Helper method; for brevity only."""
+
+    artifact_manager.register_temp_file_modified(basename, self)
+
+  def get_external_inputs(self, run_options):
+    """Return the names of the files outside of the tmpdir that we read.
+
+    Their sizes and mtimes are part of this pass's fingerprint (see
+    pass_fingerprint.py)."""
+
+    return []
+
+  def get_external_outputs(self):
+    """Return the names of the files outside of the tmpdir that we write.
+
+    Their sizes and mtimes are part of this pass's fingerprint (see
+    pass_fingerprint.py)."""
+
+    return []
+
   def run(self, run_options, stats_keeper):
     """Carry out this step of the conversion.
 
@@ -172,6 +221,8 @@ class PassManager:
     self.passes = passes
     self.num_passes = len(self.passes)
     self.garbage_collection_policy = choose_garbage_collection_policy()
+    # The SamplingProfiler that is running, if any:
+    self.sampling_profiler = None
 
   def get_pass_number(self, pass_name, default=None):
     """Return the number of the pass indicated by PASS_NAME.
@@ -203,14 +254,148 @@ class PassManager:
           return i + 1
       raise InvalidPassError('Unknown pass name (%r).' % (pass_name,))
 
+  def _read_stats_keeper(self, indexes):
+    """Return a StatsKeeper merging the statistics of passes INDEXES.
+
+    INDEXES are the (0-based) indexes of passes whose statistics files
+    exist.  If INDEXES is empty, return a new StatsKeeper."""
+
+    stats_keeper = StatsKeeper()
+    for i in sorted(indexes):
+      stats_keeper.merge(
+          read_stats_keeper(
+              artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
+              )
+          )
+    return stats_keeper
+
+  def _get_profile_filename(self, i, run_options):
+    """Return the name of the file for the profile of pass index I."""
+
+    return os.path.join(
+        run_options.profile_dir,
+        'pass%02d-%s.pstats' % (i + 1, self.passes[i].name,),
+        )
+
+  def _run_pass(self, i, run_options):
+    """Run the pass with (0-based) index I and archive its statistics.
+
+    Return the pass's StatsKeeper."""
+
+    the_pass = self.passes[i]
+    if self.sampling_profiler is not None:
+      self.sampling_profiler.pass_name = the_pass.name
+    counters.reset()
+    if event_tracer.enabled:
+      event_tracer.begin(the_pass.name, 'pass', {'pass' : i + 1})
+    start_time = time.time()
+    monitor = ResourceMonitor(Ctx().tmpdir)
+    monitor.start()
+    try:
+      stats_keeper = self._read_stats_keeper(self.dependencies[i])
+      if i + 1 in run_options.profile_passes:
+        import cProfile
+        profiler = cProfile.Profile()
+        try:
+          profiler.runcall(the_pass.run, run_options, stats_keeper)
+        finally:
+          profiler.dump_stats(self._get_profile_filename(i, run_options))
+      else:
+        the_pass.run(run_options, stats_keeper)
+    finally:
+      resources = monitor.stop()
+      if self.sampling_profiler is not None:
+        self.sampling_profiler.pass_name = None
+      if event_tracer.enabled:
+        event_tracer.end(the_pass.name, 'pass')
+    stats_keeper.log_duration_for_pass(
+        time.time() - start_time, i + 1, the_pass.name
+        )
+    stats_keeper.log_resources_for_pass(i + 1, resources)
+    if counters.enabled:
+      stats_keeper.log_counters_for_pass(i + 1, counters.get_values())
+    stats_keeper.archive(
+        artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
+        )
+    Ctx().clean()
+    self.garbage_collection_policy.check_for_garbage()
+    return stats_keeper
+
+  def _start_child(self, i, run_options, memory_budget):
+    """Run the pass with (0-based) index I in a child process.
+
+    MEMORY_BUDGET is the part of Ctx().memory_limit that the child may
+    use, or None if there is no memory limit.  Return the process id
+    of the child."""
+
+    pid = os.fork()
+    if pid:
+      return pid
+
+    # This is the child process.  It must not return into the caller's
+    # code, so leave via os._exit():
+    status = 1
+    try:
+      try:
+        if self.sampling_profiler is not None:
+          # The timer is not inherited by child processes, and the
+          # parent's samples are reported by the parent:
+          self.sampling_profiler.reset()
+          self.sampling_profiler.start()
+        event_tracer.reset()
+        memory_governor.set_budget(memory_budget)
+        self._run_pass(i, run_options)
+        if self.sampling_profiler is not None:
+          self.sampling_profiler.stop()
+          self.sampling_profiler.write(
+              Ctx().get_temp_filename(config.SAMPLES_FILE % (i + 1,))
+              )
+        if event_tracer.enabled:
+          event_tracer.dump(
+              Ctx().get_temp_filename(config.TRACE_EVENTS_FILE % (i + 1,))
+              )
+        status = 0
+      except FatalException, e:
+        sys.stderr.write(str(e) + '\n')
+      except:
+        traceback.print_exc()
+    finally:
+      sys.stdout.flush()
+      sys.stderr.flush()
+      os._exit(status)
+
+  def _pass_done(self, i, stats_keeper, fingerprint, fingerprint_store):
+    """The pass with (0-based) index I is done.
+
+    Record FINGERPRINT, the PassFingerprint that it had when it was
+    started, updated to describe its outputs, to FINGERPRINT_STORE."""
+
+    the_pass = self.passes[i]
+    logger.normal(stats_keeper.single_pass_timing(i + 1))
+    fingerprint.outputs = artifact_manager.get_fingerprints(the_pass)[1]
+    fingerprint.external_outputs = get_files_digest(
+        the_pass.get_external_outputs()
+        )
+    fingerprint_store.set(the_pass.name, fingerprint)
+    # Allow the artifact manager to clean up artifacts that are no
+    # longer needed:
+    artifact_manager.pass_done(the_pass, Ctx().skip_cleanup)
+
   def run(self, run_options):
-    """Run the specified passes, one after another.
+    """Run the specified passes.
 
     RUN_OPTIONS will be passed to the Passes' run() methods.
     RUN_OPTIONS.start_pass is the number of the first pass that should
     be run.  RUN_OPTIONS.end_pass is the number of the last pass that
     should be run.  It must be that 1 <= RUN_OPTIONS.start_pass <=
-    RUN_OPTIONS.end_pass <= self.num_passes."""
+    RUN_OPTIONS.end_pass <= self.num_passes.
+
+    The passes are started in order, but a pass is only made to wait
+    for the passes that create or change the artifacts that it uses
+    (and for the passes that use the artifacts that it changes).  If
+    Ctx().jobs is greater than one, passes that do not depend on each
+    other are run concurrently in child processes; for example, the
+    revision and symbol summaries are sorted at the same time."""
 
     # Convert start_pass and end_pass into the indices of the passes
     # to execute, using the Python index range convention (i.e., first
@@ -220,65 +405,247 @@ class PassManager:
     index_end = run_options.end_pass
 
     # Inform the artifact manager when artifacts are created and used:
-    for (i, the_pass) in enumerate(self.passes):
+    for the_pass in self.passes:
       the_pass.register_artifacts()
+
+    self.dependencies = artifact_manager.get_dependencies(self.passes)
+
+    for (i, the_pass) in enumerate(self.passes):
       # Each pass creates a new version of the statistics file:
       artifact_manager.register_temp_file(
           config.STATISTICS_FILE % (i + 1,), the_pass
           )
-      if i != 0:
-        # Each pass subsequent to the first reads the statistics file
-        # from the preceding pass:
+      # Each pass reads the statistics files from the passes that it
+      # depends on:
+      for j in self.dependencies[i]:
         artifact_manager.register_temp_file_needed(
-            config.STATISTICS_FILE % (i + 1 - 1,), the_pass
+            config.STATISTICS_FILE % (j + 1,), the_pass
             )
 
     # Tell the artifact manager about passes that are being skipped this run:
     for the_pass in self.passes[0:index_start]:
       artifact_manager.pass_skipped(the_pass)
 
-    start_time = time.time()
-    for i in range(index_start, index_end):
-      the_pass = self.passes[i]
-      logger.quiet('----- pass %d (%s) -----' % (i + 1, the_pass.name,))
-      artifact_manager.pass_started(the_pass)
-
-      if i == 0:
-        stats_keeper = StatsKeeper()
-      else:
-        stats_keeper = read_stats_keeper(
-            artifact_manager.get_temp_file(
-                config.STATISTICS_FILE % (i + 1 - 1,)
+    if hasattr(os, 'fork'):
+      jobs = Ctx().jobs
+    else:
+      jobs = 1
+
+    fingerprint_store = PassFingerprintStore(
+        Ctx().get_temp_filename(config.PASS_FINGERPRINTS)
+        )
+    # Only explain why passes are run if this is a re-run:
+    explain = len(fingerprint_store) > 0
+
+    counters.enabled = Ctx().count_operations
+    event_tracer.enabled = Ctx().trace_filename is not None
+
+    if run_options.sample_profile_filename is not None:
+      self.sampling_profiler = SamplingProfiler(run_options.sample_interval)
+      self.sampling_profiler.start()
+
+    # The indexes of the passes that are done:
+    done = set(range(index_start))
+    # The indexes of the passes that are still to be started:
+    pending = range(index_start, index_end)
+    # A map {pid : index} for the passes running in child processes:
+    running = {}
+    # A map {pid : bytes} for the parts of Ctx().memory_limit that
+    # have been given to the passes running in child processes:
+    memory_budgets = {}
+    # A map {index : StatsKeeper} for the passes that have been run or
+    # skipped:
+    stats_keepers = {}
+    # A map {index : PassFingerprint} for the passes that are running:
+    fingerprints = {}
+    # A list of (index, explanation) telling why each pass was run or
+    # skipped:
+    explanations = []
+
+    while pending or running:
+      ready = [i for i in pending if self.dependencies[i] <= done]
+      if ready and len(running) < jobs:
+        i = ready[0]
+        pending.remove(i)
+        the_pass = self.passes[i]
+        fingerprint = self._get_fingerprint(the_pass, run_options)
+        reason = self._get_reason_to_run(
+            the_pass, run_options, fingerprint, fingerprint_store
+            )
+        artifact_manager.pass_started(the_pass)
+        if reason is None:
+          logger.quiet(
+              '----- pass %d (%s) is up to date -----'
+              % (i + 1, the_pass.name,)
+              )
+          explanations.append((i, 'skipped: its results are up to date',))
+          stats_keepers[i] = self._read_stats_keeper([i])
+          artifact_manager.pass_done(the_pass, Ctx().skip_cleanup)
+          done.add(i)
+          continue
+
+        logger.quiet('----- pass %d (%s) -----' % (i + 1, the_pass.name,))
+        if explain:
+          logger.verbose('Running pass %d because %s.' % (i + 1, reason,))
+        explanations.append((i, 'run: %s' % (reason,),))
+        fingerprint_store.discard(the_pass.name)
+        fingerprints[i] = fingerprint
+        if jobs == 1 or (len(ready) == 1 and not running):
+          # There is nothing to run concurrently, so run the pass in
+          # this process:
+          stats_keepers[i] = self._run_pass(i, run_options)
+          self._pass_done(
+              i, stats_keepers[i], fingerprints.pop(i), fingerprint_store
+              )
+          done.add(i)
+        else:
+          # Split what is left of the memory limit evenly among the
+          # passes that can be started now, so that the passes running
+          # at any time never use more than the limit together:
+          if Ctx().memory_limit is None:
+            memory_budget = None
+          else:
+            memory_budget = (
+                (Ctx().memory_limit - sum(memory_budgets.values()))
+                // min(len(ready), jobs - len(running))
                 )
+          pid = self._start_child(i, run_options, memory_budget)
+          running[pid] = i
+          memory_budgets[pid] = memory_budget or 0
+        continue
+
+      (pid, status) = os.wait()
+      if pid not in running:
+        continue
+      i = running.pop(pid)
+      del memory_budgets[pid]
+      if status != 0:
+        for pid in running:
+          os.kill(pid, signal.SIGTERM)
+        while running:
+          running.pop(os.wait()[0], None)
+        raise FatalError(
+            'Pass %d (%s) failed.' % (i + 1, self.passes[i].name,)
             )
-
-      the_pass.run(run_options, stats_keeper)
-      end_time = time.time()
-      stats_keeper.log_duration_for_pass(
-          end_time - start_time, i + 1, the_pass.name
-          )
-      logger.normal(stats_keeper.single_pass_timing(i + 1))
-      stats_keeper.archive(
-          artifact_manager.get_temp_file(config.STATISTICS_FILE % (i + 1,))
+      stats_keepers[i] = self._read_stats_keeper([i])
+      if self.sampling_profiler is not None:
+        samples_filename = Ctx().get_temp_filename(
+            config.SAMPLES_FILE % (i + 1,)
+            )
+        self.sampling_profiler.read(samples_filename)
+        os.unlink(samples_filename)
+      if event_tracer.enabled:
+        events_filename = Ctx().get_temp_filename(
+            config.TRACE_EVENTS_FILE % (i + 1,)
+            )
+        event_tracer.load(events_filename)
+        os.unlink(events_filename)
+      self._pass_done(
+          i, stats_keepers[i], fingerprints.pop(i), fingerprint_store
           )
-      start_time = end_time
-      Ctx().clean()
-      # Allow the artifact manager to clean up artifacts that are no
-      # longer needed:
-      artifact_manager.pass_done(the_pass, Ctx().skip_cleanup)
+      done.add(i)
 
-      self.garbage_collection_policy.check_for_garbage()
+    if self.sampling_profiler is not None:
+      self.sampling_profiler.stop()
+      self.sampling_profiler.write(run_options.sample_profile_filename)
+      self.sampling_profiler = None
 
     # Tell the artifact manager about passes that are being deferred:
     for the_pass in self.passes[index_end:]:
       artifact_manager.pass_deferred(the_pass)
 
+    if index_end == self.num_passes and not Ctx().skip_cleanup:
+      # All of the passes' outputs have been cleaned up, so there is
+      # nothing left to reuse:
+      fingerprint_store.delete()
+
+    # The passes that were run concurrently each saw only part of the
+    # statistics, so merge them all:
+    stats_keeper = StatsKeeper()
+    for i in sorted(stats_keepers):
+      stats_keeper.merge(stats_keepers[i])
     logger.quiet(stats_keeper)
     logger.normal(stats_keeper.timings())
+    logger.normal(stats_keeper.resources())
+    if counters.enabled:
+      logger.normal(stats_keeper.counters())
+    if Ctx().pass_report_filename is not None:
+      f = open(Ctx().pass_report_filename, 'w')
+      f.write(stats_keeper.pass_report() + '\n')
+      f.close()
+    if event_tracer.enabled:
+      event_tracer.write_trace(Ctx().trace_filename)
+    if explain:
+      logger.normal(self._explain_passes(explanations))
+    for i in sorted(stats_keepers):
+      if i + 1 in run_options.profile_passes:
+        logger.quiet(self._profile_summary(i, run_options))
 
     # Consistency check:
     artifact_manager.check_clean()
 
+  def _get_fingerprint(self, the_pass, run_options):
+    """Return the current PassFingerprint of THE_PASS."""
+
+    (inputs, outputs) = artifact_manager.get_fingerprints(the_pass)
+    return PassFingerprint(
+        get_program_digest(),
+        run_options.get_fingerprint_options(
+            the_pass.irrelevant_options, the_pass.output_options
+            ),
+        get_files_digest(the_pass.get_external_inputs(run_options)),
+        inputs, outputs,
+        get_files_digest(the_pass.get_external_outputs()),
+        )
+
+  def _get_reason_to_run(
+        self, the_pass, run_options, fingerprint, fingerprint_store
+        ):
+    """Return a string explaining why THE_PASS has to be run.
+
+    FINGERPRINT is its current PassFingerprint.  Return None if the
+    pass's results from an earlier run can be reused instead."""
+
+    if not Ctx().reuse_passes:
+      return '--no-reuse-passes was specified'
+    elif self.passes.index(the_pass) + 1 in run_options.profile_passes:
+      return 'it is being profiled'
+    elif not the_pass.reusable:
+      return 'it is always run'
+
+    old_fingerprint = fingerprint_store.get(the_pass.name)
+    if old_fingerprint is None:
+      return 'it has not been run before'
+    else:
+      return fingerprint.explain_difference(old_fingerprint)
+
+  def _profile_summary(self, i, run_options):
+    """Return the functions that took the most time in pass index I.
+
+    The functions are sorted by cumulative time, and at most
+    config.PROFILE_TOP_FUNCTIONS of them are listed."""
+
+    import pstats
+    filename = self._get_profile_filename(i, run_options)
+    f = StringIO()
+    f.write(
+        'Profile of pass %d (%s), written to %s:\n'
+        % (i + 1, self.passes[i].name, filename,)
+        )
+    stats = pstats.Stats(filename, stream=f)
+    stats.sort_stats('cumulative').print_stats(config.PROFILE_TOP_FUNCTIONS)
+    return f.getvalue().rstrip('\n')
+
+  def _explain_passes(self, explanations):
+    f = StringIO()
+    f.write('Passes run and skipped:\n')
+    f.write('------------------\n')
+    for (i, explanation) in explanations:
+      f.write(
+          'pass%-2d   %s: %s\n' % (i + 1, self.passes[i].name, explanation,)
+          )
+    return f.getvalue().rstrip('\n')
+
   def help_passes(self):
     """Output (to sys.stdout) the indices and names of available passes."""
 
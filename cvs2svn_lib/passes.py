@@ -18,10 +18,13 @@
 
 
 import sys
+import os
 import shutil
 import cPickle
 
 from cvs2svn_lib import config
+from cvs2svn_lib import counters
+from cvs2svn_lib import event_tracer
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.common import FatalException
@@ -31,10 +34,11 @@ from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import Timestamper
-from cvs2svn_lib.sort import sort_file
+from cvs2svn_lib import sort
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.memory_governor import memory_governor
 from cvs2svn_lib.pass_manager import Pass
-from cvs2svn_lib.serializer import PrimedPickleSerializer
+from cvs2svn_lib.run_options import OUTPUT_OPTIONS
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.cvs_path_database import CVSPathDatabase
 from cvs2svn_lib.metadata_database import MetadataDatabase
@@ -55,10 +59,12 @@ from cvs2svn_lib.cvs_item import CVSRevision
 from cvs2svn_lib.cvs_item import CVSSymbol
 from cvs2svn_lib.cvs_item_database import OldCVSItemStore
 from cvs2svn_lib.cvs_item_database import IndexedCVSItemStore
-from cvs2svn_lib.cvs_item_database import cvs_item_primer
+from cvs2svn_lib.cvs_item_serializer import CVSItemSerializer
 from cvs2svn_lib.cvs_item_database import NewSortableCVSRevisionDatabase
 from cvs2svn_lib.cvs_item_database import OldSortableCVSRevisionDatabase
 from cvs2svn_lib.cvs_item_database import NewSortableCVSSymbolDatabase
+from cvs2svn_lib.cvs_item_database import NewCVSRevisionSummary
+from cvs2svn_lib.cvs_item_database import OldCVSRevisionSummary
 from cvs2svn_lib.cvs_item_database import OldSortableCVSSymbolDatabase
 from cvs2svn_lib.key_generator import KeyGenerator
 from cvs2svn_lib.changeset import RevisionChangeset
@@ -66,11 +72,16 @@ from cvs2svn_lib.changeset import OrderedChangeset
 from cvs2svn_lib.changeset import SymbolChangeset
 from cvs2svn_lib.changeset import BranchChangeset
 from cvs2svn_lib.changeset import create_symbol_changeset
-from cvs2svn_lib.changeset_graph import ChangesetGraph
+from cvs2svn_lib.changeset_graph import create_changeset_graph
+from cvs2svn_lib.parallel_cycle_breaker import ParallelCycleBreaker
 from cvs2svn_lib.changeset_graph_link import ChangesetGraphLink
 from cvs2svn_lib.changeset_database import ChangesetDatabase
 from cvs2svn_lib.changeset_database import CVSItemToChangesetTable
+from cvs2svn_lib.record_file import RecordFormat
+from cvs2svn_lib.record_file import RecordFileWriter
+from cvs2svn_lib.record_file import RecordFileReader
 from cvs2svn_lib.svn_commit import SVNRevisionCommit
+from cvs2svn_lib.openings_closings import SYMBOLINGS_FORMAT
 from cvs2svn_lib.openings_closings import SymbolingsLogger
 from cvs2svn_lib.svn_commit_creator import SVNCommitCreator
 from cvs2svn_lib.persistence_manager import PersistenceManager
@@ -82,9 +93,24 @@ from cvs2svn_lib.check_dependencies_pass \
     import CheckIndexedItemStoreDependenciesPass
 
 
+# Options that only affect how symbols are converted, starting with
+# CollateSymbolsPass:
+_SYMBOL_STRATEGY_OPTIONS = [
+    '--symbol-hints',
+    '--force-branch',
+    '--force-tag',
+    '--exclude',
+    '--keep-trivial-imports',
+    '--symbol-default',
+    '--write-symbol-info',
+    ]
+
+
 class CollectRevsPass(Pass):
   """This pass was formerly known as pass1."""
 
+  irrelevant_options = _SYMBOL_STRATEGY_OPTIONS
+
   def register_artifacts(self):
     self._register_temp_file(config.PROJECTS)
     self._register_temp_file(config.SYMBOL_STATISTICS)
@@ -93,6 +119,17 @@ class CollectRevsPass(Pass):
     self._register_temp_file(config.CVS_PATHS_DB)
     self._register_temp_file(config.CVS_ITEMS_STORE)
 
+  def get_external_inputs(self, run_options):
+    filenames = []
+    for project in run_options.projects:
+      for (dirpath, dirnames, basenames) in os.walk(
+            project.project_cvs_repos_path
+            ):
+        for basename in basenames:
+          if basename.endswith(',v'):
+            filenames.append(os.path.join(dirpath, basename))
+    return filenames
+
   def run(self, run_options, stats_keeper):
     logger.quiet("Examining all CVS ',v' files...")
     Ctx()._projects = {}
@@ -127,6 +164,8 @@ class CollectRevsPass(Pass):
 class CleanMetadataPass(Pass):
   """Clean up CVS revision metadata and write it to a new database."""
 
+  irrelevant_options = _SYMBOL_STRATEGY_OPTIONS
+
   def register_artifacts(self):
     self._register_temp_file(config.METADATA_CLEAN_INDEX_TABLE)
     self._register_temp_file(config.METADATA_CLEAN_STORE)
@@ -438,10 +477,17 @@ class FilterSymbolsPass(Pass):
   Also delete revisions on excluded branches, and delete other
   references to the excluded symbols."""
 
+  # The revision collector (e.g., cvs2git's blob writer) runs in this
+  # pass:
+  output_options = ['--blobfile', '--dry-run']
+
   def register_artifacts(self):
     self._register_temp_file(config.ITEM_SERIALIZER)
     self._register_temp_file(config.CVS_REVS_DATAFILE)
+    self._register_temp_file(config.CVS_REVS_SORTED_DATAFILE)
     self._register_temp_file(config.CVS_SYMBOLS_DATAFILE)
+    self._register_temp_file(config.CVS_SYMBOLS_SORTED_DATAFILE)
+    self._register_temp_file(config.CVS_REVS_SUMMARY_DATAFILE)
     self._register_temp_file_needed(config.PROJECTS)
     self._register_temp_file_needed(config.SYMBOL_DB)
     self._register_temp_file_needed(config.METADATA_CLEAN_STORE)
@@ -450,6 +496,9 @@ class FilterSymbolsPass(Pass):
     self._register_temp_file_needed(config.CVS_ITEMS_STORE)
     Ctx().revision_collector.register_artifacts(self)
 
+  def get_external_outputs(self):
+    return Ctx().revision_collector.get_external_outputs()
+
   def run(self, run_options, stats_keeper):
     Ctx()._projects = read_projects(
         artifact_manager.get_temp_file(config.PROJECTS)
@@ -464,19 +513,29 @@ class FilterSymbolsPass(Pass):
     cvs_item_store = OldCVSItemStore(
         artifact_manager.get_temp_file(config.CVS_ITEMS_STORE))
 
-    cvs_item_serializer = PrimedPickleSerializer(cvs_item_primer)
+    cvs_item_serializer = CVSItemSerializer()
     f = open(artifact_manager.get_temp_file(config.ITEM_SERIALIZER), 'wb')
     cPickle.dump(cvs_item_serializer, f, -1)
     f.close()
 
+    # If possible, the items are sorted in memory, and the sort passes
+    # have nothing left to do:
     rev_db = NewSortableCVSRevisionDatabase(
         artifact_manager.get_temp_file(config.CVS_REVS_DATAFILE),
         cvs_item_serializer,
+        artifact_manager.get_temp_file(config.CVS_REVS_SORTED_DATAFILE),
+        sort.in_memory_sort_limit,
         )
 
     symbol_db = NewSortableCVSSymbolDatabase(
         artifact_manager.get_temp_file(config.CVS_SYMBOLS_DATAFILE),
         cvs_item_serializer,
+        artifact_manager.get_temp_file(config.CVS_SYMBOLS_SORTED_DATAFILE),
+        sort.in_memory_sort_limit,
+        )
+
+    rev_summary = NewCVSRevisionSummary(
+        artifact_manager.get_temp_file(config.CVS_REVS_SUMMARY_DATAFILE)
         )
 
     revision_collector = Ctx().revision_collector
@@ -488,7 +547,10 @@ class FilterSymbolsPass(Pass):
 
     # Process the cvs items store one file at a time:
     for cvs_file_items in cvs_item_store.iter_cvs_file_items():
-      logger.verbose(cvs_file_items.cvs_file.rcs_path)
+      rcs_path = cvs_file_items.cvs_file.rcs_path
+      logger.verbose(rcs_path)
+      if event_tracer.enabled:
+        event_tracer.begin(rcs_path, 'file')
       cvs_file_items.filter_excluded_symbols()
       cvs_file_items.mutate_symbols()
       cvs_file_items.adjust_parents()
@@ -511,13 +573,18 @@ class FilterSymbolsPass(Pass):
 
         if isinstance(cvs_item, CVSRevision):
           rev_db.add(cvs_item)
+          rev_summary.add(cvs_item)
         elif isinstance(cvs_item, CVSSymbol):
           symbol_db.add(cvs_item)
 
+      if event_tracer.enabled:
+        event_tracer.end(rcs_path, 'file')
+
     stats_keeper.set_stats_reflect_exclude(True)
 
     rev_db.close()
     symbol_db.close()
+    rev_summary.close()
     revision_collector.finish()
     cvs_item_store.close()
     Ctx()._symbol_db.close()
@@ -526,21 +593,55 @@ class FilterSymbolsPass(Pass):
     logger.quiet("Done")
 
 
+def sort_temp_file(input, output, key=None, record_size=None):
+  """Sort the lines (or records) of temporary file INPUT into OUTPUT.
+
+  Use the settings from Ctx() and from the options in the sort
+  module.  If sort.run_memory_limit is not set, the memory governor
+  chooses the size of the runs."""
+
+  memory_limit = sort.run_memory_limit
+  allotment = None
+  if memory_limit is None:
+    memory_limit = allotment = memory_governor.allot('sorting %s' % (input,))
+  try:
+    sort.sort_file(
+        input, output, key=key, record_size=record_size,
+        tempdirs=[Ctx().tmpdir] + sort.extra_tempdirs,
+        jobs=Ctx().jobs,
+        memory_limit=memory_limit,
+        compress=sort.compress_runs,
+        )
+  finally:
+    memory_governor.release(allotment)
+
+
+def sort_unless_presorted(input, output):
+  """Sort INPUT into OUTPUT unless FilterSymbolsPass already did so.
+
+  If FilterSymbolsPass sorted the data in memory, it wrote them to
+  OUTPUT and left INPUT empty (see SortingWriter)."""
+
+  if os.path.getsize(input):
+    sort_temp_file(input, output)
+  else:
+    logger.normal("The data were already sorted in memory.")
+
+
 class SortRevisionsPass(Pass):
   """Sort the revisions file."""
 
   def register_artifacts(self):
-    self._register_temp_file(config.CVS_REVS_SORTED_DATAFILE)
+    self._register_temp_file_modified(config.CVS_REVS_SORTED_DATAFILE)
     self._register_temp_file_needed(config.CVS_REVS_DATAFILE)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting CVS revision summaries...")
-    sort_file(
+    sort_unless_presorted(
         artifact_manager.get_temp_file(config.CVS_REVS_DATAFILE),
         artifact_manager.get_temp_file(
             config.CVS_REVS_SORTED_DATAFILE
             ),
-        tempdirs=[Ctx().tmpdir],
         )
     logger.quiet("Done")
 
@@ -549,23 +650,42 @@ class SortSymbolsPass(Pass):
   """Sort the symbols file."""
 
   def register_artifacts(self):
-    self._register_temp_file(config.CVS_SYMBOLS_SORTED_DATAFILE)
+    self._register_temp_file_modified(config.CVS_SYMBOLS_SORTED_DATAFILE)
     self._register_temp_file_needed(config.CVS_SYMBOLS_DATAFILE)
 
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting CVS symbol summaries...")
-    sort_file(
+    sort_unless_presorted(
         artifact_manager.get_temp_file(config.CVS_SYMBOLS_DATAFILE),
         artifact_manager.get_temp_file(
             config.CVS_SYMBOLS_SORTED_DATAFILE
             ),
-        tempdirs=[Ctx().tmpdir],
         )
     logger.quiet("Done")
 
 
+class _SerializedCVSItem(object):
+  """A CVSItem that has not been deserialized.
+
+  InitializeChangesetsPass only deserializes CVSItems when it has to
+  sort them; otherwise it copies them to CVS_ITEMS_SORTED_STORE in
+  their serialized form."""
+
+  __slots__ = ['id', 'timestamp', 'data']
+
+  def __init__(self, id, timestamp, data):
+    self.id = id
+    # The timestamp of a CVSRevision, or None for a CVSSymbol:
+    self.timestamp = timestamp
+    self.data = data
+
+
 class InitializeChangesetsPass(Pass):
-  """Create preliminary CommitSets."""
+  """Create preliminary CommitSets.
+
+  The CVSItems are handled in serialized form (as _SerializedCVSItem
+  instances), with the dependencies among CVSRevisions read from
+  CVS_REVS_SUMMARY_DATAFILE."""
 
   def register_artifacts(self):
     self._register_temp_file(config.CVS_ITEM_TO_CHANGESET)
@@ -580,12 +700,13 @@ class InitializeChangesetsPass(Pass):
     self._register_temp_file_needed(config.CVS_REVS_SORTED_DATAFILE)
     self._register_temp_file_needed(
         config.CVS_SYMBOLS_SORTED_DATAFILE)
+    self._register_temp_file_needed(config.CVS_REVS_SUMMARY_DATAFILE)
 
   def get_revision_changesets(self):
     """Generate revision changesets, one at a time.
 
-    Each time, yield a list of CVSRevisions that might potentially
-    consititute a changeset."""
+    Each time, yield a list of _SerializedCVSItems for CVSRevisions
+    that might potentially consititute a changeset."""
 
     # Create changesets for CVSRevisions:
     old_metadata_id = None
@@ -599,17 +720,21 @@ class InitializeChangesetsPass(Pass):
         self.cvs_item_serializer,
         )
 
-    for cvs_rev in db:
-      if cvs_rev.metadata_id != old_metadata_id \
-         or cvs_rev.timestamp > old_timestamp + config.COMMIT_THRESHOLD:
+    for (metadata_id, timestamp, data) in db.iter_serialized():
+      if metadata_id != old_metadata_id \
+         or timestamp > old_timestamp + config.COMMIT_THRESHOLD:
         # Start a new changeset.  First finish up the old changeset,
         # if any:
         if changeset_items:
           yield changeset_items
           changeset_items = []
-        old_metadata_id = cvs_rev.metadata_id
-      changeset_items.append(cvs_rev)
-      old_timestamp = cvs_rev.timestamp
+        old_metadata_id = metadata_id
+      changeset_items.append(
+          _SerializedCVSItem(
+              self.cvs_item_serializer.load_id(data), timestamp, data
+              )
+          )
+      old_timestamp = timestamp
 
     # Finish up the last changeset, if any:
     if changeset_items:
@@ -618,8 +743,9 @@ class InitializeChangesetsPass(Pass):
   def get_symbol_changesets(self):
     """Generate symbol changesets, one at a time.
 
-    Each time, yield a list of CVSSymbols that might potentially
-    consititute a changeset."""
+    Each time, yield (symbol, items), where items is a list of
+    _SerializedCVSItems for CVSSymbols of SYMBOL that might
+    potentially consititute a changeset."""
 
     old_symbol_id = None
     changeset_items = []
@@ -631,19 +757,23 @@ class InitializeChangesetsPass(Pass):
         self.cvs_item_serializer,
         )
 
-    for cvs_symbol in db:
-      if cvs_symbol.symbol.id != old_symbol_id:
+    for (symbol_id, data) in db.iter_serialized():
+      if symbol_id != old_symbol_id:
         # Start a new changeset.  First finish up the old changeset,
         # if any:
         if changeset_items:
-          yield changeset_items
+          yield (Ctx()._symbol_db.get_symbol(old_symbol_id), changeset_items)
           changeset_items = []
-        old_symbol_id = cvs_symbol.symbol.id
-      changeset_items.append(cvs_symbol)
+        old_symbol_id = symbol_id
+      changeset_items.append(
+          _SerializedCVSItem(
+              self.cvs_item_serializer.load_id(data), None, data
+              )
+          )
 
     # Finish up the last changeset, if any:
     if changeset_items:
-      yield changeset_items
+      yield (Ctx()._symbol_db.get_symbol(old_symbol_id), changeset_items)
 
   @staticmethod
   def compare_items(a, b):
@@ -657,35 +787,45 @@ class InitializeChangesetsPass(Pass):
   def break_internal_dependencies(self, changeset_items):
     """Split up CHANGESET_ITEMS if necessary to break internal dependencies.
 
-    CHANGESET_ITEMS is a list of CVSRevisions that could possibly
-    belong in a single RevisionChangeset, but there might be internal
-    dependencies among the items.  Return a list of lists, where each
-    sublist is a list of CVSRevisions and at least one internal
-    dependency has been eliminated.  Iff CHANGESET_ITEMS does not have
-    to be split, then the return value will contain a single value,
-    namely the original value of CHANGESET_ITEMS.  Split
-    CHANGESET_ITEMS at most once, even though the resulting changesets
-    might themselves have internal dependencies."""
+    CHANGESET_ITEMS is a list of _SerializedCVSItems for CVSRevisions
+    that could possibly belong in a single RevisionChangeset, but
+    there might be internal dependencies among the items.  Return a
+    list of lists, where each sublist is a list of _SerializedCVSItems
+    and at least one internal dependency has been eliminated.  Iff
+    CHANGESET_ITEMS does not have to be split, then the return value
+    will contain a single value, namely the original value of
+    CHANGESET_ITEMS.  Split CHANGESET_ITEMS at most once, even though
+    the resulting changesets might themselves have internal
+    dependencies."""
 
     # We only look for succ dependencies, since by doing so we
     # automatically cover pred dependencies as well.  First create a
     # list of tuples (pred, succ) of id pairs for CVSItems that depend
     # on each other.
     dependencies = []
-    changeset_cvs_item_ids = set([cvs_rev.id for cvs_rev in changeset_items])
-    for cvs_item in changeset_items:
-      for next_id in cvs_item.get_succ_ids():
+    changeset_cvs_item_ids = set([item.id for item in changeset_items])
+    for item in changeset_items:
+      for next_id in self.rev_summary.get_succ_ids(item.id):
         if next_id in changeset_cvs_item_ids:
           # Sanity check: a CVSItem should never depend on itself:
-          if next_id == cvs_item.id:
-            raise InternalError('Item depends on itself: %s' % (cvs_item,))
+          if next_id == item.id:
+            raise InternalError(
+                'Item depends on itself: %s'
+                % (self.cvs_item_serializer.loads(item.data),)
+                )
 
-          dependencies.append((cvs_item.id, next_id,))
+          dependencies.append((item.id, next_id,))
 
     if dependencies:
       # Sort the changeset_items in a defined order (chronological to the
-      # extent that the timestamps are correct and unique).
-      changeset_items.sort(self.compare_items)
+      # extent that the timestamps are correct and unique).  This is
+      # the only time that the CVSRevisions have to be deserialized:
+      decorated = [
+          (self.cvs_item_serializer.loads(item.data), item)
+          for item in changeset_items
+          ]
+      decorated.sort(lambda a, b: self.compare_items(a[0], b[0]))
+      changeset_items = [item for (cvs_rev, item) in decorated]
       indexes = {}
       for (i, changeset_item) in enumerate(changeset_items):
         indexes[changeset_item.id] = i
@@ -721,10 +861,10 @@ class InitializeChangesetsPass(Pass):
   def break_all_internal_dependencies(self, changeset_items):
     """Keep breaking CHANGESET_ITEMS up to break all internal dependencies.
 
-    CHANGESET_ITEMS is a list of CVSRevisions that could conceivably
-    be part of a single changeset.  Break this list into sublists,
-    where the CVSRevisions in each sublist are free of mutual
-    dependencies."""
+    CHANGESET_ITEMS is a list of _SerializedCVSItems for CVSRevisions
+    that could conceivably be part of a single changeset.  Break this
+    list into sublists, where the CVSRevisions in each sublist are
+    free of mutual dependencies."""
 
     # This method is written non-recursively to avoid any possible
     # problems with recursion depth.
@@ -742,10 +882,10 @@ class InitializeChangesetsPass(Pass):
         changesets_to_split.extend(changesets)
 
   def get_changesets(self):
-    """Generate (Changeset, [CVSItem,...]) for all changesets.
+    """Generate (Changeset, [_SerializedCVSItem,...]) for all changesets.
 
     The Changesets already have their internal dependencies broken.
-    The [CVSItem,...] list is the list of CVSItems in the
+    The [_SerializedCVSItem,...] list is the list of CVSItems in the
     corresponding Changeset."""
 
     for changeset_items in self.get_revision_changesets():
@@ -754,17 +894,17 @@ class InitializeChangesetsPass(Pass):
         yield (
             RevisionChangeset(
                 self.changeset_key_generator.gen_id(),
-                [cvs_rev.id for cvs_rev in split_changeset_items]
+                [item.id for item in split_changeset_items]
                 ),
             split_changeset_items,
             )
 
-    for changeset_items in self.get_symbol_changesets():
+    for (symbol, changeset_items) in self.get_symbol_changesets():
       yield (
           create_symbol_changeset(
               self.changeset_key_generator.gen_id(),
-              changeset_items[0].symbol,
-              [cvs_symbol.id for cvs_symbol in changeset_items]
+              symbol,
+              [item.id for item in changeset_items]
               ),
           changeset_items,
           )
@@ -782,6 +922,10 @@ class InitializeChangesetsPass(Pass):
     self.cvs_item_serializer = cPickle.load(f)
     f.close()
 
+    self.rev_summary = OldCVSRevisionSummary(
+        artifact_manager.get_temp_file(config.CVS_REVS_SUMMARY_DATAFILE)
+        )
+
     changeset_db = ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_INDEX),
@@ -803,17 +947,21 @@ class InitializeChangesetsPass(Pass):
       if logger.is_on(logger.DEBUG):
         logger.debug(repr(changeset))
       changeset_db.store(changeset)
-      for cvs_item in changeset_items:
-        self.sorted_cvs_items_db.add(cvs_item)
-        cvs_item_to_changeset_id[cvs_item.id] = changeset.id
+      for item in changeset_items:
+        # The serializer of CVS_ITEMS_SORTED_STORE is the same as
+        # ITEM_SERIALIZER, so the item can be copied as is:
+        self.sorted_cvs_items_db.put_serialized(item.id, item.data)
+        cvs_item_to_changeset_id[item.id] = changeset.id
 
     self.sorted_cvs_items_db.close()
     cvs_item_to_changeset_id.close()
     changeset_db.close()
+    self.rev_summary.close()
     Ctx()._symbol_db.close()
     Ctx()._cvs_path_db.close()
 
     del self.cvs_item_serializer
+    del self.rev_summary
 
     logger.quiet("Done")
 
@@ -835,6 +983,18 @@ class ProcessedChangesetLogger:
       del self.processed_changeset_ids[:]
 
 
+def open_sorted_cvs_items_db():
+  """Open a private IndexedCVSItemStore as Ctx()._cvs_items_db.
+
+  This is used in worker processes, which must not share a file with
+  their parent process."""
+
+  Ctx()._cvs_items_db = IndexedCVSItemStore(
+      artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_STORE),
+      artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
+      DB_OPEN_READ)
+
+
 class BreakRevisionChangesetCyclesPass(Pass):
   """Break up any dependency cycles involving only RevisionChangesets."""
 
@@ -851,19 +1011,15 @@ class BreakRevisionChangesetCyclesPass(Pass):
     self._register_temp_file_needed(config.CHANGESETS_INDEX)
     self._register_temp_file_needed(config.CVS_ITEM_TO_CHANGESET)
 
-  def get_source_changesets(self):
-    old_changeset_db = ChangesetDatabase(
+  def open_source_changeset_db(self):
+    return ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_INDEX),
         DB_OPEN_READ)
 
-    changeset_ids = old_changeset_db.keys()
-
-    for changeset_id in changeset_ids:
-      yield old_changeset_db[changeset_id]
-
-    old_changeset_db.close()
-    del old_changeset_db
+  def get_source_changesets(self, changeset_db):
+    for changeset_id in changeset_db.keys():
+      yield changeset_db[changeset_id]
 
   def break_cycle(self, cycle):
     """Break up one or more changesets in CYCLE to help break the cycle.
@@ -878,13 +1034,19 @@ class BreakRevisionChangesetCyclesPass(Pass):
     It is not guaranteed that the cycle will be broken by one call to
     this routine, but at least some progress must be made."""
 
+    if counters.enabled:
+      counters.add('changeset cycles broken')
+    if event_tracer.enabled:
+      event_tracer.begin('break cycle', 'cycle', {'length' : len(cycle)})
+
     self.processed_changeset_logger.flush()
     best_i = None
     best_link = None
     for i in range(len(cycle)):
       # It's OK if this index wraps to -1:
       link = ChangesetGraphLink(
-          cycle[i - 1], cycle[i], cycle[i + 1 - len(cycle)])
+          cycle[i - 1], cycle[i], cycle[i + 1 - len(cycle)],
+          self.changeset_graph.cvs_item_dependencies)
 
       if best_i is None or link < best_link:
         best_i = i
@@ -903,6 +1065,19 @@ class BreakRevisionChangesetCyclesPass(Pass):
     for changeset in new_changesets:
       self.changeset_graph.add_new_changeset(changeset)
 
+    if event_tracer.enabled:
+      event_tracer.end('break cycle', 'cycle')
+
+  def break_component(self, component):
+    """Make progress towards breaking the cycles in COMPONENT.
+
+    COMPONENT is a list of the ids of the changesets in a cyclic
+    strongly connected component of self.changeset_graph."""
+
+    self.break_cycle(
+        self.changeset_graph.find_cycle(component[0], set(component))
+        )
+
   def run(self, run_options, stats_keeper):
     logger.quiet("Breaking revision changeset dependency cycles...")
 
@@ -931,30 +1106,54 @@ class BreakRevisionChangesetCyclesPass(Pass):
         artifact_manager.get_temp_file(config.CHANGESETS_REVBROKEN_INDEX),
         DB_OPEN_NEW)
 
-    self.changeset_graph = ChangesetGraph(
-        changeset_db, cvs_item_to_changeset_id
+    old_changeset_db = self.open_source_changeset_db()
+
+    self.changeset_graph = create_changeset_graph(
+        changeset_db, cvs_item_to_changeset_id, len(old_changeset_db.keys())
         )
 
     max_changeset_id = 0
-    for changeset in self.get_source_changesets():
+    for changeset in self.get_source_changesets(old_changeset_db):
       changeset_db.store(changeset)
       if isinstance(changeset, RevisionChangeset):
         self.changeset_graph.add_changeset(changeset)
       max_changeset_id = max(max_changeset_id, changeset.id)
 
+    old_changeset_db.close()
+
     self.changeset_key_generator = KeyGenerator(max_changeset_id + 1)
 
     self.processed_changeset_logger = ProcessedChangesetLogger()
 
+    # The components are broken via ParallelCycleBreaker even if
+    # there is only one job, so that the changeset ids do not depend
+    # on the number of jobs:
+    parallel_cycle_breaker = ParallelCycleBreaker(
+        self, Ctx().jobs, self.break_component, open_sorted_cvs_items_db
+        )
+    components_breaker = lambda components: \
+        parallel_cycle_breaker.break_components(
+            self.changeset_graph, changeset_db,
+            self.changeset_key_generator, components,
+            )
+
     # Consume the graph, breaking cycles using self.break_cycle():
     for (changeset, time_range) in self.changeset_graph.consume_graph(
-          cycle_breaker=self.break_cycle
+          cycle_breaker=self.break_cycle,
+          components_breaker=components_breaker,
           ):
       self.processed_changeset_logger.log(changeset.id)
 
     self.processed_changeset_logger.flush()
     del self.processed_changeset_logger
 
+    logger.verbose(
+        'Cycle breaking: %s' % (self.changeset_graph.cycle_statistics,)
+        )
+    stats_keeper.log_cycle_statistics(
+        self.name, self.changeset_graph.cycle_statistics
+        )
+
     self.changeset_graph.close()
     self.changeset_graph = None
     Ctx()._cvs_items_db.close()
@@ -994,14 +1193,15 @@ class RevisionTopologicalSortPass(Pass):
         DB_OPEN_READ,
         )
 
-    changeset_graph = ChangesetGraph(
+    changeset_graph = create_changeset_graph(
         changeset_db,
         CVSItemToChangesetTable(
             artifact_manager.get_temp_file(
                 config.CVS_ITEM_TO_CHANGESET_REVBROKEN
                 ),
             DB_OPEN_READ,
-            )
+            ),
+        len(changeset_db.keys()),
         )
 
     for changeset in self.get_source_changesets(changeset_db):
@@ -1074,18 +1274,15 @@ class BreakSymbolChangesetCyclesPass(Pass):
     self._register_temp_file_needed(config.CHANGESETS_REVSORTED_INDEX)
     self._register_temp_file_needed(config.CVS_ITEM_TO_CHANGESET_REVBROKEN)
 
-  def get_source_changesets(self):
-    old_changeset_db = ChangesetDatabase(
+  def open_source_changeset_db(self):
+    return ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_REVSORTED_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_REVSORTED_INDEX),
         DB_OPEN_READ)
 
-    changeset_ids = old_changeset_db.keys()
-
-    for changeset_id in changeset_ids:
-      yield old_changeset_db[changeset_id]
-
-    old_changeset_db.close()
+  def get_source_changesets(self, changeset_db):
+    for changeset_id in changeset_db.keys():
+      yield changeset_db[changeset_id]
 
   def break_cycle(self, cycle):
     """Break up one or more changesets in CYCLE to help break the cycle.
@@ -1100,13 +1297,19 @@ class BreakSymbolChangesetCyclesPass(Pass):
     It is not guaranteed that the cycle will be broken by one call to
     this routine, but at least some progress must be made."""
 
+    if counters.enabled:
+      counters.add('changeset cycles broken')
+    if event_tracer.enabled:
+      event_tracer.begin('break cycle', 'cycle', {'length' : len(cycle)})
+
     self.processed_changeset_logger.flush()
     best_i = None
     best_link = None
     for i in range(len(cycle)):
       # It's OK if this index wraps to -1:
       link = ChangesetGraphLink(
-          cycle[i - 1], cycle[i], cycle[i + 1 - len(cycle)])
+          cycle[i - 1], cycle[i], cycle[i + 1 - len(cycle)],
+          self.changeset_graph.cvs_item_dependencies)
 
       if best_i is None or link < best_link:
         best_i = i
@@ -1125,6 +1328,9 @@ class BreakSymbolChangesetCyclesPass(Pass):
     for changeset in new_changesets:
       self.changeset_graph.add_new_changeset(changeset)
 
+    if event_tracer.enabled:
+      event_tracer.end('break cycle', 'cycle')
+
   def run(self, run_options, stats_keeper):
     logger.quiet("Breaking symbol changeset dependency cycles...")
 
@@ -1153,17 +1359,21 @@ class BreakSymbolChangesetCyclesPass(Pass):
         artifact_manager.get_temp_file(config.CHANGESETS_SYMBROKEN_INDEX),
         DB_OPEN_NEW)
 
-    self.changeset_graph = ChangesetGraph(
-        changeset_db, cvs_item_to_changeset_id
+    old_changeset_db = self.open_source_changeset_db()
+
+    self.changeset_graph = create_changeset_graph(
+        changeset_db, cvs_item_to_changeset_id, len(old_changeset_db.keys())
         )
 
     max_changeset_id = 0
-    for changeset in self.get_source_changesets():
+    for changeset in self.get_source_changesets(old_changeset_db):
       changeset_db.store(changeset)
       if isinstance(changeset, SymbolChangeset):
         self.changeset_graph.add_changeset(changeset)
       max_changeset_id = max(max_changeset_id, changeset.id)
 
+    old_changeset_db.close()
+
     self.changeset_key_generator = KeyGenerator(max_changeset_id + 1)
 
     self.processed_changeset_logger = ProcessedChangesetLogger()
@@ -1177,6 +1387,13 @@ class BreakSymbolChangesetCyclesPass(Pass):
     self.processed_changeset_logger.flush()
     del self.processed_changeset_logger
 
+    logger.verbose(
+        'Cycle breaking: %s' % (self.changeset_graph.cycle_statistics,)
+        )
+    stats_keeper.log_cycle_statistics(
+        self.name, self.changeset_graph.cycle_statistics
+        )
+
     self.changeset_graph.close()
     self.changeset_graph = None
     Ctx()._cvs_items_db.close()
@@ -1202,18 +1419,15 @@ class BreakAllChangesetCyclesPass(Pass):
     self._register_temp_file_needed(config.CHANGESETS_SYMBROKEN_INDEX)
     self._register_temp_file_needed(config.CVS_ITEM_TO_CHANGESET_SYMBROKEN)
 
-  def get_source_changesets(self):
-    old_changeset_db = ChangesetDatabase(
+  def open_source_changeset_db(self):
+    return ChangesetDatabase(
         artifact_manager.get_temp_file(config.CHANGESETS_SYMBROKEN_STORE),
         artifact_manager.get_temp_file(config.CHANGESETS_SYMBROKEN_INDEX),
         DB_OPEN_READ)
 
-    changeset_ids = old_changeset_db.keys()
-
-    for changeset_id in changeset_ids:
-      yield old_changeset_db[changeset_id]
-
-    old_changeset_db.close()
+  def get_source_changesets(self, changeset_db):
+    for changeset_id in changeset_db.keys():
+      yield changeset_db[changeset_id]
 
   def _split_retrograde_changeset(self, changeset):
     """CHANGESET is retrograde.  Split it into non-retrograde changesets."""
@@ -1303,7 +1517,9 @@ class BreakAllChangesetCyclesPass(Pass):
     best_i = None
     best_link = None
     for i in range(1, len(segment) - 1):
-      link = ChangesetGraphLink(segment[i - 1], segment[i], segment[i + 1])
+      link = ChangesetGraphLink(
+          segment[i - 1], segment[i], segment[i + 1],
+          self.changeset_graph.cvs_item_dependencies)
 
       if best_i is None or link < best_link:
         best_i = i
@@ -1336,6 +1552,11 @@ class BreakAllChangesetCyclesPass(Pass):
     It is not guaranteed that the cycle will be broken by one call to
     this routine, but at least some progress must be made."""
 
+    if counters.enabled:
+      counters.add('changeset cycles broken')
+    if event_tracer.enabled:
+      event_tracer.begin('break cycle', 'cycle', {'length' : len(cycle)})
+
     if logger.is_on(logger.DEBUG):
       logger.debug(
           'Breaking cycle %s' % (
@@ -1345,6 +1566,45 @@ class BreakAllChangesetCyclesPass(Pass):
     # Unwrap the cycle into a segment then break the segment:
     self.break_segment([cycle[-1]] + cycle + [cycle[0]])
 
+    if event_tracer.enabled:
+      event_tracer.end('break cycle', 'cycle')
+
+  def break_component(self, component):
+    """Make progress towards breaking the cycles in COMPONENT.
+
+    COMPONENT is a list of the ids of the changesets in a cyclic
+    strongly connected component of self.changeset_graph."""
+
+    members = set(component)
+
+    # The OrderedChangesets in the component.
+    # BreakSymbolChangesetCyclesPass has broken any cycles involving
+    # only SymbolChangesets, so every cycle involves at least one
+    # OrderedChangeset:
+    ordered_changeset_ids = set([
+        id for id in component if id in self.ordinals
+        ])
+    assert ordered_changeset_ids
+
+    # Work on the earliest ordered changeset in the component:
+    id = min(ordered_changeset_ids, key=self.ordinals.__getitem__)
+    path = self.changeset_graph.search_for_path(
+        id, ordered_changeset_ids, members
+        )
+    if path:
+      if logger.is_on(logger.DEBUG):
+        logger.debug('Breaking path from %s to %s' % (path[0], path[-1],))
+      self.break_segment(path)
+    else:
+      # There were no ordered changesets among the reachable
+      # predecessors, so do generic cycle-breaking:
+      if logger.is_on(logger.DEBUG):
+        logger.debug(
+            'Breaking generic cycle found from %s'
+            % (self.changeset_graph.get_changeset(id),)
+            )
+      self.break_cycle(self.changeset_graph.find_cycle(id, members))
+
   def run(self, run_options, stats_keeper):
     logger.quiet("Breaking CVSSymbol dependency loops...")
 
@@ -1373,35 +1633,29 @@ class BreakAllChangesetCyclesPass(Pass):
         artifact_manager.get_temp_file(config.CHANGESETS_ALLBROKEN_INDEX),
         DB_OPEN_NEW)
 
-    self.changeset_graph = ChangesetGraph(
-        self.changeset_db, self.cvs_item_to_changeset_id
+    old_changeset_db = self.open_source_changeset_db()
+
+    self.changeset_graph = create_changeset_graph(
+        self.changeset_db, self.cvs_item_to_changeset_id,
+        len(old_changeset_db.keys()),
         )
 
-    # A map {changeset_id : ordinal} for OrderedChangesets:
+    # A map {changeset_id : ordinal} for OrderedChangesets.  Entries
+    # are removed as the changesets are consumed from the graph:
     self.ordinals = {}
-    # A map {ordinal : changeset_id}:
-    ordered_changeset_map = {}
     # A list of all BranchChangeset ids:
     branch_changeset_ids = []
     max_changeset_id = 0
-    for changeset in self.get_source_changesets():
+    for changeset in self.get_source_changesets(old_changeset_db):
       self.changeset_db.store(changeset)
       self.changeset_graph.add_changeset(changeset)
       if isinstance(changeset, OrderedChangeset):
-        ordered_changeset_map[changeset.ordinal] = changeset.id
         self.ordinals[changeset.id] = changeset.ordinal
       elif isinstance(changeset, BranchChangeset):
         branch_changeset_ids.append(changeset.id)
       max_changeset_id = max(max_changeset_id, changeset.id)
 
-    # An array of ordered_changeset ids, indexed by ordinal:
-    ordered_changesets = []
-    for ordinal in range(len(ordered_changeset_map)):
-      id = ordered_changeset_map[ordinal]
-      ordered_changesets.append(id)
-
-    ordered_changeset_ids = set(ordered_changeset_map.values())
-    del ordered_changeset_map
+    old_changeset_db.close()
 
     self.changeset_key_generator = KeyGenerator(max_changeset_id + 1)
 
@@ -1411,10 +1665,6 @@ class BreakAllChangesetCyclesPass(Pass):
     for changeset_id in branch_changeset_ids:
       self._split_if_retrograde(changeset_id)
 
-    del self.ordinals
-
-    next_ordered_changeset = 0
-
     self.processed_changeset_logger = ProcessedChangesetLogger()
 
     while self.changeset_graph:
@@ -1422,38 +1672,34 @@ class BreakAllChangesetCyclesPass(Pass):
       for (changeset, time_range) \
               in self.changeset_graph.consume_nopred_nodes():
         self.processed_changeset_logger.log(changeset.id)
-        if changeset.id in ordered_changeset_ids:
-          next_ordered_changeset += 1
-          ordered_changeset_ids.remove(changeset.id)
+        self.ordinals.pop(changeset.id, None)
 
       self.processed_changeset_logger.flush()
 
       if not self.changeset_graph:
         break
 
-      # Now work on the next ordered changeset that has not yet been
-      # processed.  BreakSymbolChangesetCyclesPass has broken any
-      # cycles involving only SymbolChangesets, so the presence of a
-      # cycle implies that there is at least one ordered changeset
-      # left in the graph:
-      assert next_ordered_changeset < len(ordered_changesets)
-
-      id = ordered_changesets[next_ordered_changeset]
-      path = self.changeset_graph.search_for_path(id, ordered_changeset_ids)
-      if path:
-        if logger.is_on(logger.DEBUG):
-          logger.debug('Breaking path from %s to %s' % (path[0], path[-1],))
-        self.break_segment(path)
-      else:
-        # There were no ordered changesets among the reachable
-        # predecessors, so do generic cycle-breaking:
-        if logger.is_on(logger.DEBUG):
-          logger.debug(
-              'Breaking generic cycle found from %s'
-              % (self.changeset_db[id],)
+      # Find all of the cyclic regions of the graph at once, then break
+      # the cycles within each of them:
+      components = self.changeset_graph.find_cyclic_components()
+      self.changeset_graph.cycle_statistics.record_components(components)
+      # As in BreakRevisionChangesetCyclesPass, this is done the same
+      # way regardless of the number of jobs:
+      ParallelCycleBreaker(
+          self, Ctx().jobs, self.break_component, open_sorted_cvs_items_db
+          ).break_components(
+              self.changeset_graph, self.changeset_db,
+              self.changeset_key_generator, components,
               )
-        self.break_cycle(self.changeset_graph.find_cycle(id))
 
+    logger.verbose(
+        'Cycle breaking: %s' % (self.changeset_graph.cycle_statistics,)
+        )
+    stats_keeper.log_cycle_statistics(
+        self.name, self.changeset_graph.cycle_statistics
+        )
+
+    del self.ordinals
     del self.processed_changeset_logger
     self.changeset_graph.close()
     self.changeset_graph = None
@@ -1463,6 +1709,12 @@ class BreakAllChangesetCyclesPass(Pass):
     logger.quiet("Done")
 
 
+# The format of the records in CHANGESETS_SORTED_DATAFILE:
+# (changeset_id, timestamp).  Timestamps can be negative (e.g., if the
+# clock was wrong when an RCS file was written):
+CHANGESETS_SORTED_FORMAT = RecordFormat('Iq')
+
+
 class TopologicalSortPass(Pass):
   """Sort changesets into commit order."""
 
@@ -1489,7 +1741,7 @@ class TopologicalSortPass(Pass):
         artifact_manager.get_temp_file(config.CHANGESETS_ALLBROKEN_INDEX),
         DB_OPEN_READ)
 
-    changeset_graph = ChangesetGraph(
+    changeset_graph = create_changeset_graph(
         changeset_db,
         CVSItemToChangesetTable(
             artifact_manager.get_temp_file(
@@ -1497,6 +1749,7 @@ class TopologicalSortPass(Pass):
                 ),
             DB_OPEN_READ,
             ),
+        len(changeset_db.keys()),
         )
     symbol_changeset_ids = set()
 
@@ -1531,12 +1784,14 @@ class TopologicalSortPass(Pass):
         artifact_manager.get_temp_file(config.CVS_ITEMS_SORTED_INDEX_TABLE),
         DB_OPEN_READ)
 
-    sorted_changesets = open(
+    sorted_changesets = RecordFileWriter(
         artifact_manager.get_temp_file(config.CHANGESETS_SORTED_DATAFILE),
-        'w')
+        CHANGESETS_SORTED_FORMAT,
+        )
 
     for (changeset, timestamp) in self.get_changesets():
-      sorted_changesets.write('%x %08x\n' % (changeset.id, timestamp,))
+      # The Timestamper returns floats; store whole seconds:
+      sorted_changesets.write(changeset.id, int(timestamp))
 
     sorted_changesets.close()
 
@@ -1578,12 +1833,14 @@ class CreateRevsPass(Pass):
         artifact_manager.get_temp_file(config.CHANGESETS_ALLBROKEN_INDEX),
         DB_OPEN_READ)
 
-    for line in file(
-            artifact_manager.get_temp_file(
-                config.CHANGESETS_SORTED_DATAFILE)):
-      [changeset_id, timestamp] = [int(s, 16) for s in line.strip().split()]
+    sorted_changesets = RecordFileReader(
+        artifact_manager.get_temp_file(config.CHANGESETS_SORTED_DATAFILE),
+        CHANGESETS_SORTED_FORMAT,
+        )
+    for (changeset_id, timestamp) in sorted_changesets:
       yield (changeset_db[changeset_id], timestamp)
 
+    sorted_changesets.close()
     changeset_db.close()
 
   def get_svn_commits(self, creator):
@@ -1649,17 +1906,14 @@ class SortSymbolOpeningsClosingsPass(Pass):
   def run(self, run_options, stats_keeper):
     logger.quiet("Sorting symbolic name source revisions...")
 
-    def sort_key(line):
-      line = line.split(' ', 2)
-      return (int(line[0], 16), int(line[1]), line[2],)
-
-    sort_file(
+    # The records sort bytewise by (symbol_id, svn_revnum, type,
+    # cvs_symbol_id):
+    sort_temp_file(
         artifact_manager.get_temp_file(config.SYMBOL_OPENINGS_CLOSINGS),
         artifact_manager.get_temp_file(
             config.SYMBOL_OPENINGS_CLOSINGS_SORTED
             ),
-        key=sort_key,
-        tempdirs=[Ctx().tmpdir],
+        record_size=SYMBOLINGS_FORMAT.size,
         )
     logger.quiet("Done")
 
@@ -1674,31 +1928,28 @@ class IndexSymbolsPass(Pass):
     self._register_temp_file_needed(config.SYMBOL_OPENINGS_CLOSINGS_SORTED)
 
   def generate_offsets_for_symbolings(self):
-    """This function iterates through all the lines in
+    """This function iterates through all the records in
     SYMBOL_OPENINGS_CLOSINGS_SORTED, writing out a file mapping
-    SYMBOLIC_NAME to the file offset in SYMBOL_OPENINGS_CLOSINGS_SORTED
-    where SYMBOLIC_NAME is first encountered.  This will allow us to
-    seek to the various offsets in the file and sequentially read only
-    the openings and closings that we need."""
+    SYMBOLIC_NAME to the index of the record in
+    SYMBOL_OPENINGS_CLOSINGS_SORTED where SYMBOLIC_NAME is first
+    encountered.  This will allow us to jump to the various records in
+    the file and sequentially read only the openings and closings that
+    we need."""
 
     offsets = {}
 
-    f = open(
+    f = RecordFileReader(
         artifact_manager.get_temp_file(
             config.SYMBOL_OPENINGS_CLOSINGS_SORTED),
-        'r')
+        SYMBOLINGS_FORMAT,
+        )
     old_id = None
-    while True:
-      fpos = f.tell()
-      line = f.readline()
-      if not line:
-        break
-      id, svn_revnum, ignored = line.split(" ", 2)
-      id = int(id, 16)
+    for (index, record) in enumerate(f):
+      id = record[0]
       if id != old_id:
         logger.verbose(' ', Ctx()._symbol_db.get_symbol(id).name)
         old_id = id
-        offsets[id] = fpos
+        offsets[id] = index
 
     f.close()
 
@@ -1721,6 +1972,11 @@ class IndexSymbolsPass(Pass):
 class OutputPass(Pass):
   """This pass was formerly known as pass8."""
 
+  # The output (e.g., a Subversion repository) cannot be fingerprinted:
+  reusable = False
+
+  output_options = OUTPUT_OPTIONS
+
   def register_artifacts(self):
     self._register_temp_file_needed(config.PROJECTS)
     self._register_temp_file_needed(config.CVS_PATHS_DB)
@@ -1756,7 +2012,11 @@ class OutputPass(Pass):
     svn_revnum = 1
     svn_commit = Ctx()._persistence_manager.get_svn_commit(svn_revnum)
     while svn_commit:
+      if event_tracer.enabled:
+        event_tracer.begin('r%d' % (svn_revnum,), 'commit')
       svn_commit.output(Ctx().output_option)
+      if event_tracer.enabled:
+        event_tracer.end('r%d' % (svn_revnum,), 'commit')
       svn_revnum += 1
       svn_commit = Ctx()._persistence_manager.get_svn_commit(svn_revnum)
 
@@ -25,6 +25,7 @@ from cStringIO import StringIO
 
 from cvs2svn_lib.common import warning_prefix
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.pass_fingerprint import register_config_file
 
 
 def _squash_case(s):
@@ -125,6 +126,7 @@ class MimeMapper(FilePropertySetter):
       logger.error('Should specify MIME types file or dict.\n')
 
     if mime_types_file is not None:
+      register_config_file(mime_types_file)
       for line in file(mime_types_file):
         if line.startswith("#"):
           continue
@@ -237,6 +239,7 @@ class AutoPropsPropertySetter(FilePropertySetter):
       config.optionxform = _preserve_case
       self.transform_case = _preserve_case
 
+    register_config_file(configfilename)
     f = open(configfilename)
     configtext = f.read()
     f.close()
@@ -20,6 +20,8 @@
 from cStringIO import StringIO
 import re
 
+from cvs2svn_lib import counters
+
 
 def msplit(s):
   """Split S into an array of lines.
@@ -162,6 +164,22 @@ def write_edits(f, edits):
       raise MalformedDeltaException('Unknown command %r' % (command,))
 
 
+def count_blocks(blocks):
+  """Generate BLOCKS, counting the delta and the lines that it copies.
+
+  BLOCKS is an iterable over the blocks of one RCS delta, as generated
+  by RCSStream.generate_blocks().  This is only used when
+  counters.enabled is set."""
+
+  counters.add('RCS deltas applied')
+  copied = 0
+  for block in blocks:
+    if block[0] == 'c':
+      copied += len(block[1])
+    yield block
+  counters.add('RCS lines copied', copied)
+
+
 class RCSStream:
   """This class allows RCS deltas to be accumulated.
 
@@ -266,6 +284,8 @@ class RCSStream:
     lines = []
 
     blocks = self.generate_blocks(generate_edits(diff))
+    if counters.enabled:
+      blocks = count_blocks(blocks)
     for (command, old_lines, new_lines) in blocks:
       lines += new_lines
 
@@ -278,6 +298,8 @@ class RCSStream:
     edits suitable for reverting the change."""
 
     blocks = self.generate_blocks(edits)
+    if counters.enabled:
+      blocks = count_blocks(blocks)
 
     # Blocks have to be merged so that adjacent delete,add edits are
     # generated in that order:
@@ -0,0 +1,167 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Files of fixed-width binary records that sort bytewise.
+
+Some intermediate files only need to hold a few integers per entry
+and have to be sorted between passes.  Storing each entry as a text
+line means that each line has to be split and parsed again every time
+it is compared or read.  Instead, a RecordFormat packs the fields of
+each entry into a fixed-width, big-endian binary record, so that
+comparing two records as strings gives the same result as comparing
+their fields numerically, in order.  Such files can be sorted with
+sort_file(..., record_size=format.size) without a key function, and
+read efficiently via mmap using RecordFileReader."""
+
+
+import os
+import struct
+import mmap
+
+
+# A map {signed type : (unsigned type, bias)}.  Signed fields are
+# stored as the corresponding unsigned type, with the bias added, so
+# that their byte order matches their numeric order:
+_signed_types = {
+    'b' : ('B', 2**7),
+    'h' : ('H', 2**15),
+    'i' : ('I', 2**31),
+    'q' : ('Q', 2**63),
+    }
+
+
+class RecordFormat(object):
+  """The format of the records in a file of fixed-width records.
+
+  FORMAT is a struct format string without a byte-order character or
+  repeat counts, with one character per field.  For the records to
+  sort correctly, it should only contain integer types ('B', 'H',
+  'I', 'Q', and their signed counterparts 'b', 'h', 'i', 'q') and
+  characters ('c').  The fields are stored big-endian and without
+  padding; signed fields are stored with a bias (see _signed_types)."""
+
+  def __init__(self, format):
+    stored_format = []
+    biases = []
+    for c in format:
+      (c, bias) = _signed_types.get(c, (c, 0))
+      stored_format.append(c)
+      biases.append(bias)
+    self._struct = struct.Struct('>' + ''.join(stored_format))
+    self.size = self._struct.size
+
+    # The bias of each field, or None if there are no signed fields:
+    if [bias for bias in biases if bias]:
+      self._biases = biases
+    else:
+      self._biases = None
+
+  def pack(self, *fields):
+    """Return a record containing FIELDS."""
+
+    if self._biases is not None:
+      fields = [
+          (field + bias if bias else field)
+          for (field, bias) in zip(fields, self._biases)
+          ]
+    return self._struct.pack(*fields)
+
+  def _unbias(self, fields):
+    return tuple([
+        (field - bias if bias else field)
+        for (field, bias) in zip(fields, self._biases)
+        ])
+
+  def unpack(self, record):
+    """Return the tuple of fields contained in string RECORD."""
+
+    if self._biases is None:
+      return self._struct.unpack(record)
+    else:
+      return self._unbias(self._struct.unpack(record))
+
+  def unpack_from(self, buffer, offset=0):
+    """Return the fields of the record at OFFSET within BUFFER."""
+
+    if self._biases is None:
+      return self._struct.unpack_from(buffer, offset)
+    else:
+      return self._unbias(self._struct.unpack_from(buffer, offset))
+
+
+class RecordFileWriter(object):
+  """Write records in a RecordFormat to a new file."""
+
+  def __init__(self, filename, format):
+    self.format = format
+    self.f = open(filename, 'wb')
+
+  def write(self, *fields):
+    self.f.write(self.format.pack(*fields))
+
+  def close(self):
+    self.f.close()
+    self.f = None
+
+
+class RecordFileReader(object):
+  """Read the records of a file written in a RecordFormat.
+
+  The file is memory-mapped, so that random access is cheap.  Records
+  are identified by their index within the file."""
+
+  def __init__(self, filename, format):
+    self.format = format
+    self.f = open(filename, 'rb')
+    size = os.fstat(self.f.fileno()).st_size
+    if size % format.size:
+      raise ValueError(
+          'Size of %r is not a multiple of the record size' % (filename,)
+          )
+    self._len = size // format.size
+    if size:
+      self._mmap = mmap.mmap(self.f.fileno(), size, access=mmap.ACCESS_READ)
+    else:
+      # Empty files cannot be memory-mapped:
+      self._mmap = ''
+
+  def __len__(self):
+    return self._len
+
+  def __getitem__(self, index):
+    """Return the fields of the record number INDEX as a tuple."""
+
+    if not 0 <= index < self._len:
+      raise IndexError(index)
+    return self.format.unpack_from(self._mmap, index * self.format.size)
+
+  def iter_from(self, index):
+    """Generate the fields of each record, starting with number INDEX."""
+
+    unpack_from = self.format.unpack_from
+    size = self.format.size
+    for offset in xrange(index * size, self._len * size, size):
+      yield unpack_from(self._mmap, offset)
+
+  def __iter__(self):
+    return self.iter_from(0)
+
+  def close(self):
+    if self._mmap:
+      self._mmap.close()
+    self._mmap = None
+    self.f.close()
+    self.f = None
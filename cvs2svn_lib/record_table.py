@@ -38,10 +38,13 @@ import types
 import struct
 import mmap
 
+from cvs2svn_lib import counters
 from cvs2svn_lib.common import DB_OPEN_READ
 from cvs2svn_lib.common import DB_OPEN_WRITE
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.memory_governor import ManagedCache
+from cvs2svn_lib.memory_governor import memory_governor
 
 
 # A unique value that can be used to stand for "unset" without
@@ -218,16 +221,23 @@ class AbstractRecordTable:
         pass
 
 
-class RecordTable(AbstractRecordTable):
+class RecordTable(AbstractRecordTable, ManagedCache):
   # The approximate amount of memory that should be used for the cache
-  # for each instance of this class:
+  # for each instance of this class, unless the memory governor
+  # chooses the size:
   CACHE_MEMORY = 4 * 1024 * 1024
 
   # Empirically, each entry in the cache table has an overhead of
   # about 96 bytes on a 32-bit computer.
   CACHE_OVERHEAD_PER_ENTRY = 96
 
-  def __init__(self, filename, mode, packer, cache_memory=CACHE_MEMORY):
+  def __init__(self, filename, mode, packer, cache_memory=None):
+    """Open a RecordTable.
+
+    If CACHE_MEMORY is specified, it is the number of bytes that the
+    cache may use.  Otherwise, the cache is sized by the memory
+    governor if there is a memory limit, or else uses CACHE_MEMORY."""
+
     AbstractRecordTable.__init__(self, filename, mode, packer)
     if self.mode == DB_OPEN_NEW:
       self.f = open(self.filename, 'wb+')
@@ -237,12 +247,6 @@ class RecordTable(AbstractRecordTable):
       self.f = open(self.filename, 'rb')
     else:
       raise RuntimeError('Invalid mode %r' % self.mode)
-    self.cache_memory = cache_memory
-
-    # Number of items that can be stored in the write cache.
-    self._max_memory_cache = (
-        self.cache_memory
-        / (self.CACHE_OVERHEAD_PER_ENTRY + self._record_len))
 
     # Read and write cache; a map {i : (dirty, s)}, where i is an
     # index, dirty indicates whether the value has to be written to
@@ -257,8 +261,38 @@ class RecordTable(AbstractRecordTable):
     # The index just beyond the last record ever written to disk:
     self._limit_written = self._limit
 
+    if cache_memory is None:
+      self.set_cache_memory(self.CACHE_MEMORY)
+      self._managed = memory_governor.register(self)
+    else:
+      self.set_cache_memory(cache_memory)
+      self._managed = False
+
+  def set_cache_memory(self, cache_memory):
+    self.cache_memory = cache_memory
+
+    # Number of items that can be stored in the write cache.
+    self._max_memory_cache = max(
+        1,
+        self.cache_memory
+        // (self.CACHE_OVERHEAD_PER_ENTRY + self._record_len)
+        )
+
+  def _cache_full(self):
+    """Flush the cache if it has reached its maximum size."""
+
+    if len(self._cache) >= self._max_memory_cache:
+      if self._managed:
+        # The cache might be allowed to grow:
+        memory_governor.cache_full(self)
+        if len(self._cache) < self._max_memory_cache:
+          return
+      self.flush()
+
   def flush(self):
     logger.debug('Flushing cache for %s' % (self,))
+    if counters.enabled:
+      counters.add('RecordTable flushes')
 
     pairs = [(i, s) for (i, (dirty, s)) in self._cache.items() if dirty]
 
@@ -294,29 +328,36 @@ class RecordTable(AbstractRecordTable):
     if i < 0:
       raise KeyError()
     self._cache[i] = (True, s)
-    if len(self._cache) >= self._max_memory_cache:
-      self.flush()
+    self._cache_full()
     self._limit = max(self._limit, i + 1)
 
   def _get_packed_record(self, i):
     try:
-      return self._cache[i][1]
+      s = self._cache[i][1]
     except KeyError:
       if not 0 <= i < self._limit_written:
         raise KeyError(i)
+      self.cache_misses += 1
+      if counters.enabled:
+        counters.add('RecordTable cache misses')
       self.f.seek(i * self._record_len)
       s = self.f.read(self._record_len)
       self._cache[i] = (False, s)
-      if len(self._cache) >= self._max_memory_cache:
-        self.flush()
+      self._cache_full()
 
       return s
+    else:
+      self.cache_hits += 1
+      return s
 
   def close(self):
     self.flush()
     self._cache = None
     self.f.close()
     self.f = None
+    if self._managed:
+      memory_governor.unregister(self)
+      self._managed = False
 
 
 class MmapRecordTable(AbstractRecordTable):
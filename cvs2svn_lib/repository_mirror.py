@@ -37,6 +37,15 @@ parent node needs to be modified, and so on recursively to the root
 node of the file tree.  This data structure allows cheap deep copies,
 which is useful for tagging and branching.
 
+Copying a node's whole map would be expensive for directories with
+tens of thousands of entries, which are common in flat CVS modules.
+Therefore the entries of large directories are stored as a
+_FragmentedEntries instance, which splits the map into hash buckets
+("fragments") that are shared between the old and the new version of
+the node.  Modifying one entry only requires the affected fragment to
+be copied, and only fragments that were modified have to be written to
+the database again.
+
 The class must also be able to find the root directory node
 corresponding to a particular (revnum, lod).  This is done by keeping
 an LODHistory instance for each LOD, which can determine the root
@@ -135,6 +144,7 @@ Probably the semantics should be changed.
 import bisect
 
 from cvs2svn_lib import config
+from cvs2svn_lib import counters
 from cvs2svn_lib.common import DB_OPEN_NEW
 from cvs2svn_lib.common import InternalError
 from cvs2svn_lib.log import logger
@@ -145,6 +155,8 @@ from cvs2svn_lib.key_generator import KeyGenerator
 from cvs2svn_lib.artifact_manager import artifact_manager
 from cvs2svn_lib.serializer import MarshalSerializer
 from cvs2svn_lib.indexed_database import IndexedDatabase
+from cvs2svn_lib.memory_governor import ManagedCache
+from cvs2svn_lib.memory_governor import memory_governor
 
 
 class RepositoryMirrorError(Exception):
@@ -185,6 +197,159 @@ class CopyFromCurrentNodeError(RepositoryMirrorError):
   pass
 
 
+class _FragmentedEntries(object):
+  """A map {CVSPath : node_id} that is split into hash buckets.
+
+  This class is used instead of a dict for the entries of large
+  directories.  The entries are distributed among a power-of-two
+  number of fragments based on the low-order bits of cvs_path.id.
+  Each fragment is a dict {CVSPath : node_id}.
+
+  Fragments that have already been written to the _NodeDatabase are
+  shared with other instances (and with the _NodeDatabase's cache) and
+  are therefore copied before they are modified.  Thus copying an
+  instance costs O(number of fragments) rather than O(number of
+  entries), and a modification costs O(size of one fragment).
+
+  Members:
+
+    _fragments -- (list of dict) the fragments.
+
+    _fragment_ids -- (list of (int or None)) the id under which the
+        corresponding fragment is stored in the _NodeDatabase, or None
+        if the fragment was created or modified in the current
+        revision and has not been stored yet.
+
+    _len -- (int) the total number of entries."""
+
+  # Directories with at least this many entries are fragmented:
+  MIN_ENTRIES = 1024
+
+  # The number of entries per fragment that is aimed for when a map is
+  # fragmented:
+  FRAGMENT_SIZE = 256
+
+  __slots__ = ['_fragments', '_fragment_ids', '_len']
+
+  def __init__(self, fragments, fragment_ids):
+    self._fragments = fragments
+    self._fragment_ids = fragment_ids
+    self._len = sum([len(fragment) for fragment in fragments])
+
+  @staticmethod
+  def from_items(items, size):
+    """Return a new instance holding ITEMS, which has SIZE entries.
+
+    The number of fragments is chosen based on SIZE.  All of the
+    fragments of the new instance are unstored."""
+
+    num_fragments = 1
+    while num_fragments * _FragmentedEntries.FRAGMENT_SIZE < size:
+      num_fragments *= 2
+
+    fragments = [{} for i in range(num_fragments)]
+    mask = num_fragments - 1
+    for (cvs_path, value) in items:
+      fragments[cvs_path.id & mask][cvs_path] = value
+
+    return _FragmentedEntries(fragments, [None] * num_fragments)
+
+  def _get_fragment(self, cvs_path):
+    return self._fragments[cvs_path.id & (len(self._fragments) - 1)]
+
+  def _get_writable_fragment(self, cvs_path):
+    """Return the fragment for CVS_PATH, copying it first if it is shared."""
+
+    i = cvs_path.id & (len(self._fragments) - 1)
+    if self._fragment_ids[i] is not None:
+      self._fragments[i] = self._fragments[i].copy()
+      self._fragment_ids[i] = None
+    return self._fragments[i]
+
+  def is_overfull(self):
+    """Return True iff the fragments have grown too large on average."""
+
+    return self._len > 4 * self.FRAGMENT_SIZE * len(self._fragments)
+
+  def is_underfull(self):
+    """Return True iff the fragments have shrunk too small on average."""
+
+    return (
+        len(self._fragments) > 1
+        and 4 * self._len < self.FRAGMENT_SIZE * len(self._fragments)
+        )
+
+  def __len__(self):
+    return self._len
+
+  def __contains__(self, cvs_path):
+    return cvs_path in self._get_fragment(cvs_path)
+
+  def __getitem__(self, cvs_path):
+    return self._get_fragment(cvs_path)[cvs_path]
+
+  def __setitem__(self, cvs_path, value):
+    fragment = self._get_writable_fragment(cvs_path)
+    if cvs_path not in fragment:
+      self._len += 1
+    fragment[cvs_path] = value
+
+  def __delitem__(self, cvs_path):
+    if cvs_path not in self._get_fragment(cvs_path):
+      raise KeyError(cvs_path)
+    del self._get_writable_fragment(cvs_path)[cvs_path]
+    self._len -= 1
+
+  def __iter__(self):
+    for fragment in self._fragments:
+      for cvs_path in fragment:
+        yield cvs_path
+
+  def iteritems(self):
+    for fragment in self._fragments:
+      for item in fragment.iteritems():
+        yield item
+
+  def items(self):
+    return list(self.iteritems())
+
+  def copy(self):
+    """Return a copy of this map that shares all stored fragments."""
+
+    fragments = []
+    for (fragment, fragment_id) in zip(self._fragments, self._fragment_ids):
+      if fragment_id is None:
+        fragment = fragment.copy()
+      fragments.append(fragment)
+
+    return _FragmentedEntries(fragments, self._fragment_ids[:])
+
+
+def _copy_entries(entries):
+  """Return a copy of ENTRIES that may be modified in the current revision.
+
+  ENTRIES is a dict or a _FragmentedEntries instance.  Small maps are
+  copied as dicts.  Maps that have reached
+  _FragmentedEntries.MIN_ENTRIES are converted into (or copied as)
+  _FragmentedEntries instances, which are refragmented if their
+  fragments have grown too large or shrunk too small.  They are only
+  converted back into dicts when they have shrunk to half of
+  _FragmentedEntries.MIN_ENTRIES, so that a directory whose size
+  hovers around the threshold is not converted back and forth."""
+
+  if isinstance(entries, _FragmentedEntries):
+    if len(entries) < _FragmentedEntries.MIN_ENTRIES // 2:
+      return dict(entries.iteritems())
+    elif entries.is_overfull() or entries.is_underfull():
+      return _FragmentedEntries.from_items(entries.iteritems(), len(entries))
+    else:
+      return entries.copy()
+  elif len(entries) >= _FragmentedEntries.MIN_ENTRIES:
+    return _FragmentedEntries.from_items(entries.iteritems(), len(entries))
+  else:
+    return entries.copy()
+
+
 class MirrorDirectory(object):
   """Represent a node within the RepositoryMirror.
 
@@ -202,7 +367,8 @@ class MirrorDirectory(object):
 
     # The entries within this directory, stored as a map {CVSPath :
     # node_id}.  The node_ids are integers for CVSDirectories, None
-    # for CVSFiles:
+    # for CVSFiles.  The map is a dict or (for large directories) a
+    # _FragmentedEntries instance:
     self._entries = entries
 
   def __getitem__(self, cvs_path):
@@ -446,7 +612,7 @@ class _CurrentMirrorReadOnlyLODDirectory(
     self.id = self.repo._key_generator.gen_id()
     self.repo._new_nodes[self.id] = self
     self.repo._get_lod_history(self.lod).update(self.repo._youngest, self.id)
-    self._entries = self._entries.copy()
+    self._entries = _copy_entries(self._entries)
 
 
 class _CurrentMirrorWritableLODDirectory(
@@ -479,7 +645,7 @@ class _CurrentMirrorReadOnlySubdirectory(
     self.id = self.repo._key_generator.gen_id()
     self.repo._new_nodes[self.id] = self
     self.parent_mirror_dir._set_entry(self.cvs_path, self)
-    self._entries = self._entries.copy()
+    self._entries = _copy_entries(self._entries)
 
 
 class _CurrentMirrorWritableSubdirectory(
@@ -585,16 +751,22 @@ class LODHistory(object):
       self.ids.append(id)
 
 
-class _NodeDatabase(object):
+class _NodeDatabase(ManagedCache):
   """A database storing all of the directory nodes.
 
   The nodes are written in groups every time write_new_nodes() is
   called.  To the database is written a dictionary {node_id :
   [(cvs_path.id, node_id),...]}, where the keys are the node_ids of
-  the new nodes.  When a node is read, its whole group is read and
+  the new nodes.  A node whose entries are a _FragmentedEntries
+  instance is instead written as a tuple (fragment_id,...), and each
+  fragment that has not been stored before is written to the same
+  dictionary as {fragment_id : [(cvs_path.id, node_id),...]}.
+  Fragment ids are allocated from the same KeyGenerator as node ids.
+  When a node is read, its whole group is read and
   cached under the assumption that the other nodes in the group are
   likely to be needed soon.  The cache is retained across revisions
-  and cleared when _cache_max_size is exceeded.
+  and cleared when _cache_max_size is exceeded.  If there is a memory
+  limit, _cache_max_size is chosen by the memory governor.
 
   The dictionaries for nodes that have been read from the database
   during the current revision are cached by node_id in the _cache
@@ -612,8 +784,14 @@ class _NodeDatabase(object):
   # But the cache will never be limited to less than this number:
   MIN_CACHE_LIMIT = 5000
 
-  def __init__(self):
+  # The approximate number of bytes used by each entry in the cache,
+  # used to convert memory allotments into numbers of entries:
+  CACHE_MEMORY_PER_ENTRY = 1000
+
+  def __init__(self, key_generator):
     self.cvs_path_db = Ctx()._cvs_path_db
+    # The KeyGenerator used to allocate ids for new fragments:
+    self._key_generator = key_generator
     self.db = IndexedDatabase(
         artifact_manager.get_temp_file(config.MIRROR_NODES_STORE),
         artifact_manager.get_temp_file(config.MIRROR_NODES_INDEX_TABLE),
@@ -624,7 +802,8 @@ class _NodeDatabase(object):
     # write_new_nodes():
     self._max_node_ids = [0]
 
-    # A map {node_id : {cvs_path : node_id}}:
+    # A map {node_id : {cvs_path : node_id}}.  The values for
+    # fragmented nodes are _FragmentedEntries instances:
     self._cache = {}
 
     # The number of directories in the repository:
@@ -638,6 +817,16 @@ class _NodeDatabase(object):
         int(self.CACHE_SIZE_MULTIPLIER * num_dirs),
         self.MIN_CACHE_LIMIT,
         )
+    self._managed = memory_governor.register(self)
+
+  def get_cache_name(self):
+    return 'the node cache'
+
+  def set_cache_memory(self, cache_memory):
+    self.cache_memory = cache_memory
+    self._cache_max_size = max(
+        1, cache_memory // self.CACHE_MEMORY_PER_ENTRY
+        )
 
   def _load(self, items):
     retval = {}
@@ -660,10 +849,26 @@ class _NodeDatabase(object):
     try:
       items = self._cache[id]
     except KeyError:
+      self.cache_misses += 1
+      if counters.enabled:
+        counters.add('node database cache misses')
       index = self._determine_index(id)
+      fragmented = []
       for (node_id, items) in self.db[index].items():
-        self._cache[node_id] = self._load(items)
+        if isinstance(items, tuple):
+          # The fragments might be stored in this group, so resolve
+          # them after all plain nodes have been loaded:
+          fragmented.append((node_id, items))
+        else:
+          self._cache[node_id] = self._load(items)
+      for (node_id, fragment_ids) in fragmented:
+        self._cache[node_id] = _FragmentedEntries(
+            [self[fragment_id] for fragment_id in fragment_ids],
+            list(fragment_ids),
+            )
       items = self._cache[id]
+    else:
+      self.cache_hits += 1
 
     return items
 
@@ -672,6 +877,10 @@ class _NodeDatabase(object):
 
     NODES is an iterable of writable CurrentMirrorDirectory instances."""
 
+    if len(self._cache) > self._cache_max_size and self._managed:
+      # The cache might be allowed to grow:
+      memory_governor.cache_full(self)
+
     if len(self._cache) > self._cache_max_size:
       # The size of the cache has exceeded the threshold.  Discard the
       # old cache values (but still store the new nodes into the
@@ -683,8 +892,21 @@ class _NodeDatabase(object):
     max_node_id = 0
     for node in nodes:
       max_node_id = max(max_node_id, node.id)
-      data[node.id] = self._dump(node._entries)
-      self._cache[node.id] = node._entries
+      entries = node._entries
+      if isinstance(entries, _FragmentedEntries):
+        # Only store the fragments that were changed in this revision:
+        fragment_ids = entries._fragment_ids
+        for (i, fragment) in enumerate(entries._fragments):
+          if fragment_ids[i] is None:
+            fragment_id = self._key_generator.gen_id()
+            data[fragment_id] = self._dump(fragment)
+            self._cache[fragment_id] = fragment
+            fragment_ids[i] = fragment_id
+            max_node_id = max(max_node_id, fragment_id)
+        data[node.id] = tuple(fragment_ids)
+      else:
+        data[node.id] = self._dump(entries)
+      self._cache[node.id] = entries
 
     self.db[len(self._max_node_ids)] = data
 
@@ -698,6 +920,9 @@ class _NodeDatabase(object):
     self._cache.clear()
     self.db.close()
     self.db = None
+    if self._managed:
+      memory_governor.unregister(self)
+      self._managed = False
 
 
 class RepositoryMirror:
@@ -747,7 +972,7 @@ class RepositoryMirror:
     # This corresponds to the 'nodes' table in a Subversion fs.  (We
     # don't need a 'representations' or 'strings' table because we
     # only track file existence, not file contents.)
-    self._node_db = _NodeDatabase()
+    self._node_db = _NodeDatabase(self._key_generator)
 
     # Start at revision 0 without a root node.
     self._youngest = 0
@@ -0,0 +1,190 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""Measure the resources used by a pass.
+
+ResourceMonitor records the CPU time, peak resident set size, I/O,
+and peak temporary-directory size of a pass.  The CPU time includes
+that of any child processes that the pass waited for (e.g., the
+worker processes started for --jobs).  The other measurements rely
+on the /proc filesystem; where it is not available, they are
+omitted or (for the peak RSS) replaced by the peak of the whole
+process."""
+
+
+import os
+import threading
+
+try:
+  import resource
+except ImportError:
+  # E.g., Windows:
+  resource = None
+
+
+# The number of seconds between measurements of the size of the
+# temporary directory:
+sample_interval = 1.0
+
+
+def _get_rusage():
+  """Return (user, system, child_maxrss) for us and our children.
+
+  user and system are the CPU times in seconds; child_maxrss is the
+  peak RSS in bytes of the largest child process waited for so far."""
+
+  if resource is None:
+    (user, system, child_user, child_system) = os.times()[:4]
+    return (user + child_user, system + child_system, None)
+
+  usage = resource.getrusage(resource.RUSAGE_SELF)
+  child_usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+  return (
+      usage.ru_utime + child_usage.ru_utime,
+      usage.ru_stime + child_usage.ru_stime,
+      child_usage.ru_maxrss * 1024,
+      )
+
+
+def _read_proc_io():
+  """Return (bytes_read, bytes_written) from /proc/self/io, or None.
+
+  The counts include data served from the page cache."""
+
+  try:
+    f = open('/proc/self/io')
+    try:
+      values = {}
+      for line in f:
+        (name, value) = line.split(':')
+        values[name] = int(value)
+    finally:
+      f.close()
+    return (values['rchar'], values['wchar'],)
+  except (IOError, ValueError, KeyError):
+    return None
+
+
+def _reset_peak_rss():
+  """Reset the peak RSS of this process, if possible.
+
+  Return True iff the reset worked (Linux 4.0 and later)."""
+
+  try:
+    f = open('/proc/self/clear_refs', 'w')
+    try:
+      f.write('5')
+    finally:
+      f.close()
+    return True
+  except IOError:
+    return False
+
+
+def _get_peak_rss():
+  """Return the peak RSS of this process in bytes, or None."""
+
+  try:
+    f = open('/proc/self/status')
+    try:
+      for line in f:
+        if line.startswith('VmHWM:'):
+          return int(line.split()[1]) * 1024
+    finally:
+      f.close()
+  except (IOError, ValueError):
+    pass
+
+  if resource is not None:
+    # On Linux, ru_maxrss is in kilobytes:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+  else:
+    return None
+
+
+def get_directory_size(path):
+  """Return the total size of the files under PATH in bytes."""
+
+  size = 0
+  for (dirpath, dirnames, filenames) in os.walk(path):
+    for filename in filenames:
+      try:
+        size += os.path.getsize(os.path.join(dirpath, filename))
+      except OSError:
+        # The file was deleted after the directory was listed:
+        pass
+  return size
+
+
+class ResourceMonitor(object):
+  """Measure the resources used between calls to start() and stop().
+
+  TMPDIR is the temporary directory, whose size is sampled by a
+  background thread every sample_interval seconds."""
+
+  def __init__(self, tmpdir):
+    self.tmpdir = tmpdir
+
+  def _sample_tmpdir_size(self):
+    size = get_directory_size(self.tmpdir)
+    if size > self._peak_tmpdir_size:
+      self._peak_tmpdir_size = size
+
+  def _sample_tmpdir(self):
+    while not self._stopped.isSet():
+      self._sample_tmpdir_size()
+      self._stopped.wait(sample_interval)
+
+  def start(self):
+    (self._user, self._system, self._child_maxrss) = _get_rusage()
+    self._io = _read_proc_io()
+    _reset_peak_rss()
+    self._peak_tmpdir_size = 0
+    self._stopped = threading.Event()
+    self._thread = threading.Thread(target=self._sample_tmpdir)
+    self._thread.setDaemon(True)
+    self._thread.start()
+
+  def stop(self):
+    """Stop measuring and return a map {resource : value}.
+
+    The keys are 'user_cpu' and 'system_cpu' (in seconds), and
+    'peak_rss', 'bytes_read', 'bytes_written', and 'peak_tmpdir_size'
+    (in bytes).  Measurements that could not be made are omitted."""
+
+    self._stopped.set()
+    self._thread.join()
+    self._sample_tmpdir_size()
+
+    resources = {}
+    (user, system, child_maxrss) = _get_rusage()
+    resources['user_cpu'] = user - self._user
+    resources['system_cpu'] = system - self._system
+
+    peak_rss = _get_peak_rss()
+    if child_maxrss is not None and child_maxrss > self._child_maxrss:
+      # A child process that finished during the pass had this peak:
+      peak_rss = max(peak_rss, child_maxrss)
+    if peak_rss is not None:
+      resources['peak_rss'] = peak_rss
+
+    io = _read_proc_io()
+    if io is not None and self._io is not None:
+      resources['bytes_read'] = io[0] - self._io[0]
+      resources['bytes_written'] = io[1] - self._io[1]
+
+    resources['peak_tmpdir_size'] = self._peak_tmpdir_size
+    return resources
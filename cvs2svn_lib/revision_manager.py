@@ -42,6 +42,11 @@ class RevisionCollector(object):
 
     pass
 
+  def get_external_outputs(self):
+    """Return the names of the files written outside of the tmpdir."""
+
+    return []
+
   def start(self):
     """Data will soon start being collected.
 
@@ -35,6 +35,10 @@ from cvs2svn_lib.log import logger
 from cvs2svn_lib.context import Ctx
 from cvs2svn_lib.man_writer import ManOption
 from cvs2svn_lib.pass_manager import InvalidPassError
+from cvs2svn_lib.pass_fingerprint import get_files_digest
+from cvs2svn_lib.pass_fingerprint import register_config_file
+from cvs2svn_lib.pass_fingerprint import get_config_files
+from cvs2svn_lib import sampling_profiler
 from cvs2svn_lib.revision_manager import NullRevisionCollector
 from cvs2svn_lib.rcs_revision_manager import RCSRevisionReader
 from cvs2svn_lib.cvs_revision_manager import CVSRevisionReader
@@ -158,6 +162,57 @@ SYMBOL_OPTIONS = [
     '--no-cross-branch-commits',
     ]
 
+# Options that cannot affect the output of any pass:
+PASS_INDEPENDENT_OPTIONS = [
+    '--pass',
+    '--passes',
+    '-p',
+    '--no-reuse-passes',
+    '--tmpdir',
+    '--jobs',
+    '--memory-limit',
+    '--skip-cleanup',
+    '--verbose',
+    '-v',
+    '--quiet',
+    '-q',
+    '--write-pass-report',
+    '--count-operations',
+    '--write-trace',
+    '--profile',
+    '--profile-pass',
+    '--profile-dir',
+    '--sample-profile',
+    '--sample-interval',
+    ]
+
+# Options that only determine where and how the output is written.
+# They can only affect the passes that list them in their
+# output_options (see Pass):
+OUTPUT_OPTIONS = [
+    '--svnrepos',
+    '-s',
+    '--existing-svnrepos',
+    '--fs-type',
+    '--bdb-txn-nosync',
+    '--create-option',
+    '--svnadmin',
+    '--dumpfile',
+    '--blobfile',
+    '--hgrepos',
+    '--dry-run',
+    '--dump-only',
+    '--create',
+    ]
+
+# Options whose values are the names of files that are read:
+INPUT_FILE_OPTIONS = [
+    '--options',
+    '--symbol-hints',
+    '--mime-types',
+    '--auto-props',
+    ]
+
 class SymbolOptionsWithTrunkOnlyException(IncompatibleOptionsException):
   def __init__(self):
     IncompatibleOptionsException.__init__(
@@ -216,6 +271,17 @@ class RunOptions(object):
     self.start_pass = 1
     self.end_pass = self.pass_manager.num_passes
     self.profiling = False
+    # The numbers of the passes to profile individually, and the
+    # directory to write their profiles to:
+    self.profile_passes = []
+    self.profile_dir = '.'
+    # The file to write the samples of the sampling profiler to (or
+    # None to not run it), and the sampling interval in seconds:
+    self.sample_profile_filename = None
+    self.sample_interval = 0.01
+
+    # The names of the options files that were read:
+    self.options_files = []
 
     self.projects = []
 
@@ -714,6 +780,37 @@ class RunOptions(object):
             ) % (tempfile.gettempdir(),),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--jobs', type='int',
+        action='store',
+        help=(
+            'number of worker processes to use in the passes that can '
+            'use more than one, and number of independent passes to run '
+            'at the same time (default 1)'
+            ),
+        man_help=(
+            'Use up to \\fIn\\fR worker processes in the passes that can '
+            'do their work in parallel, and run up to \\fIn\\fR passes '
+            'that do not depend on each other at the same time.  The '
+            'default is 1.'
+            ),
+        metavar='N',
+        ))
+    group.add_option(ManOption(
+        '--memory-limit', type='int',
+        action='callback', callback=self.callback_memory_limit,
+        help=(
+            'approximate number of megabytes of memory to divide among '
+            'the caches and sorts (default: use fixed cache sizes)'
+            ),
+        man_help=(
+            'Divide approximately \\fImb\\fR megabytes of memory among '
+            'the caches and sorts, giving more to the caches that are '
+            'used most effectively.  By default, each cache has a fixed '
+            'size.'
+            ),
+        metavar='MB',
+        ))
     self.parser.set_default('co_executable', config.CO_EXECUTABLE)
     group.add_option(IncompatibleOption(
         '--co', type='string',
@@ -771,6 +868,21 @@ class RunOptions(object):
             ),
         metavar='[START]:[END]',
         ))
+    group.add_option(ContextOption(
+        '--no-reuse-passes',
+        action='store_false', dest='reuse_passes',
+        compatible_with_option=True,
+        help=(
+            'run all passes, even those whose results in the temporary '
+            'directory are up to date'
+            ),
+        man_help=(
+            'Run all of the requested passes.  By default, a pass is '
+            'skipped if the temporary directory (see \\fB--tmpdir\\fR) '
+            'holds its results from an earlier run and neither its inputs '
+            'nor the options that affect it have changed since.'
+            ),
+        ))
 
     return group
 
@@ -834,6 +946,55 @@ class RunOptions(object):
             ),
         metavar='PATH',
         ))
+    group.add_option(ContextOption(
+        '--write-pass-report', type='string',
+        action='store', dest='pass_report_filename',
+        compatible_with_option=True,
+        help=(
+            'write the time and resources used by each pass to PATH '
+            '(as JSON)'
+            ),
+        man_help=(
+            'Write to \\fIpath\\fR a JSON report of the wall-clock time, '
+            'CPU time, peak memory use, bytes read and written, and peak '
+            'size of the temporary directory of each pass.'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(ContextOption(
+        '--count-operations',
+        action='store_true',
+        compatible_with_option=True,
+        help=(
+            'count the expensive operations (e.g., RCS deltas applied, '
+            'cache misses) of each pass and output the counts'
+            ),
+        man_help=(
+            'Count how often each pass performs expensive operations, '
+            'such as applying RCS deltas, missing in database caches, '
+            'compressing data, and breaking changeset cycles, and output '
+            'the counts with the other statistics. The counts are also '
+            'included in the report written by '
+            '\\fB--write-pass-report\\fR.'
+            ),
+        ))
+    group.add_option(ContextOption(
+        '--write-trace', type='string',
+        action='store', dest='trace_filename',
+        compatible_with_option=True,
+        help=(
+            'write a timeline of the conversion to PATH (in the Chrome '
+            'trace event format)'
+            ),
+        man_help=(
+            'Write to \\fIpath\\fR a timeline of the conversion in the '
+            'Chrome trace event format (as used by chrome://tracing and '
+            'Perfetto). It shows when each pass ran and how long '
+            'individual CVS files, sorts, changeset cycles, and commits '
+            'took.'
+            ),
+        metavar='PATH',
+        ))
     group.add_option(ContextOption(
         '--skip-cleanup',
         action='store_true',
@@ -853,11 +1014,76 @@ class RunOptions(object):
             'Profile with \'' + prof + '\' (into file \\fIcvs2svn.' + prof + '\\fR).'
             ),
         ))
+    group.add_option(ManOption(
+        '--profile-pass', type='string',
+        action='callback', callback=self.callback_profile_pass,
+        help=(
+            'profile PASS with \'cProfile\' (PASS can be a pass name or '
+            'number; this option can be specified multiple times)'
+            ),
+        man_help=(
+            'Profile pass \\fIpass\\fR with \'cProfile\', writing the '
+            'profile to \\fIpassNN-NAME.pstats\\fR in the directory '
+            'specified by \\fB--profile-dir\\fR, and output the functions '
+            'that took the most time at the end of the conversion. '
+            '\\fIpass\\fR can be specified by name or by number (see '
+            '\\fB--help-passes\\fR). This option can be specified '
+            'multiple times. The pass is run even if its results from '
+            'an earlier run are up to date.'
+            ),
+        metavar='PASS',
+        ))
+    group.add_option(ManOption(
+        '--profile-dir', type='string',
+        action='callback', callback=self.callback_profile_dir,
+        help=(
+            'write the profiles of the passes selected with '
+            '--profile-pass to PATH (default: the current directory)'
+            ),
+        man_help=(
+            'Write the profiles of the passes selected with '
+            '\\fB--profile-pass\\fR to directory \\fIpath\\fR. The '
+            'default is the current directory.'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(ManOption(
+        '--sample-profile', type='string',
+        action='callback', callback=self.callback_sample_profile,
+        help=(
+            'sample the stack periodically during the conversion and '
+            'write the samples to PATH in collapsed-stack format'
+            ),
+        man_help=(
+            'Sample the stack periodically during the whole conversion, '
+            'and write the samples to \\fIpath\\fR in the collapsed-stack '
+            'format read by flame graph tools. Each stack starts with '
+            'the name of the pass that it was sampled in. The overhead '
+            'of sampling is small even for tight loops, unlike that of '
+            '\\fB--profile\\fR.'
+            ),
+        metavar='PATH',
+        ))
+    group.add_option(ManOption(
+        '--sample-interval', type='float',
+        action='callback', callback=self.callback_sample_interval,
+        help=(
+            'take a sample every SECONDS of CPU time with '
+            '--sample-profile (default: %g)' % (self.sample_interval,)
+            ),
+        man_help=(
+            'Take a sample every \\fIseconds\\fR of CPU time with '
+            '\\fB--sample-profile\\fR. The default is %g.'
+            % (self.sample_interval,)
+            ),
+        metavar='SECONDS',
+        ))
 
     return group
 
   def callback_options(self, option, opt_str, value, parser):
     parser.values.options_file_found = True
+    self.options_files.append(value)
     self.process_options_file(value)
 
   def callback_encoding(self, option, opt_str, value, parser):
@@ -880,6 +1106,11 @@ class RunOptions(object):
     except LookupError, e:
       raise FatalError(str(e))
 
+  def callback_memory_limit(self, option, opt_str, value, parser):
+    if value <= 0:
+      raise FatalError('%s must be positive' % (opt_str,))
+    Ctx().memory_limit = value * 1024 * 1024
+
   def callback_help_passes(self, option, opt_str, value, parser):
     self.pass_manager.help_passes()
     sys.exit(0)
@@ -939,6 +1170,30 @@ class RunOptions(object):
   def callback_profile(self, option, opt_str, value, parser):
     self.profiling = True
 
+  def callback_profile_pass(self, option, opt_str, value, parser):
+    try:
+      import cProfile
+    except ImportError:
+      raise FatalError('%s requires the cProfile module.' % (opt_str,))
+    pass_number = self.pass_manager.get_pass_number(value)
+    if pass_number not in self.profile_passes:
+      self.profile_passes.append(pass_number)
+
+  def callback_profile_dir(self, option, opt_str, value, parser):
+    self.profile_dir = value
+
+  def callback_sample_profile(self, option, opt_str, value, parser):
+    if not sampling_profiler.is_supported():
+      raise FatalError(
+          '%s is not supported on this platform.' % (opt_str,)
+          )
+    self.sample_profile_filename = value
+
+  def callback_sample_interval(self, option, opt_str, value, parser):
+    if value <= 0.0:
+      raise FatalError('%s must be positive.' % (opt_str,))
+    self.sample_interval = value
+
   def callback_symbol_hints(self, option, opt_str, value, parser):
     parser.values.symbol_strategy_rules.append(SymbolHintsFileRule(value))
 
@@ -1127,13 +1382,77 @@ class RunOptions(object):
   def process_options_file(self, options_filename):
     """Read options from the file named OPTIONS_FILENAME.
 
-    Store the run options to SELF."""
+    Store the run options to SELF.  The options file and any files
+    that it execfile()s are registered via register_config_file()."""
 
     g = {
       'ctx' : Ctx(),
       'run_options' : self,
       }
-    execfile(options_filename, g)
+
+    def execfile_config(filename, globals=g, locals=None):
+      register_config_file(filename)
+      if locals is None:
+        locals = globals
+      execfile(filename, globals, locals)
+
+    g['execfile'] = execfile_config
+    execfile_config(options_filename)
+
+  def get_fingerprint_options(
+        self, irrelevant_options=[], pass_output_options=[]
+        ):
+    """Return a string describing the options that might affect a pass.
+
+    Leave out the options in PASS_INDEPENDENT_OPTIONS and
+    IRRELEVANT_OPTIONS, and the OUTPUT_OPTIONS that are not in
+    PASS_OUTPUT_OPTIONS, which cannot affect the pass.  Include the
+    contents of any options files, and the sizes and mtimes of the
+    other files named by INPUT_FILE_OPTIONS.  If an options file was
+    used, also include the sizes and mtimes of all of the files that
+    the configuration was read from (see register_config_file())."""
+
+    irrelevant_options = set(PASS_INDEPENDENT_OPTIONS + irrelevant_options)
+    irrelevant_options.update(
+        set(OUTPUT_OPTIONS) - set(pass_output_options)
+        )
+    retval = []
+    args = list(self.cmd_args)
+    while args:
+      arg = args.pop(0)
+      if arg == '--':
+        retval.extend(args)
+        break
+      name = arg.split('=', 1)[0]
+      option = self.parser.get_option(name)
+      if option is None:
+        retval.append(arg)
+        continue
+      if option.takes_value() and arg == name and args:
+        value = args.pop(0)
+      elif option.takes_value() and arg != name:
+        value = arg[len(name) + 1:]
+      else:
+        value = None
+      if name in irrelevant_options:
+        continue
+      retval.append(name)
+      if value is not None:
+        retval.append(value)
+        if name in INPUT_FILE_OPTIONS and name != '--options':
+          retval.append(get_files_digest([value]))
+
+    for filename in self.options_files:
+      retval.append(open(filename).read())
+
+    # Any pass might depend on the files that an options file refers
+    # to (e.g., a symbol hints file or a file that it execfile()s).
+    # Without --options, they are all named by INPUT_FILE_OPTIONS,
+    # which have been handled above:
+    if self.options_files:
+      retval.append(get_files_digest(get_config_files()))
+
+    return '\0'.join(retval)
 
   def usage(self):
     self.parser.print_help()
@@ -0,0 +1,132 @@
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2000-2009 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""A statistical profiler that samples the Python stack periodically.
+
+Unlike cProfile, which records every function call and thereby slows
+down tight loops considerably, SamplingProfiler only looks at the
+stack when a SIGPROF timer fires (i.e., after every INTERVAL seconds
+of CPU time).  Its overhead is therefore small and does not depend on
+how many function calls are made.
+
+Each sample is attributed to the pass that was running when it was
+taken.  The samples are written in the 'collapsed stack' format used
+by flame graph tools (e.g., flamegraph.pl or speedscope): one line
+per distinct stack, with the frames separated by semicolons, followed
+by the number of samples with that stack.  The first frame of each
+stack is the name of the pass."""
+
+
+import os
+import signal
+
+
+# The frame that is used for samples taken outside of any pass:
+NO_PASS = 'cvs2svn'
+
+
+def is_supported():
+  """Return True iff SamplingProfiler works on this platform."""
+
+  return hasattr(signal, 'setitimer') and hasattr(signal, 'SIGPROF')
+
+
+def _format_frame(code):
+  return '%s (%s:%d)' % (
+      code.co_name, os.path.basename(code.co_filename), code.co_firstlineno,
+      )
+
+
+class SamplingProfiler(object):
+  """Sample the stack every INTERVAL seconds of CPU time.
+
+  Set pass_name to the name of the pass that is being run, so that
+  the samples are attributed to it."""
+
+  def __init__(self, interval):
+    self.interval = interval
+    self.pass_name = None
+    # A map {(pass_name, (code, ...)) : count} of the samples taken in
+    # this process.  The code objects are listed outermost first:
+    self._samples = {}
+    # A map {collapsed_stack : count} of the samples read from files:
+    self._collapsed_stacks = {}
+
+  def _handle_signal(self, signum, frame):
+    codes = []
+    while frame is not None:
+      codes.append(frame.f_code)
+      frame = frame.f_back
+    codes.reverse()
+    key = (self.pass_name, tuple(codes))
+    self._samples[key] = self._samples.get(key, 0) + 1
+
+  def start(self):
+    signal.signal(signal.SIGPROF, self._handle_signal)
+    # Restart system calls that are interrupted by the timer, rather
+    # than making them fail with EINTR:
+    signal.siginterrupt(signal.SIGPROF, False)
+    signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+
+  def stop(self):
+    signal.setitimer(signal.ITIMER_PROF, 0)
+    # A signal might still be pending, and the default action for
+    # SIGPROF is to terminate the process:
+    signal.signal(signal.SIGPROF, signal.SIG_IGN)
+
+  def reset(self):
+    """Discard the samples taken so far (e.g., in a forked child)."""
+
+    self._samples = {}
+    self._collapsed_stacks = {}
+
+  def get_collapsed_stacks(self):
+    """Return a map {collapsed_stack : count} of all of the samples."""
+
+    collapsed_stacks = self._collapsed_stacks.copy()
+    for ((pass_name, codes), count) in self._samples.iteritems():
+      frames = [pass_name or NO_PASS]
+      frames.extend([_format_frame(code) for code in codes])
+      collapsed_stack = ';'.join(frames)
+      collapsed_stacks[collapsed_stack] = (
+          collapsed_stacks.get(collapsed_stack, 0) + count
+          )
+    return collapsed_stacks
+
+  def write(self, filename):
+    """Write all of the samples to FILENAME in collapsed-stack format."""
+
+    f = open(filename, 'w')
+    try:
+      for (collapsed_stack, count) in sorted(
+            self.get_collapsed_stacks().items()
+            ):
+        f.write('%s %d\n' % (collapsed_stack, count,))
+    finally:
+      f.close()
+
+  def read(self, filename):
+    """Add the samples from FILENAME, which was written by write()."""
+
+    f = open(filename)
+    try:
+      for line in f:
+        (collapsed_stack, count) = line.rstrip('\n').rsplit(' ', 1)
+        self._collapsed_stacks[collapsed_stack] = (
+            self._collapsed_stacks.get(collapsed_stack, 0) + int(count)
+            )
+    finally:
+      f.close()
@@ -21,6 +21,9 @@ import cStringIO
 import marshal
 import cPickle
 import zlib
+import time
+
+from cvs2svn_lib import counters
 
 
 class Serializer:
@@ -131,16 +134,36 @@ class CompressingSerializer(Serializer):
 
     self.wrapee = wrapee
 
+  def _compress(self, s):
+    if counters.enabled:
+      start = time.time()
+      compressed = zlib.compress(s, 9)
+      counters.add_time('compression time', time.time() - start)
+      counters.add('bytes compressed', len(s))
+      return compressed
+    else:
+      return zlib.compress(s, 9)
+
+  def _decompress(self, s):
+    if counters.enabled:
+      start = time.time()
+      decompressed = zlib.decompress(s)
+      counters.add_time('decompression time', time.time() - start)
+      counters.add('bytes decompressed', len(decompressed))
+      return decompressed
+    else:
+      return zlib.decompress(s)
+
   def dumpf(self, f, object):
-    marshal.dump(zlib.compress(self.wrapee.dumps(object), 9), f)
+    marshal.dump(self._compress(self.wrapee.dumps(object)), f)
 
   def dumps(self, object):
-    return marshal.dumps(zlib.compress(self.wrapee.dumps(object), 9))
+    return marshal.dumps(self._compress(self.wrapee.dumps(object)))
 
   def loadf(self, f):
-    return self.wrapee.loads(zlib.decompress(marshal.load(f)))
+    return self.wrapee.loads(self._decompress(marshal.load(f)))
 
   def loads(self, s):
-    return self.wrapee.loads(zlib.decompress(marshal.loads(s)))
+    return self.wrapee.loads(self._decompress(marshal.loads(s)))
 
 
@@ -25,19 +25,59 @@ It was apparently submitted by Nicolas Lehuen on Tue, 17 Jan 2006.
 According to the terms of service of that website, the code is usable
 under the MIT license.
 
+sort_file() can optionally use several worker processes.  The workers
+sort separate parts of the input file into runs.  Then each worker
+merges the lines of all runs whose keys fall within one range of
+keys, and the parent process concatenates the results.  Lines with
+equal keys always fall into the same range, and the runs are merged
+in the order of the input, with ties broken in favor of the earlier
+run.  So the result is a stable sort of the input, exactly as when
+using a single process.  When using worker processes, the sort keys
+must be picklable.  Without the multiprocessing module (Python < 2.6),
+the sort is always done in a single process.
+
 """
 
 
 import os
 import shutil
 import heapq
+import bisect
 import itertools
 import tempfile
+import struct
+import zlib
+import cStringIO
+
+try:
+  import multiprocessing
+except ImportError:
+  # Python < 2.6:
+  multiprocessing = None
+
+from cvs2svn_lib import event_tracer
 
 
 # The buffer size to use for open files:
 BUFSIZE = 64 * 1024
 
+# The number of lines in each block of a temporary file.  Blocks are
+# compressed separately, and the first line of each block is sampled
+# to divide the final merge among worker processes:
+BLOCK_SIZE = 1000
+
+# The zlib compression level used for temporary files.  Level 1 is the
+# fastest:
+COMPRESSION_LEVEL = 1
+
+# Each compressed block is preceded by its length:
+_block_header = struct.Struct('>I')
+
+# An estimate of the memory used by each line being sorted, beyond the
+# characters of the line itself (the string object, the list entry,
+# and the sort key):
+LINE_OVERHEAD = 100
+
 
 def get_default_max_merge():
   """Return the default maximum number of files to merge at once."""
@@ -62,6 +102,61 @@ def get_default_max_merge():
 DEFAULT_MAX_MERGE = get_default_max_merge()
 
 
+# The following options are used for the sorts done during a
+# conversion.  They can be changed in the options file.
+
+# If set, the number of bytes of memory to use for sorting runs.
+# Otherwise, each run holds a fixed number of lines, which can use a
+# lot of memory if the lines are long:
+run_memory_limit = None
+
+# Should temporary files be compressed?  This reduces the amount of
+# temporary disk space and I/O, at some cost in CPU time:
+compress_runs = False
+
+# Additional directories (besides the conversion's temporary
+# directory) across which the temporary files are striped:
+extra_tempdirs = []
+
+# If the summaries of the CVSRevisions and of the CVSSymbols that are
+# written by FilterSymbolsPass are each estimated to need at most this
+# many bytes of memory, that pass sorts them in memory (see
+# SortingWriter), and the passes that would otherwise sort them have
+# nothing left to do.  Set this to None to always sort them in those
+# passes:
+in_memory_sort_limit = 64 * 1024 * 1024
+
+
+def _merge_without_key(iterables):
+  """Merge ITERABLES, comparing the values themselves.
+
+  This is the same as merge(iterables), but faster, because no key
+  function has to be called for each value."""
+
+  values = []
+
+  for index, iterable in enumerate(iterables):
+    try:
+      iterator = iter(iterable)
+      value = iterator.next()
+    except StopIteration:
+      pass
+    else:
+      values.append((value, index, iterator))
+
+  heapq.heapify(values)
+
+  while values:
+    (value, index, iterator) = values[0]
+    yield value
+    try:
+      value = iterator.next()
+    except StopIteration:
+      heapq.heappop(values)
+    else:
+      heapq.heapreplace(values, (value, index, iterator))
+
+
 def merge(iterables, key=None):
   """Merge (in the sense of mergesort) ITERABLES.
 
@@ -69,7 +164,9 @@ def merge(iterables, key=None):
   function that returns the sort key."""
 
   if key is None:
-    key = lambda x : x
+    for value in _merge_without_key(iterables):
+      yield value
+    return
 
   values = []
 
@@ -95,32 +192,134 @@ def merge(iterables, key=None):
       heapq.heappush(values, (key(value), index, value, iterator))
 
 
-def merge_files_onepass(input_filenames, output_filename, key=None):
+class _RecordReader(object):
+  """Iterate over the records of a file.
+
+  The records are lines or, if RECORD_SIZE is specified, binary
+  records of that many bytes.  If COMPRESSED is true, the file must
+  have been written by _write_lines() with COMPRESS set."""
+
+  def __init__(self, f, compressed=False, record_size=None):
+    self.f = f
+    self.compressed = compressed
+    self.record_size = record_size
+
+  def _iter_blocks(self):
+    if self.compressed:
+      while True:
+        header = self.f.read(_block_header.size)
+        if not header:
+          break
+        (size,) = _block_header.unpack(header)
+        yield zlib.decompress(self.f.read(size))
+    else:
+      while True:
+        data = self.f.read(self.record_size * BLOCK_SIZE)
+        if not data:
+          break
+        yield data
+
+  def __iter__(self):
+    record_size = self.record_size
+    for data in self._iter_blocks():
+      if record_size is None:
+        for line in cStringIO.StringIO(data):
+          yield line
+      else:
+        for i in xrange(0, len(data), record_size):
+          yield data[i:i + record_size]
+
+  def close(self):
+    self.f.close()
+
+
+def _open_lines(filename, compressed=False, start=0, record_size=None):
+  """Open FILENAME for iterating over its records, starting at offset START.
+
+  The records are lines or, if RECORD_SIZE is specified, binary
+  records of that many bytes.  If COMPRESSED is true, the file must
+  have been written by _write_lines() with COMPRESS set, and START
+  must be the offset of one of its blocks.  Return an iterable with a
+  close() method."""
+
+  f = open(filename, 'rb', BUFSIZE)
+  try:
+    f.seek(start)
+  except:
+    f.close()
+    raise
+  if compressed or record_size is not None:
+    return _RecordReader(f, compressed, record_size)
+  else:
+    return f
+
+
+def _write_lines(filename, lines, compress=False):
+  """Write the strings (lines or records) in iterable LINES to FILENAME.
+
+  Write them in blocks of BLOCK_SIZE lines.  If COMPRESS is true,
+  compress each block separately, so that the file can be read
+  starting at any block.  Return the list of the offsets of the
+  blocks within the file."""
+
+  offsets = []
+  lines = iter(lines)
+  f = open(filename, 'wb', BUFSIZE)
+  try:
+    while True:
+      block = ''.join(itertools.islice(lines, BLOCK_SIZE))
+      if not block:
+        break
+      offsets.append(f.tell())
+      if compress:
+        block = zlib.compress(block, COMPRESSION_LEVEL)
+        f.write(_block_header.pack(len(block)))
+      f.write(block)
+  finally:
+    f.close()
+  return offsets
+
+
+def merge_files_onepass(
+    input_filenames, output_filename, key=None,
+    compressed_inputs=False, compress_output=False, record_size=None,
+    ):
   """Merge a number of input files into one output file.
 
   This is a merge in the sense of mergesort; namely, it is assumed
   that the input files are each sorted, and (under that assumption)
-  the output file will also be sorted."""
+  the output file will also be sorted.
+
+  COMPRESSED_INPUTS and COMPRESS_OUTPUT tell whether the input files
+  and the output file are compressed (see _write_lines()).  If
+  RECORD_SIZE is specified, the files consist of binary records of
+  that many bytes rather than of lines."""
 
   input_filenames = list(input_filenames)
-  if len(input_filenames) == 1:
+  if len(input_filenames) == 1 and compressed_inputs == compress_output:
     shutil.move(input_filenames[0], output_filename)
   else:
-    output_file = file(output_filename, 'wb', BUFSIZE)
+    if event_tracer.enabled:
+      event_tracer.begin(
+          'merge', 'sort', {'inputs' : len(input_filenames)}
+          )
+    chunks = []
     try:
-      chunks = []
-      try:
-        for input_filename in input_filenames:
-          chunks.append(open(input_filename, 'rb', BUFSIZE))
-        output_file.writelines(merge(chunks, key))
-      finally:
-        for chunk in chunks:
-          try:
-            chunk.close()
-          except:
-            pass
+      for input_filename in input_filenames:
+        chunks.append(
+            _open_lines(
+                input_filename, compressed_inputs, record_size=record_size,
+                )
+            )
+      _write_lines(output_filename, merge(chunks, key), compress_output)
     finally:
-      output_file.close()
+      for chunk in chunks:
+        try:
+          chunk.close()
+        except:
+          pass
+    if event_tracer.enabled:
+      event_tracer.end('merge', 'sort')
 
 
 def _try_delete_files(filenames):
@@ -134,7 +333,10 @@ def _try_delete_files(filenames):
 
 
 def tempfile_generator(tempdirs=[]):
-  """Yield filenames of temporary files."""
+  """Yield filenames of temporary files.
+
+  The files are striped across the directories in TEMPDIRS, starting
+  with the first one."""
 
   # Create an iterator that will choose directories to hold the
   # temporary files:
@@ -153,9 +355,22 @@ def tempfile_generator(tempdirs=[]):
     i += 1
 
 
+def _rotate(tempdirs, n):
+  """Return TEMPDIRS rotated left by N places.
+
+  This is used to make different worker processes start striping
+  their temporary files at different directories."""
+
+  if not tempdirs:
+    return tempdirs
+  n %= len(tempdirs)
+  return tempdirs[n:] + tempdirs[:n]
+
+
 def _merge_file_generation(
     input_filenames, delete_inputs, key=None,
-    max_merge=DEFAULT_MAX_MERGE, tempfiles=None,
+    max_merge=DEFAULT_MAX_MERGE, tempfiles=None, compress=False,
+    record_size=None,
     ):
   """Merge multiple input files into fewer output files.
 
@@ -169,7 +384,10 @@ def _merge_file_generation(
   they are no longer needed.
 
   If temporary files need to be used, they will be created using the
-  specified TEMPFILES tempfile generator.
+  specified TEMPFILES tempfile generator.  If COMPRESS is True, the
+  input and output files are compressed.  If RECORD_SIZE is
+  specified, the files consist of binary records of that many bytes
+  rather than of lines.
 
   Generate the names of the output files."""
 
@@ -187,7 +405,11 @@ def _merge_file_generation(
     group = filenames[:max_merge]
     del filenames[:max_merge]
     group_output = tempfiles.next()
-    merge_files_onepass(group, group_output, key=key)
+    merge_files_onepass(
+        group, group_output, key=key,
+        compressed_inputs=compress, compress_output=compress,
+        record_size=record_size,
+        )
     if delete_inputs:
       _try_delete_files(group)
     yield group_output
@@ -195,7 +417,8 @@ def _merge_file_generation(
 
 def merge_files(
     input_filenames, output_filename, key=None, delete_inputs=False,
-    max_merge=DEFAULT_MAX_MERGE, tempfiles=None,
+    max_merge=DEFAULT_MAX_MERGE, tempfiles=None, compress=False,
+    record_size=None,
     ):
   """Merge a number of input files into one output file.
 
@@ -209,7 +432,10 @@ def merge_files(
   they are no longer needed.
 
   If temporary files need to be used, they will be created using the
-  specified TEMPFILES tempfile generator."""
+  specified TEMPFILES tempfile generator.  If COMPRESS is True, the
+  input files and any temporary files are compressed, but the output
+  file is not.  If RECORD_SIZE is specified, the files consist of
+  binary records of that many bytes rather than of lines."""
 
   filenames = list(input_filenames)
   if not filenames:
@@ -223,7 +449,8 @@ def merge_files(
       filenames = list(
           _merge_file_generation(
               filenames, delete_inputs, key=key,
-              max_merge=max_merge, tempfiles=tempfiles
+              max_merge=max_merge, tempfiles=tempfiles, compress=compress,
+              record_size=record_size,
               )
           )
       # After the first iteration, we are only working with temporary
@@ -233,41 +460,460 @@ def merge_files(
 
     # The last merge writes the results directly into the output
     # file:
-    merge_files_onepass(filenames, output_filename, key=key)
+    merge_files_onepass(
+        filenames, output_filename, key=key, compressed_inputs=compress,
+        record_size=record_size,
+        )
     if delete_inputs:
       _try_delete_files(filenames)
 
 
+def _iter_lines(filename, start, end, record_size=None):
+  """Yield the lines of FILENAME between byte offsets START and END.
+
+  START and END must be at line boundaries.  If RECORD_SIZE is
+  specified, yield binary records of that many bytes instead."""
+
+  f = _open_lines(filename, start=start, record_size=record_size)
+  try:
+    if record_size is None:
+      remaining = end - start
+      for line in f:
+        if remaining <= 0:
+          break
+        remaining -= len(line)
+        yield line
+    else:
+      for record in itertools.islice(f, (end - start) // record_size):
+        yield record
+  finally:
+    f.close()
+
+
+def _find_line_boundaries(filename, num_parts, record_size=None):
+  """Return offsets that split FILENAME into about NUM_PARTS parts.
+
+  Return a list [0, offset1, ..., filesize] of offsets that are at
+  line boundaries (or, if RECORD_SIZE is specified, at the boundaries
+  of records of that many bytes).  The list contains no duplicates,
+  so it might describe fewer than NUM_PARTS parts."""
+
+  size = os.path.getsize(filename)
+  if record_size is not None:
+    num_records = size // record_size
+    offsets = [
+        num_records * i // num_parts * record_size
+        for i in range(num_parts + 1)
+        ]
+    return sorted(set(offsets))
+
+  offsets = [0]
+  f = open(filename, 'rb')
+  try:
+    for i in range(1, num_parts):
+      f.seek(max(size * i // num_parts, offsets[-1]))
+      f.readline()
+      offset = f.tell()
+      if offset >= size:
+        break
+      if offset > offsets[-1]:
+        offsets.append(offset)
+  finally:
+    f.close()
+  if size > offsets[-1]:
+    offsets.append(size)
+  return offsets
+
+
+def _iter_chunks(lines, buffer_size, memory_limit):
+  """Split iterable LINES into lists of lines to be sorted in memory.
+
+  If MEMORY_LIMIT is None, each list contains BUFFER_SIZE lines.
+  Otherwise, the lists are made as long as possible without their
+  estimated memory use exceeding MEMORY_LIMIT bytes by much."""
+
+  lines = iter(lines)
+  if memory_limit is None:
+    while True:
+      chunk = list(itertools.islice(lines, buffer_size))
+      if not chunk:
+        return
+      yield chunk
+  else:
+    chunk = []
+    size = 0
+    while True:
+      # Lines are counted a block at a time, to reduce overhead:
+      block = list(itertools.islice(lines, BLOCK_SIZE))
+      if not block:
+        break
+      chunk.extend(block)
+      size += sum(itertools.imap(len, block)) + LINE_OVERHEAD * len(block)
+      if size >= memory_limit:
+        yield chunk
+        chunk = []
+        size = 0
+    if chunk:
+      yield chunk
+
+
+def _write_runs(
+      lines, key, buffer_size, memory_limit, compress, tempfiles,
+      ):
+  """Sort LINES into runs.
+
+  Split LINES into chunks as described in _iter_chunks(), sort each
+  one, and write it to a temporary file from TEMPFILES using
+  _write_lines().  Return a list [(filename, samples), ...] describing
+  the runs, in order.  SAMPLES is a list [(key, offset), ...] giving
+  the key and offset of the first line of each block of the run."""
+
+  runs = []
+  try:
+    for chunk in _iter_chunks(lines, buffer_size, memory_limit):
+      if event_tracer.enabled:
+        event_tracer.begin('run', 'sort', {'lines' : len(chunk)})
+      chunk.sort(key=key)
+      filename = tempfiles.next()
+      runs.append((filename, []))
+      offsets = _write_lines(filename, chunk, compress)
+      if key is None:
+        runs[-1][1].extend(zip(chunk[::BLOCK_SIZE], offsets))
+      else:
+        runs[-1][1].extend(zip(map(key, chunk[::BLOCK_SIZE]), offsets))
+      if event_tracer.enabled:
+        event_tracer.end('run', 'sort')
+  except:
+    _try_delete_files([filename for (filename, samples) in runs])
+    raise
+  return runs
+
+
+# The arguments of the sort_file() call that is currently being
+# executed using worker processes, as a tuple (key, buffer_size,
+# memory_limit, compress, record_size, tempdirs, max_merge).  The
+# workers inherit them when they are forked:
+_worker_args = None
+
+
+def _sort_part(args):
+  """Sort the lines between offsets START and END of FILENAME into runs.
+
+  INDEX is the number of the part.  Return the runs as described in
+  _write_runs()."""
+
+  (index, filename, start, end) = args
+  (
+      key, buffer_size, memory_limit, compress, record_size,
+      tempdirs, max_merge,
+      ) = _worker_args
+  return _write_runs(
+      _iter_lines(filename, start, end, record_size),
+      key, buffer_size, memory_limit, compress,
+      tempfile_generator(_rotate(tempdirs, index)),
+      )
+
+
+def _iter_run_range(
+      run_filename, samples, key, compressed, record_size, lo, hi,
+      ):
+  """Yield the lines of a run whose keys are in the range [LO, HI).
+
+  SAMPLES are the samples of the run returned by _write_runs().  LO or
+  HI can be None to leave the range unbounded on that side.  See
+  _open_lines() for COMPRESSED and RECORD_SIZE."""
+
+  start = 0
+  if lo is not None:
+    # Start reading at the last block that starts before LO:
+    i = bisect.bisect_left([sample[0] for sample in samples], lo)
+    if i > 0:
+      start = samples[i - 1][1]
+
+  f = _open_lines(run_filename, compressed, start, record_size)
+  try:
+    for line in f:
+      k = key(line)
+      if lo is not None and k < lo:
+        continue
+      if hi is not None and k >= hi:
+        break
+      yield line
+  finally:
+    f.close()
+
+
+def _merge_partition(args):
+  """Merge the lines of RUNS whose keys are in the range [LO, HI).
+
+  INDEX is the number of the partition.  Write the lines to a new
+  temporary file and return its name."""
+
+  (index, runs, lo, hi) = args
+  (
+      key, buffer_size, memory_limit, compress, record_size,
+      tempdirs, max_merge,
+      ) = _worker_args
+  if key is None:
+    key = lambda x : x
+
+  tempfiles = tempfile_generator(_rotate(tempdirs, index))
+  groups = [
+      runs[i:i + max_merge]
+      for i in range(0, len(runs), max_merge)
+      ]
+  output = tempfiles.next()
+  if len(groups) == 1:
+    filenames = [output]
+  else:
+    # Open at most MAX_MERGE runs at a time:
+    filenames = [tempfiles.next() for group in groups]
+
+  try:
+    for (group, filename) in zip(groups, filenames):
+      _write_lines(
+          filename,
+          merge(
+              [
+                  _iter_run_range(
+                      run_filename, samples, key, compress, record_size,
+                      lo, hi,
+                      )
+                  for (run_filename, samples) in group
+                  ],
+              key,
+              ),
+          compress and len(groups) > 1,
+          )
+
+    if len(groups) > 1:
+      merge_files(
+          filenames, output, key=key, delete_inputs=True,
+          max_merge=max_merge, tempfiles=tempfiles, compress=compress,
+          record_size=record_size,
+          )
+  except:
+    _try_delete_files(filenames + [output])
+    raise
+  return output
+
+
+def _choose_splitters(runs, num_partitions):
+  """Return keys that split the lines of RUNS into NUM_PARTITIONS ranges.
+
+  Choose the keys from the runs' samples so that the ranges are of
+  similar size.  Return a sorted list of distinct keys, which might be
+  shorter than NUM_PARTITIONS - 1."""
+
+  keys = sorted(
+      k
+      for (run_filename, samples) in runs
+      for (k, offset) in samples
+      )
+  splitters = []
+  for i in range(1, num_partitions):
+    k = keys[len(keys) * i // num_partitions]
+    if not splitters or k > splitters[-1]:
+      splitters.append(k)
+  return splitters
+
+
+def _sort_file_in_parallel(
+      input, output, key, buffer_size, memory_limit, compress,
+      record_size, tempdirs, max_merge, jobs,
+      ):
+  global _worker_args
+
+  runs = []
+  partitions = []
+
+  offsets = _find_line_boundaries(input, jobs, record_size)
+  if memory_limit is not None:
+    # Each worker holds one chunk in memory at a time:
+    memory_limit = max(memory_limit // jobs, 1)
+  _worker_args = (
+      key, buffer_size, memory_limit, compress, record_size,
+      tempdirs, max_merge,
+      )
+  pool = multiprocessing.Pool(jobs)
+  try:
+    try:
+      for part_runs in event_tracer.collect_from_workers(
+            pool.imap(
+                event_tracer.call_in_worker,
+                [
+                    (_sort_part, (i, input, offsets[i], offsets[i + 1]),)
+                    for i in range(len(offsets) - 1)
+                    ],
+                )
+            ):
+        runs.extend(part_runs)
+
+      if runs:
+        # Each worker merges the lines in one range of keys.  All lines
+        # with equal keys end up in the same range:
+        bounds = [None] + _choose_splitters(runs, jobs) + [None]
+        for partition in event_tracer.collect_from_workers(
+              pool.imap(
+                  event_tracer.call_in_worker,
+                  [
+                      (_merge_partition, (i, runs, bounds[i], bounds[i + 1]),)
+                      for i in range(len(bounds) - 1)
+                      ],
+                  )
+              ):
+          partitions.append(partition)
+
+      pool.close()
+    except:
+      pool.terminate()
+      raise
+    finally:
+      pool.join()
+      _worker_args = None
+
+    # The ranges are in order, so the output is their concatenation:
+    output_file = open(output, 'wb', BUFSIZE)
+    try:
+      for partition in partitions:
+        f = open(partition, 'rb', BUFSIZE)
+        try:
+          shutil.copyfileobj(f, output_file, BUFSIZE)
+        finally:
+          f.close()
+    finally:
+      output_file.close()
+  finally:
+    _try_delete_files([run_filename for (run_filename, samples) in runs])
+    _try_delete_files(partitions)
+
+
+class SortingWriter(object):
+  """Write lines to be sorted, sorting them in memory if possible.
+
+  The lines passed to write() are held in memory as long as their
+  estimated size stays within MEMORY_LIMIT bytes.  If they all fit,
+  close() sorts them and writes them to SORTED_FILENAME, leaving
+  UNSORTED_FILENAME empty.  Otherwise (or if MEMORY_LIMIT is None),
+  the lines are written to UNSORTED_FILENAME in the order that they
+  were received, so that they can be sorted later using sort_file(),
+  and SORTED_FILENAME is left empty.  Either way, the sorted result
+  is the same as that of sort_file() without a key."""
+
+  def __init__(self, unsorted_filename, sorted_filename, memory_limit):
+    self.unsorted_filename = unsorted_filename
+    self.sorted_filename = sorted_filename
+    self.memory_limit = memory_limit
+    self._lines = []
+    self._size = 0
+    self.f = None
+    if memory_limit is None:
+      self._spill()
+
+  def _spill(self):
+    """Write the lines to be sorted later, and write future ones directly."""
+
+    self.f = open(self.unsorted_filename, 'wb', BUFSIZE)
+    self.f.writelines(self._lines)
+    self._lines = None
+
+  def write(self, line):
+    if self.f is not None:
+      self.f.write(line)
+      return
+
+    self._lines.append(line)
+    self._size += len(line) + LINE_OVERHEAD
+    if self._size > self.memory_limit:
+      # The lines don't fit in memory:
+      self._spill()
+
+  def close(self):
+    if self.f is None:
+      if event_tracer.enabled:
+        event_tracer.begin(
+            os.path.basename(self.sorted_filename), 'sort',
+            {'lines' : len(self._lines)},
+            )
+      self._lines.sort()
+      _write_lines(self.sorted_filename, self._lines)
+      self._lines = None
+      if event_tracer.enabled:
+        event_tracer.end(os.path.basename(self.sorted_filename), 'sort')
+      open(self.unsorted_filename, 'wb').close()
+    else:
+      self.f.close()
+      self.f = None
+      open(self.sorted_filename, 'wb').close()
+
+
 def sort_file(
       input, output, key=None,
       buffer_size=32000, tempdirs=[], max_merge=DEFAULT_MAX_MERGE,
+      jobs=1, memory_limit=None, compress=False, record_size=None,
       ):
+  """Sort the lines of file INPUT into file OUTPUT.
+
+  The lines are sorted stably by KEY (or by their contents, if KEY is
+  not specified).  At most BUFFER_SIZE lines are sorted in memory at
+  a time, or, if MEMORY_LIMIT is specified, as many lines as are
+  estimated to fit in that many bytes.  The resulting runs are stored
+  in temporary files striped across the directories in TEMPDIRS
+  (compressed, if COMPRESS is True), then merged.  If JOBS is greater
+  than one, use up to that many worker processes (see the module
+  docstring).
+
+  If RECORD_SIZE is specified, the file consists of binary records of
+  that many bytes rather than of lines.  Such records are typically
+  sorted by their contents, which is fast because no key function has
+  to be called."""
+
+  if event_tracer.enabled:
+    event_tracer.begin(
+        os.path.basename(output), 'sort', {'input' : input, 'jobs' : jobs}
+        )
+
+  if jobs > 1 and multiprocessing is not None and hasattr(os, 'fork'):
+    _sort_file_in_parallel(
+        input, output, key, buffer_size, memory_limit, compress,
+        record_size, tempdirs, max_merge, jobs,
+        )
+  else:
+    _sort_file(
+        input, output, key, buffer_size, tempdirs, max_merge,
+        memory_limit, compress, record_size,
+        )
+
+  if event_tracer.enabled:
+    event_tracer.end(os.path.basename(output), 'sort')
+
+
+def _sort_file(
+      input, output, key, buffer_size, tempdirs, max_merge,
+      memory_limit, compress, record_size,
+      ):
+  """Sort the lines of file INPUT into file OUTPUT in this process.
+
+  The arguments are as for sort_file()."""
+
   tempfiles = tempfile_generator(tempdirs)
 
   filenames = []
 
-  input_file = file(input, 'rb', BUFSIZE)
   try:
+    input_file = _open_lines(input, record_size=record_size)
     try:
-      input_iterator = iter(input_file)
-      while True:
-        current_chunk = list(itertools.islice(input_iterator, buffer_size))
-        if not current_chunk:
-          break
-        current_chunk.sort(key=key)
-        filename = tempfiles.next()
-        filenames.append(filename)
-        f = open(filename, 'w+b', BUFSIZE)
-        try:
-          f.writelines(current_chunk)
-        finally:
-          f.close()
+      runs = _write_runs(
+          input_file, key, buffer_size, memory_limit, compress, tempfiles,
+          )
+      filenames = [filename for (filename, samples) in runs]
     finally:
       input_file.close()
 
     merge_files(
         filenames, output, key=key,
         delete_inputs=True, max_merge=max_merge, tempfiles=tempfiles,
+        compress=compress, record_size=record_size,
         )
   finally:
     _try_delete_files(filenames)
@@ -24,6 +24,13 @@ import time
 import cPickle
 from cStringIO import StringIO
 
+try:
+  import json
+except ImportError:
+  # Python < 2.6:
+  json = None
+
+from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.cvs_item import CVSRevision
 from cvs2svn_lib.cvs_item import CVSBranch
 from cvs2svn_lib.cvs_item import CVSTag
@@ -35,12 +42,28 @@ class StatsKeeper:
     self._first_rev_date = 1L<<32
     self._last_rev_date = 0
     self._pass_timings = { }
+    # A map {pass_num : {resource : value}} (see resource_monitor.py):
+    self._pass_resources = { }
+    # A map {pass_num : {name : value}} (see counters.py):
+    self._pass_counters = { }
+    # A list of (pass_name, CycleStatistics) for the passes that broke
+    # changeset cycles:
+    self._cycle_statistics = []
     self._stats_reflect_exclude = False
     self.reset_cvs_rev_info()
 
   def log_duration_for_pass(self, duration, pass_num, pass_name):
     self._pass_timings[pass_num] = (pass_name, duration,)
 
+  def log_resources_for_pass(self, pass_num, resources):
+    self._pass_resources[pass_num] = resources
+
+  def log_counters_for_pass(self, pass_num, counters):
+    self._pass_counters[pass_num] = counters
+
+  def log_cycle_statistics(self, pass_name, cycle_statistics):
+    self._cycle_statistics.append((pass_name, cycle_statistics,))
+
   def set_stats_reflect_exclude(self, value):
     self._stats_reflect_exclude = value
 
@@ -94,6 +117,37 @@ class StatsKeeper:
   def svn_rev_count(self):
     return self._svn_rev_count
 
+  def merge(self, other):
+    """Merge the statistics recorded in StatsKeeper OTHER into this one.
+
+    Both StatsKeepers must come from the same conversion.  Passes that
+    ran concurrently start from the same statistics, so recording the
+    same information twice (e.g., the timing of a pass that both
+    StatsKeepers inherited) is harmless.  The CVS item counts recorded
+    after excluding symbols supersede the unaltered ones."""
+
+    self._pass_timings.update(other._pass_timings)
+    self._pass_resources.update(other._pass_resources)
+    self._pass_counters.update(other._pass_counters)
+    pass_names = set([pass_name for (pass_name, cycle_statistics)
+                      in self._cycle_statistics])
+    for (pass_name, cycle_statistics) in other._cycle_statistics:
+      if pass_name not in pass_names:
+        self._cycle_statistics.append((pass_name, cycle_statistics,))
+    if other._svn_rev_count is not None:
+      self._svn_rev_count = other._svn_rev_count
+    self._first_rev_date = min(self._first_rev_date, other._first_rev_date)
+    self._last_rev_date = max(self._last_rev_date, other._last_rev_date)
+    if other._stats_reflect_exclude or not self._stats_reflect_exclude:
+      self._stats_reflect_exclude = other._stats_reflect_exclude
+      self._repos_file_count = other._repos_file_count
+      self._repos_size = other._repos_size
+      self._cvs_revs_count = other._cvs_revs_count
+      self._cvs_branches_count = other._cvs_branches_count
+      self._cvs_tags_count = other._cvs_tags_count
+      self._tag_ids = set(other._tag_ids)
+      self._branch_ids = set(other._branch_ids)
+
   def __getstate__(self):
     state = self.__dict__.copy()
     # This can get kinda large, so we don't store it:
@@ -126,6 +180,8 @@ class StatsKeeper:
     f.write(
         'Last Revision Date:     %s\n' % (time.ctime(self._last_rev_date),)
         )
+    for (pass_name, cycle_statistics) in self._cycle_statistics:
+      f.write('Cycles (%s): %s\n' % (pass_name, cycle_statistics,))
     f.write('------------------')
 
     if not self._stats_reflect_exclude:
@@ -176,6 +232,85 @@ class StatsKeeper:
     f.write((format + '   total') % total)
     return f.getvalue()
 
+  @staticmethod
+  def _format_size(value):
+    if value is None:
+      return '%9s' % ('-',)
+    else:
+      return '%9.1f' % (value / (1024.0 * 1024.0),)
+
+  def resources(self):
+    passes = self._pass_resources.keys()
+    passes.sort()
+    f = StringIO()
+    f.write('Resources (CPU times in seconds, sizes in MiB):\n')
+    f.write('------------------\n')
+    f.write(
+        '%9s %9s %9s %9s %9s %9s\n'
+        % ('user', 'system', 'peak RSS', 'read', 'written', 'peak tmp',)
+        )
+    for pass_num in passes:
+      (pass_name, duration,) = self._pass_timings[pass_num]
+      resources = self._pass_resources[pass_num]
+      f.write(
+          '%9.3f %9.3f %s %s %s %s   pass%-2d   %s\n' % (
+              resources['user_cpu'],
+              resources['system_cpu'],
+              self._format_size(resources.get('peak_rss')),
+              self._format_size(resources.get('bytes_read')),
+              self._format_size(resources.get('bytes_written')),
+              self._format_size(resources.get('peak_tmpdir_size')),
+              pass_num, pass_name,
+              )
+          )
+    return f.getvalue().rstrip('\n')
+
+  def counters(self):
+    passes = self._pass_counters.keys()
+    passes.sort()
+    f = StringIO()
+    f.write('Counters (times in seconds):\n')
+    f.write('------------------\n')
+    for pass_num in passes:
+      (pass_name, duration,) = self._pass_timings[pass_num]
+      f.write('pass%-2d   %s\n' % (pass_num, pass_name,))
+      for (name, value) in sorted(self._pass_counters[pass_num].items()):
+        if isinstance(value, float):
+          f.write('%14.3f   %s\n' % (value, name,))
+        else:
+          f.write('%14d   %s\n' % (value, name,))
+    return f.getvalue().rstrip('\n')
+
+  def pass_report(self):
+    """Return the timings and resources of the passes as JSON.
+
+    The report is an object with a 'passes' member, a list with one
+    object per pass holding its number, name, duration (in seconds),
+    and the resources recorded for it (see
+    ResourceMonitor.stop()).  If counters were recorded for the pass
+    (see counters.py), they are in its 'counters' member."""
+
+    if json is None:
+      raise FatalError('Writing the pass report requires Python 2.6 or later')
+    passes = self._pass_timings.keys()
+    passes.sort()
+    report = []
+    for pass_num in passes:
+      (pass_name, duration,) = self._pass_timings[pass_num]
+      entry = {
+          'pass' : pass_num,
+          'name' : pass_name,
+          'duration' : duration,
+          }
+      entry.update(self._pass_resources.get(pass_num, {}))
+      if pass_num in self._pass_counters:
+        entry['counters'] = self._pass_counters[pass_num]
+      report.append(entry)
+
+    return json.dumps(
+        {'passes' : report}, indent=2, sort_keys=True, separators=(',', ': ')
+        )
+
 
 def read_stats_keeper(filename):
   """Factory function: Return a _StatsKeeper instance.
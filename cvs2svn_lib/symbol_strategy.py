@@ -22,6 +22,7 @@ from cvs2svn_lib.common import FatalError
 from cvs2svn_lib.common import path_join
 from cvs2svn_lib.common import normalize_svn_path
 from cvs2svn_lib.log import logger
+from cvs2svn_lib.pass_fingerprint import register_config_file
 from cvs2svn_lib.symbol import Trunk
 from cvs2svn_lib.symbol import TypedSymbol
 from cvs2svn_lib.symbol import Branch
@@ -613,6 +614,7 @@ class SymbolHintsFileRule(StrategyRule):
 
   def __init__(self, filename):
     self.filename = filename
+    register_config_file(self.filename)
 
   def start(self, symbol_statistics):
     self._rules = []
@@ -0,0 +1,164 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the CVSItemSerializer class.
+
+When executed, this program serializes and deserializes items of each
+of the classes listed in cvs_item_serializer._schemas, with boundary
+values for each kind of field, and checks that the round trip
+preserves their states."""
+
+import sys
+import os
+import unittest
+import cPickle
+from cStringIO import StringIO
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib import cvs_item_serializer
+from cvs2svn_lib.cvs_item_serializer import CVSItemSerializer
+
+
+class Dummy(object):
+  """Stands in for the CVSFiles and Symbols referred to by the items."""
+
+  def __init__(self, id):
+    self.id = id
+
+
+class DummyDatabase(object):
+  def get_path(self, id):
+    return Dummy(id)
+
+  get_symbol = get_path
+
+
+# A map {field kind class : [value,...]} of the values to try for each
+# kind of field:
+SAMPLES = {
+    cvs_item_serializer._Int : [0, 1, 1000, 2**32 - 1],
+    cvs_item_serializer._Timestamp : [
+        0, -1, 1234567890, -2**63, 2**63 - 1,
+        ],
+    cvs_item_serializer._OptionalInt : [None, 0, 7, 2**32 - 2],
+    cvs_item_serializer._Bool : [False, True],
+    cvs_item_serializer._OptionalBool : [None, False, True],
+    cvs_item_serializer._Rev : [None, '1.1', '1.2.3.4.5.6', ''],
+    cvs_item_serializer._IdList : [
+        [], [0], [5, 3, 2**32 - 1, 0], range(1000, 1200),
+        ],
+    cvs_item_serializer._SymbolList : [
+        None, [], [(0, 0)], [(3, 2**32 - 1), (1, 0), (2**32 - 1, 5)],
+        ],
+    cvs_item_serializer._Properties : [
+        None, {},
+        {'svn:eol-style' : 'native', 'svn:keywords' : 'Id'},
+        {
+            'negative' : -5, 'big' : 2**40, 'false' : False,
+            'none' : None, 'pickled' : (1, [2.5]), '' : '\0',
+            },
+        ],
+    cvs_item_serializer._Value : [
+        None, 0, -1, -2**40, 2**70, 'text\0', '', True, False,
+        ('pickled', [1, 2]), {'x' : None}, [],
+        ],
+    }
+
+
+def generate_states(fields):
+  """Generate state tuples for items with fields of the kinds FIELDS.
+
+  Together, the tuples contain every sample value of every field."""
+
+  n = max([len(SAMPLES[field.__class__]) for field in fields])
+  for i in range(n):
+    yield tuple([
+        SAMPLES[field.__class__][i % len(SAMPLES[field.__class__])]
+        for field in fields
+        ])
+
+
+def create_item(cls, state):
+  cvs_item = cls.__new__(cls)
+  cvs_item.__setstate__(state)
+  return cvs_item
+
+
+class CVSItemSerializerTestCase(unittest.TestCase):
+  def setUp(self):
+    Ctx()._cvs_path_db = DummyDatabase()
+    Ctx()._symbol_db = DummyDatabase()
+
+  def tearDown(self):
+    del Ctx()._cvs_path_db
+    del Ctx()._symbol_db
+
+  def iter_items(self):
+    for (cls, fields) in cvs_item_serializer._schemas:
+      for state in generate_states(fields):
+        yield create_item(cls, state)
+
+  def check_item(self, cvs_item, copy):
+    self.assertEqual(copy.__class__, cvs_item.__class__)
+    self.assertEqual(copy.__getstate__(), cvs_item.__getstate__())
+
+  def test_dumps_loads(self):
+    serializer = CVSItemSerializer()
+    for cvs_item in self.iter_items():
+      s = serializer.dumps(cvs_item)
+      self.assertEqual(serializer.load_id(s), cvs_item.id)
+      self.check_item(cvs_item, serializer.loads(s))
+
+  def test_dumpf_loadf(self):
+    serializer = CVSItemSerializer()
+    cvs_items = list(self.iter_items())
+    f = StringIO()
+    for cvs_item in cvs_items:
+      serializer.dumpf(f, cvs_item)
+    f.seek(0)
+    for cvs_item in cvs_items:
+      self.check_item(cvs_item, serializer.loadf(f))
+    self.assertRaises(EOFError, serializer.loadf, f)
+
+  def test_pickled_serializer(self):
+    serializer = cPickle.loads(cPickle.dumps(CVSItemSerializer(), -1))
+    for cvs_item in self.iter_items():
+      self.check_item(cvs_item, serializer.loads(serializer.dumps(cvs_item)))
+
+  def test_shared_properties(self):
+    (cls, fields) = cvs_item_serializer._schemas[0]
+    index = fields.index(cvs_item_serializer._PROPERTIES)
+    state = list(generate_states(fields).next())
+    serializer = CVSItemSerializer()
+    copies = []
+    for properties in SAMPLES[cvs_item_serializer._Properties][2:] * 2:
+      state[index] = dict(properties)
+      s = serializer.dumps(create_item(cls, tuple(state)))
+      copies.append(serializer.loads(s))
+    self.assertEqual(copies[0].properties, copies[2].properties)
+    self.assert_(copies[0].properties is copies[2].properties)
+    self.assert_(copies[0].properties is not copies[1].properties)
+
+
+suite = unittest.makeSuite(CVSItemSerializerTestCase)
+
+
+if __name__ == '__main__':
+  unittest.TextTestRunner(verbosity=2).run(suite)
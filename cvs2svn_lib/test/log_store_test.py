@@ -0,0 +1,219 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the LogStructuredStore class.
+
+When executed, this program checks that the contents of stores
+survive being closed and reopened after values have been written,
+overwritten, and deleted, after compaction, and after the file has
+been truncated in the middle of a record."""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.common import DB_OPEN_READ
+from cvs2svn_lib.common import DB_OPEN_WRITE
+from cvs2svn_lib.common import DB_OPEN_NEW
+from cvs2svn_lib import log_store
+from cvs2svn_lib.log_store import LogStructuredStore
+
+
+class LogStructuredStoreTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp(prefix='cvs2svn-')
+    self.filename = os.path.join(self.tmpdir, 'store.db')
+    self.saved_settings = (
+        log_store.write_buffer_size, log_store.compaction_threshold,
+        )
+    # Flush often, so that reads of buffered and written records are
+    # both exercised:
+    log_store.write_buffer_size = 100
+
+  def tearDown(self):
+    (log_store.write_buffer_size, log_store.compaction_threshold,) = \
+        self.saved_settings
+    shutil.rmtree(self.tmpdir)
+
+  def check(self, store, expected):
+    self.assertEqual(len(store), len(expected))
+    self.assertEqual(sorted(store.keys()), sorted(expected.keys()))
+    for (key, value) in expected.items():
+      self.assert_(key in store)
+      self.assertEqual(store[key], value)
+
+  def check_file(self, expected):
+    """Check that the file contains EXPECTED when reopened."""
+
+    store = LogStructuredStore(self.filename, DB_OPEN_READ)
+    self.check(store, expected)
+    store.close()
+
+  def fill(self, store, expected, n, prefix=''):
+    for i in range(n):
+      key = '%skey%d' % (prefix, i,)
+      value = 'value%d' % (i,) * (i % 7)
+      store[key] = value
+      expected[key] = value
+
+  def test_reopen(self):
+    expected = {}
+    store = LogStructuredStore(self.filename, DB_OPEN_NEW)
+    self.fill(store, expected, 50)
+    store[''] = ''
+    expected[''] = ''
+    self.check(store, expected)
+    store.close()
+    self.check_file(expected)
+
+  def test_overwrite_and_delete(self):
+    expected = {}
+    store = LogStructuredStore(self.filename, DB_OPEN_NEW)
+    self.fill(store, expected, 50)
+    for i in range(0, 50, 3):
+      key = 'key%d' % (i,)
+      store[key] = 'new value of %s' % (key,)
+      expected[key] = store[key]
+    for i in range(0, 50, 5):
+      key = 'key%d' % (i,)
+      del store[key]
+      del expected[key]
+    self.check(store, expected)
+    self.assertRaises(KeyError, lambda: store['key0'])
+    store.close()
+    self.check_file(expected)
+
+    # Modify the existing file and reopen it again:
+    store = LogStructuredStore(self.filename, DB_OPEN_WRITE)
+    self.check(store, expected)
+    store['key0'] = 'resurrected'
+    expected['key0'] = 'resurrected'
+    del store['key1']
+    del expected['key1']
+    self.fill(store, expected, 10, 'more')
+    self.check(store, expected)
+    store.close()
+    self.check_file(expected)
+
+  def test_compact(self):
+    expected = {}
+    store = LogStructuredStore(self.filename, DB_OPEN_NEW)
+    self.fill(store, expected, 50)
+    for i in range(0, 50, 2):
+      key = 'key%d' % (i,)
+      store[key] = 'x' * i
+      expected[key] = store[key]
+      del store['key%d' % (i + 1,)]
+      del expected['key%d' % (i + 1,)]
+    store.close()
+    size = os.path.getsize(self.filename)
+
+    store = LogStructuredStore(self.filename, DB_OPEN_WRITE)
+    store.compact()
+    self.check(store, expected)
+    store['after'] = 'compaction'
+    expected['after'] = 'compaction'
+    store.close()
+    self.assert_(os.path.getsize(self.filename) < size)
+    self.check_file(expected)
+
+  def test_automatic_compaction(self):
+    log_store.compaction_threshold = 0
+    expected = {}
+    store = LogStructuredStore(self.filename, DB_OPEN_NEW)
+    for j in range(10):
+      self.fill(store, expected, 20)
+      del store['key%d' % (j,)]
+      del expected['key%d' % (j,)]
+    self.check(store, expected)
+    store.close()
+    self.assert_(os.path.getsize(self.filename) < 10 * 20 * 20)
+    self.check_file(expected)
+
+  def check_truncated(self, record_size, expected, last):
+    """Check the store after cutting off each part of its last record.
+
+    The last RECORD_SIZE bytes of the file at self.filename must be a
+    record that changed the contents of the store from EXPECTED to
+    LAST.  If the record is incomplete, the store must behave as if it
+    had never been written, and it must be possible to add more
+    records after reopening it."""
+
+    f = open(self.filename, 'rb')
+    contents = f.read()
+    f.close()
+    full_size = len(contents)
+    for size in range(full_size - record_size, full_size + 1):
+      f = open(self.filename, 'wb')
+      f.write(contents[:size])
+      f.close()
+      if size == full_size:
+        self.check_file(last)
+        continue
+
+      self.check_file(expected)
+      store = LogStructuredStore(self.filename, DB_OPEN_WRITE)
+      self.check(store, expected)
+      store['added'] = 'later'
+      store.close()
+      added = dict(expected)
+      added['added'] = 'later'
+      self.check_file(added)
+
+  def test_truncated_record(self):
+    expected = {}
+    store = LogStructuredStore(self.filename, DB_OPEN_NEW)
+    self.fill(store, expected, 10)
+    store.close()
+    size = os.path.getsize(self.filename)
+
+    store = LogStructuredStore(self.filename, DB_OPEN_WRITE)
+    store['last key'] = 'last value'
+    store.close()
+    last = dict(expected)
+    last['last key'] = 'last value'
+    self.check_truncated(
+        os.path.getsize(self.filename) - size, expected, last
+        )
+
+  def test_truncated_tombstone(self):
+    expected = {}
+    store = LogStructuredStore(self.filename, DB_OPEN_NEW)
+    self.fill(store, expected, 10)
+    store.close()
+    size = os.path.getsize(self.filename)
+
+    store = LogStructuredStore(self.filename, DB_OPEN_WRITE)
+    del store['key3']
+    store.close()
+    last = dict(expected)
+    del last['key3']
+    self.check_truncated(
+        os.path.getsize(self.filename) - size, expected, last
+        )
+
+
+suite = unittest.makeSuite(LogStructuredStoreTestCase)
+
+
+if __name__ == '__main__':
+  unittest.TextTestRunner(verbosity=2).run(suite)
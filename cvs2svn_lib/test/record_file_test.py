@@ -0,0 +1,159 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests RecordFormat and the record file classes.
+
+When executed, this program checks that records with boundary values
+survive being packed, written, sorted, and read back, and that the
+packed records sort like their fields."""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+import struct
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib.record_file import RecordFormat
+from cvs2svn_lib.record_file import RecordFileWriter
+from cvs2svn_lib.record_file import RecordFileReader
+from cvs2svn_lib.sort import sort_file
+
+
+# The values to try for each field type:
+SAMPLES = {
+    'B' : [0, 1, 0x7f, 0x80, 0xff],
+    'H' : [0, 1, 0xff, 0x100, 0xffff],
+    'I' : [0, 1, 0xffff, 0x10000, 2**31 - 1, 2**31, 2**32 - 1],
+    'Q' : [0, 1, 2**32 - 1, 2**32, 2**63, 2**64 - 1],
+    'c' : ['\0', 'a', '\x7f', '\x80', '\xff'],
+    'b' : [-2**7, -1, 0, 1, 2**7 - 1],
+    'h' : [-2**15, -0x100, -1, 0, 0xff, 2**15 - 1],
+    'i' : [-2**31, -0x10000, -1, 0, 1, 0xffff, 2**31 - 1],
+    'q' : [-2**63, -2**32, -1, 0, 1, 2**32, 2**63 - 1],
+    }
+
+
+def generate_records(format):
+  """Return a list of every combination of sample values for FORMAT."""
+
+  records = [()]
+  for field in format:
+    records = [
+        record + (value,)
+        for record in records
+        for value in SAMPLES[field]
+        ]
+  return records
+
+
+class RecordFileTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp(prefix='cvs2svn-')
+    self.filename = os.path.join(self.tmpdir, 'records.dat')
+
+  def tearDown(self):
+    shutil.rmtree(self.tmpdir)
+
+  def check_format(self, format):
+    record_format = RecordFormat(format)
+    self.assertEqual(record_format.size, struct.calcsize('>' + format))
+    records = generate_records(format)
+
+    for record in records:
+      s = record_format.pack(*record)
+      self.assertEqual(len(s), record_format.size)
+      self.assertEqual(record_format.unpack(s), record)
+      self.assertEqual(record_format.unpack_from('x' + s, 1), record)
+
+    # The packed records must sort like the records themselves:
+    packed = [record_format.pack(*record) for record in records]
+    packed.sort()
+    self.assertEqual(
+        [record_format.unpack(s) for s in packed], sorted(records)
+        )
+
+    # Write the records in reverse order, sort the file, and read it:
+    writer = RecordFileWriter(self.filename, record_format)
+    for record in reversed(records):
+      writer.write(*record)
+    writer.close()
+    sorted_filename = os.path.join(self.tmpdir, 'sorted.dat')
+    sort_file(
+        self.filename, sorted_filename, buffer_size=7,
+        tempdirs=[self.tmpdir], record_size=record_format.size,
+        )
+    reader = RecordFileReader(sorted_filename, record_format)
+    self.assertEqual(len(reader), len(records))
+    self.assertEqual(list(reader), sorted(records))
+    self.assertEqual(reader[0], min(records))
+    self.assertEqual(reader[len(records) - 1], max(records))
+    self.assertEqual(list(reader.iter_from(3)), sorted(records)[3:])
+    self.assertEqual(list(reader.iter_from(len(records))), [])
+    self.assertRaises(IndexError, lambda: reader[-1])
+    self.assertRaises(IndexError, lambda: reader[len(records)])
+    reader.close()
+
+  def test_single_fields(self):
+    for format in SAMPLES:
+      self.check_format(format)
+
+  def test_multiple_fields(self):
+    self.check_format('IB')
+    self.check_format('QIH')
+    self.check_format('IcI')
+    # (changeset_id, timestamp), as in CHANGESETS_SORTED_DATAFILE.
+    # Timestamps before 1970 are negative:
+    self.check_format('Iq')
+
+  def test_out_of_range(self):
+    record_format = RecordFormat('BI')
+    self.assertRaises(struct.error, record_format.pack, 0x100, 0)
+    self.assertRaises(struct.error, record_format.pack, 0, -1)
+    self.assertRaises(struct.error, record_format.pack, 0, 2**32)
+    record_format = RecordFormat('iq')
+    self.assertRaises(struct.error, record_format.pack, -2**31 - 1, 0)
+    self.assertRaises(struct.error, record_format.pack, 2**31, 0)
+    self.assertRaises(struct.error, record_format.pack, 0, 2**63)
+
+  def test_empty_file(self):
+    record_format = RecordFormat('II')
+    RecordFileWriter(self.filename, record_format).close()
+    reader = RecordFileReader(self.filename, record_format)
+    self.assertEqual(len(reader), 0)
+    self.assertEqual(list(reader), [])
+    self.assertRaises(IndexError, lambda: reader[0])
+    reader.close()
+
+  def test_partial_record(self):
+    record_format = RecordFormat('II')
+    f = open(self.filename, 'wb')
+    f.write(record_format.pack(1, 2) + '\0')
+    f.close()
+    self.assertRaises(
+        ValueError, RecordFileReader, self.filename, record_format
+        )
+
+
+suite = unittest.makeSuite(RecordFileTestCase)
+
+
+if __name__ == '__main__':
+  unittest.TextTestRunner(verbosity=2).run(suite)
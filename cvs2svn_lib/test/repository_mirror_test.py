@@ -0,0 +1,305 @@
+#!/usr/bin/env python
+# (Be in -*- python -*- mode.)
+#
+# ====================================================================
+# Copyright (c) 2010 CollabNet.  All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.  The terms
+# are also available at http://subversion.tigris.org/license-1.html.
+# If newer versions of this license are posted there, you may use a
+# newer version instead, at your option.
+#
+# This software consists of voluntary contributions made by many
+# individuals.  For exact contribution history, see the revision
+# history and logs, available at http://cvs2svn.tigris.org/.
+# ====================================================================
+
+"""This program tests the storage of large directories in the mirror.
+
+When executed, this program checks that _FragmentedEntries instances
+copied via _copy_entries() do not affect each other when modified,
+that directories are fragmented and refragmented as they grow and
+shrink, and that the entries of directories survive being written to
+and read back from a _NodeDatabase."""
+
+import sys
+import os
+import shutil
+import tempfile
+import unittest
+
+SRCPATH = os.path.normpath(os.path.join(os.path.dirname(__file__), '..', '..'))
+sys.path.insert(0, SRCPATH)
+
+from cvs2svn_lib import config
+from cvs2svn_lib.context import Ctx
+from cvs2svn_lib.artifact_manager import ArtifactManager
+from cvs2svn_lib.key_generator import KeyGenerator
+from cvs2svn_lib import repository_mirror
+from cvs2svn_lib.repository_mirror import _FragmentedEntries
+from cvs2svn_lib.repository_mirror import _copy_entries
+from cvs2svn_lib.repository_mirror import _NodeDatabase
+
+
+class Dummy(object):
+  """Stands in for the CVSPaths used as keys of the entries."""
+
+  def __init__(self, id):
+    self.id = id
+
+
+class DummyPathDatabase(object):
+  """Stands in for the CVSPathDatabase, with one CVSPath per id."""
+
+  def __init__(self):
+    self._paths = {}
+
+  def get_path(self, id):
+    try:
+      return self._paths[id]
+    except KeyError:
+      path = self._paths[id] = Dummy(id)
+      return path
+
+  def itervalues(self):
+    return self._paths.itervalues()
+
+
+class DummyNode(object):
+  """Stands in for a writable CurrentMirrorDirectory."""
+
+  def __init__(self, id, entries):
+    self.id = id
+    self._entries = entries
+
+
+class RepositoryMirrorTestCase(unittest.TestCase):
+  def setUp(self):
+    self.tmpdir = tempfile.mkdtemp(prefix='cvs2svn-')
+    Ctx().tmpdir = self.tmpdir
+    Ctx()._cvs_path_db = DummyPathDatabase()
+    # Register the _NodeDatabase's files with an ArtifactManager of
+    # their own, as if this test were the pass that creates them:
+    self.saved_artifact_manager = repository_mirror.artifact_manager
+    repository_mirror.artifact_manager = ArtifactManager()
+    for basename in [
+          config.MIRROR_NODES_STORE, config.MIRROR_NODES_INDEX_TABLE,
+          ]:
+      repository_mirror.artifact_manager.register_temp_file(basename, self)
+    repository_mirror.artifact_manager.pass_started(self)
+
+  def tearDown(self):
+    repository_mirror.artifact_manager = self.saved_artifact_manager
+    del Ctx()._cvs_path_db
+    Ctx().tmpdir = None
+    shutil.rmtree(self.tmpdir)
+
+  def make_entries(self, ids):
+    """Return a dict {CVSPath : node_id} for the CVSPaths with IDS.
+
+    Every third entry is a file (with node_id None); the others are
+    directories."""
+
+    entries = {}
+    for id in ids:
+      if id % 3:
+        entries[Ctx()._cvs_path_db.get_path(id)] = id * 10
+      else:
+        entries[Ctx()._cvs_path_db.get_path(id)] = None
+    return entries
+
+  def check(self, entries, expected):
+    self.assertEqual(len(entries), len(expected))
+    self.assertEqual(dict(entries.items()), expected)
+    self.assertEqual(sorted(entries), sorted(expected))
+    for (cvs_path, value) in expected.items():
+      self.assert_(cvs_path in entries)
+      self.assertEqual(entries[cvs_path], value)
+
+  def mark_stored(self, entries):
+    """Pretend that the fragments of ENTRIES have been stored."""
+
+    entries._fragment_ids = range(1, len(entries._fragments) + 1)
+
+  def test_small_directory(self):
+    expected = self.make_entries(range(_FragmentedEntries.MIN_ENTRIES - 1))
+    entries = _copy_entries(expected)
+    self.assert_(isinstance(entries, dict))
+    self.assert_(entries is not expected)
+    self.check(entries, expected)
+
+  def test_copy_on_write(self):
+    expected = self.make_entries(range(2000))
+    entries = _copy_entries(expected)
+    self.assert_(isinstance(entries, _FragmentedEntries))
+    self.check(entries, expected)
+    self.mark_stored(entries)
+
+    copy = _copy_entries(entries)
+    self.assert_(isinstance(copy, _FragmentedEntries))
+    for i in range(len(entries._fragments)):
+      self.assert_(copy._fragments[i] is entries._fragments[i])
+
+    # Modify the copy.  The original must not change, and only the
+    # fragments that were modified may stop being shared:
+    path_db = Ctx()._cvs_path_db
+    copy_expected = dict(expected)
+    for id in [1, 5, 3000]:
+      copy[path_db.get_path(id)] = 7
+      copy_expected[path_db.get_path(id)] = 7
+    del copy[path_db.get_path(2)]
+    del copy_expected[path_db.get_path(2)]
+    self.assertRaises(KeyError, copy.__delitem__, path_db.get_path(2))
+    self.check(copy, copy_expected)
+    self.check(entries, expected)
+    mask = len(entries._fragments) - 1
+    modified = set([id & mask for id in [1, 2, 5, 3000]])
+    for i in range(len(entries._fragments)):
+      if i in modified:
+        self.assert_(copy._fragments[i] is not entries._fragments[i])
+        self.assertEqual(copy._fragment_ids[i], None)
+      else:
+        self.assert_(copy._fragments[i] is entries._fragments[i])
+        self.assertEqual(copy._fragment_ids[i], entries._fragment_ids[i])
+
+    # Copies of an instance whose fragments have been modified but not
+    # stored must not share those fragments, either:
+    copy2 = _copy_entries(copy)
+    copy2[path_db.get_path(1)] = 8
+    del copy2[path_db.get_path(5)]
+    self.check(copy, copy_expected)
+    copy[path_db.get_path(3000)] = 9
+    self.assertEqual(copy2[path_db.get_path(3000)], 7)
+
+  def test_refragmenting(self):
+    path_db = Ctx()._cvs_path_db
+    expected = self.make_entries(range(_FragmentedEntries.MIN_ENTRIES))
+    entries = _copy_entries(expected)
+    self.assert_(isinstance(entries, _FragmentedEntries))
+    num_fragments = len(entries._fragments)
+    self.assertEqual(
+        num_fragments,
+        _FragmentedEntries.MIN_ENTRIES // _FragmentedEntries.FRAGMENT_SIZE,
+        )
+
+    # Grow the directory until its fragments are overfull:
+    id = _FragmentedEntries.MIN_ENTRIES
+    while not entries.is_overfull():
+      entries[path_db.get_path(id)] = id
+      expected[path_db.get_path(id)] = id
+      id += 1
+    self.assertEqual(len(entries._fragments), num_fragments)
+    self.check(entries, expected)
+    self.mark_stored(entries)
+
+    entries = _copy_entries(entries)
+    self.assert_(len(entries._fragments) > num_fragments)
+    self.assertEqual(entries._fragment_ids, [None] * len(entries._fragments))
+    self.assert_(
+        max([len(fragment) for fragment in entries._fragments])
+        < 4 * _FragmentedEntries.FRAGMENT_SIZE
+        )
+    self.assert_(not entries.is_overfull())
+    self.check(entries, expected)
+
+    # Shrink it until its fragments are underfull.  It stays
+    # fragmented, but with fewer fragments:
+    num_fragments = len(entries._fragments)
+    self.mark_stored(entries)
+    ids = sorted([cvs_path.id for cvs_path in expected])
+    while not entries.is_underfull():
+      cvs_path = path_db.get_path(ids.pop())
+      del entries[cvs_path]
+      del expected[cvs_path]
+    self.check(entries, expected)
+    self.assert_(len(entries) >= _FragmentedEntries.MIN_ENTRIES // 2)
+
+    old_entries = entries
+    entries = _copy_entries(entries)
+    self.assert_(isinstance(entries, _FragmentedEntries))
+    self.assert_(len(entries._fragments) < num_fragments)
+    self.assert_(not entries.is_overfull())
+    self.assert_(not entries.is_underfull())
+    self.check(entries, expected)
+    self.check(old_entries, expected)
+
+    # Shrink it to below half of the size at which directories are
+    # fragmented.  Then it is stored as a dict again:
+    self.mark_stored(entries)
+    while len(entries) >= _FragmentedEntries.MIN_ENTRIES // 2:
+      cvs_path = path_db.get_path(ids.pop())
+      del entries[cvs_path]
+      del expected[cvs_path]
+    copy = _copy_entries(entries)
+    self.assert_(isinstance(copy, dict))
+    self.check(copy, expected)
+    copy[path_db.get_path(ids[-1] + 1)] = None
+    self.check(entries, expected)
+    expected[path_db.get_path(ids[-1] + 1)] = None
+    self.check(copy, expected)
+
+  def test_node_database(self):
+    key_generator = KeyGenerator()
+    node_db = _NodeDatabase(key_generator)
+    path_db = Ctx()._cvs_path_db
+
+    # A large directory and a small one, written in one group:
+    big_id = key_generator.gen_id()
+    big_expected = self.make_entries(range(3000))
+    big_node = DummyNode(big_id, _copy_entries(big_expected))
+    small_id = key_generator.gen_id()
+    small_expected = self.make_entries(range(5000, 5010))
+    small_node = DummyNode(small_id, _copy_entries(small_expected))
+    node_db.write_new_nodes([big_node, small_node])
+    fragment_ids = list(big_node._entries._fragment_ids)
+    self.assert_(None not in fragment_ids)
+
+    # A modified copy of the large directory, written in a second
+    # group.  Only the modified fragment must be stored again:
+    copy_id = key_generator.gen_id()
+    copy_expected = dict(big_expected)
+    copy_expected[path_db.get_path(4)] = 44
+    copy_node = DummyNode(copy_id, _copy_entries(node_db[big_id]))
+    copy_node._entries[path_db.get_path(4)] = 44
+    node_db.write_new_nodes([copy_node])
+
+    mask = len(fragment_ids) - 1
+    for (i, fragment_id) in enumerate(copy_node._entries._fragment_ids):
+      if i == 4 & mask:
+        self.assert_(fragment_id not in fragment_ids)
+      else:
+        self.assertEqual(fragment_id, fragment_ids[i])
+
+    # Read everything back from disk:
+    node_db._cache.clear()
+    for (id, expected) in [
+          (copy_id, copy_expected),
+          (big_id, big_expected),
+          (small_id, small_expected),
+          ]:
+      entries = node_db[id]
+      self.check(entries, expected)
+    self.assert_(isinstance(node_db[big_id], _FragmentedEntries))
+    self.assert_(isinstance(node_db[small_id], dict))
+    self.assertEqual(node_db[big_id]._fragment_ids, fragment_ids)
+    self.assertEqual(
+        node_db[copy_id]._fragment_ids, copy_node._entries._fragment_ids
+        )
+
+    # The fragments that were not modified are shared between the
+    # versions after they are read back:
+    for i in range(len(fragment_ids)):
+      if i != 4 & mask:
+        self.assert_(
+            node_db[copy_id]._fragments[i] is node_db[big_id]._fragments[i]
+            )
+
+    node_db.close()
+
+
+suite = unittest.makeSuite(RepositoryMirrorTestCase)
+
+
+if __name__ == '__main__':
+  unittest.TextTestRunner(verbosity=2).run(suite)
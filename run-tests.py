@@ -4070,6 +4070,85 @@ def vendor_1_1_not_root():
       )
 
 
+@Cvs2SvnTestFunction
+def jobs_changeset_ids():
+  "changeset ids do not depend on --jobs"
+
+  if not os.path.isdir(tmp_dir):
+    os.mkdir(tmp_dir)
+
+  cvsrepos = os.path.join(test_data_dir, 'nasty-graphs-cvsrepos')
+  filenames = [
+      'cvs-item-to-changeset-revbroken.dat',
+      'cvs-item-to-changeset-allbroken.dat',
+      ]
+  contents = {}
+  for jobs in [1, 2]:
+    conv_tmp_dir = os.path.join(tmp_dir, 'jobs-changeset-ids-%d' % (jobs,))
+    erase(conv_tmp_dir)
+    run_script(
+        cvs2svn, None, '-qqqqqq', '--skip-cleanup',
+        '--jobs=%d' % (jobs,), '--tmpdir=%s' % (conv_tmp_dir,),
+        '--dumpfile=%s' % (os.path.join(conv_tmp_dir, 'svn.dump'),),
+        cvsrepos,
+        )
+    for filename in filenames:
+      contents[jobs, filename] = \
+          open(os.path.join(conv_tmp_dir, filename), 'rb').read()
+
+  for filename in filenames:
+    if contents[1, filename] != contents[2, filename]:
+      raise Failure('%s differs between --jobs=1 and --jobs=2' % (filename,))
+
+
+@Cvs2SvnTestFunction
+def reuse_passes_options_hints():
+  "re-run passes when an options file input changes"
+
+  if not os.path.isdir(tmp_dir):
+    os.mkdir(tmp_dir)
+
+  conv_tmp_dir = os.path.join(tmp_dir, 'reuse-passes-options-hints')
+  erase(conv_tmp_dir)
+  os.mkdir(conv_tmp_dir)
+  options_file = os.path.join(conv_tmp_dir, 'cvs2svn.options')
+  hints_file = os.path.join(conv_tmp_dir, 'symbol-hints.txt')
+  dumpfile = os.path.join(conv_tmp_dir, 'svn.dump')
+
+  # The symbol hints file is only named in the options file, so it is
+  # not covered by the fingerprint of the command-line options:
+  f = open(options_file, 'w')
+  f.write(
+      'execfile(\'cvs2svn-example.options\')\n'
+      'logger.log_level = logger.ERROR\n'
+      'ctx.tmpdir = %r\n'
+      'ctx.skip_cleanup = True\n'
+      'ctx.output_option = DumpfileOutputOption(%r)\n'
+      'run_options.clear_projects()\n'
+      'run_options.add_project(\n'
+      '    r\'test-data/main-cvsrepos\',\n'
+      '    trunk_path=\'trunk\',\n'
+      '    branches_path=\'branches\',\n'
+      '    tags_path=\'tags\',\n'
+      '    symbol_strategy_rules=(\n'
+      '        [SymbolHintsFileRule(%r)] + global_symbol_strategy_rules\n'
+      '        ),\n'
+      '    )\n'
+      % (conv_tmp_dir, dumpfile, hints_file,)
+      )
+  f.close()
+
+  for (conversion, expected) in [('tag', True), ('exclude', False)]:
+    f = open(hints_file, 'w')
+    f.write('. T_MIXED %s\n' % (conversion,))
+    f.close()
+    run_script(cvs2svn, None, '--options=%s' % (options_file,))
+    if ('Node-path: tags/T_MIXED\n' in open(dumpfile).read()) != expected:
+      raise Failure(
+          'The re-run did not treat T_MIXED as "%s"' % (conversion,)
+          )
+
+
 ########################################################################
 # Run the tests
 
@@ -4289,6 +4368,8 @@ test_list = [
     missing_vendor_branch,
     newphrases,
     vendor_1_1_not_root,
+    jobs_changeset_ids,
+    reuse_passes_options_hints,
     ]
 
 if __name__ == '__main__':